@@ -0,0 +1,584 @@
+"""
+Headless HTTP and command-line API for the food waste database.
+
+Machine clients such as reporting jobs get the listing filters, the
+analytics catalogue and the listing and claim write paths without driving
+the Streamlit script. An asyncio server parses requests and hands the
+database work to a thread pool that shares app.py's connection pool, result
+cache and claim writer. Large results stream as NDJSON one keyset page at a
+time, and POST /batch runs many operations in a single round trip.
+
+    python api.py serve --port 8080
+    python api.py call listings location="City 001" limit=5
+    python api.py stream table table=Claims > claims.ndjson
+    python api.py batch requests.json
+
+Endpoints (JSON unless noted):
+
+    GET    /health, /stats, /metrics (Prometheus text)
+    GET    /listings?location=&food_type=&meal_type=&q=&limit=&after=
+           (format=ndjson, or Accept: application/x-ndjson, streams every match)
+    GET    /listings/{id}
+    POST   /listings              a new listing, or a list of them
+    PATCH  /listings/{id}         any of the editable columns
+    DELETE /listings/{id}
+    POST   /listings/changes      a list of updates and deletes, as in Batch Edit
+    GET    /queries               the analytics catalogue
+    GET    /queries/{id}?city=    a precomputed answer (see app.read_summary)
+    POST   /jobs                  {"query_id": ..., "city": ...} runs a live query
+    GET    /jobs/{id}, DELETE /jobs/{id}
+    POST   /claims                a claim, or a list claimed in one transaction
+    GET    /tables/{table}        a whole table as NDJSON
+    POST   /batch                 {"requests": [{"op": "query", "args": {"query_id": 1}}, ...]}
+           (format=ndjson streams each result as it finishes)
+"""
+import argparse
+import asyncio
+import inspect
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import re
+import signal
+import socket
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from urllib.parse import parse_qsl, urlsplit
+
+import app
+
+API_HOST = '127.0.0.1'
+API_PORT = 8080
+API_WORKERS = 16  # Threads per process running database work; reads share app.POOL_SIZE connections
+API_PROCESSES = 1  # Server processes sharing the port (SO_REUSEPORT), to use more than one core
+API_PAGE_SIZE = 100  # Default listings per page
+API_MAX_PAGE_SIZE = 1000
+API_STREAM_PAGE_SIZE = 1000  # Rows per keyset page when streaming NDJSON
+API_MAX_BATCH = 1000  # Operations per POST /batch
+API_MAX_BODY_BYTES = 16 * 1024 * 1024
+API_KEEPALIVE_TIMEOUT = 30  # Seconds an idle client connection stays open
+NDJSON = 'application/x-ndjson'
+HTTP_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+                413: 'Payload Too Large', 500: 'Internal Server Error', 503: 'Service Unavailable'}
+
+logger = logging.getLogger(__name__)
+
+
+class ApiError(Exception):
+    """An error reported to the client with its HTTP status."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _records(columns, rows):
+    """Turns result tuples into column -> value dicts."""
+    return [dict(zip(columns, row)) for row in rows]
+
+
+def _page_size(limit, default=API_PAGE_SIZE):
+    """Parses a page size, clamped to 1..API_MAX_PAGE_SIZE."""
+    return min(max(int(limit if limit is not None else default), 1), API_MAX_PAGE_SIZE)
+
+
+@lru_cache(maxsize=None)
+def _table_columns(table):
+    return [column[1] for column in app.execute_query(f"PRAGMA table_info({table})")]
+
+
+@lru_cache(maxsize=None)
+def _query_columns(name):
+    """Column names of a catalogue query, read from the prepared statement without running it."""
+    params = ('',) if name == app.CITY_CONTACTS_QUERY else ()
+    with app.get_connection() as conn:
+        cursor = conn.execute(f"SELECT * FROM ({app.ANALYTICS_QUERIES[name]}) LIMIT 0", params)
+        return [column[0] for column in cursor.description]
+
+
+def _query_name(query_id=None, name=None):
+    """Looks a catalogue question up by its position in app.ANALYTICS_QUERIES or by its text."""
+    names = list(app.ANALYTICS_QUERIES)
+    if name is None and query_id is not None and 0 <= int(query_id) < len(names):
+        return names[int(query_id)]
+    if name in app.ANALYTICS_QUERIES:
+        return name
+    raise ApiError(404, f"Unknown query: {name if name is not None else query_id}")
+
+
+def _query_params(name, city):
+    if name != app.CITY_CONTACTS_QUERY:
+        return None
+    if not city:
+        raise ValueError("city is required for this query")
+    return (city,)
+
+
+def _stream_pages(query, params, columns, key_column):
+    """
+    Yields a query's rows as lists of dicts, one keyset page at a time.
+    Pages bypass the result cache, which a full export would otherwise flush,
+    and no connection is held between pages, so a slow client cannot tie
+    up the pool.
+    """
+    key_index = columns.index(key_column.split('.')[-1])
+    after = None
+    while True:
+        page_query = query + ("" if after is None else f" AND {key_column} > ?")
+        page_params = list(params) + ([] if after is None else [after]) + [API_STREAM_PAGE_SIZE]
+        with app.get_connection() as conn:
+            rows = conn.execute(f"{page_query} ORDER BY {key_column} LIMIT ?", page_params).fetchall()
+        if rows:
+            yield _records(columns, rows)
+        if len(rows) < API_STREAM_PAGE_SIZE:
+            return
+        after = rows[-1][key_index]
+
+
+def health():
+    return {'status': 'ok', 'database': app.DB_NAME}
+
+
+def stats():
+    """Pool, cache and claim writer counters."""
+    return {'pool': app.get_pool_metrics(), 'result_cache': app.get_result_cache_stats(),
+            'claims': dict(app.claim_stats)}
+
+
+def metrics():
+    return app.export_prometheus_metrics()
+
+
+def list_listings(location=None, food_type=None, meal_type=None, q=None, limit=None, after=None):
+    """
+    One page of food listings ordered by Food_ID, filtered as on the Food
+    Listings page. Pass the returned `next` as `after` for the following page.
+    """
+    query, params = app.build_listing_query(location, food_type, meal_type, q)
+    cursor = None if after is None else (int(after), int(after))
+    rows, next_cursor = app.fetch_page(query, params, app.LISTING_COLUMNS, 'fl.Food_ID', 'fl.Food_ID',
+                                       _page_size(limit), cursor)
+    return {'rows': _records(app.LISTING_COLUMNS, rows), 'next': next_cursor and next_cursor[1]}
+
+
+def stream_listings(location=None, food_type=None, meal_type=None, q=None):
+    """Every listing matching the filters, in Food_ID order."""
+    query, params = app.build_listing_query(location, food_type, meal_type, q)
+    return _stream_pages(query, params, app.LISTING_COLUMNS, 'fl.Food_ID')
+
+
+def get_listing(food_id):
+    rows = app.execute_query("SELECT * FROM FoodListings WHERE Food_ID = ?", (int(food_id),))
+    if not rows:
+        raise ApiError(404, f"Food listing {food_id} does not exist")
+    return _records(_table_columns('FoodListings'), rows)[0]
+
+
+def create_listings(listings):
+    """Adds listings (see app.insert_food_listings); returns the batch report."""
+    return app.insert_food_listings(listings if isinstance(listings, list) else [listings])
+
+
+def change_listings(changes):
+    """Updates and deletes listings (see app.apply_listing_changes); returns the batch report."""
+    return app.apply_listing_changes(changes)
+
+
+def stream_table(table):
+    if table not in app.CSV_FILES:
+        raise ApiError(404, f"Unknown table: {table}")
+    return _stream_pages(f"SELECT * FROM {table} WHERE 1=1", [], _table_columns(table), app.CSV_FILES[table][1])
+
+
+def list_queries():
+    return [{'query_id': query_id, 'name': name, 'columns': _query_columns(name),
+             'params': ['city'] if name == app.CITY_CONTACTS_QUERY else []}
+            for query_id, name in enumerate(app.ANALYTICS_QUERIES)]
+
+
+def run_query(query_id=None, name=None, city=None):
+    """Answers a catalogue question the way the Analytics Queries page does, mostly from summaries."""
+    name = _query_name(query_id, name)
+    params = _query_params(name, city)
+    if params:
+        rows, refreshed_at, is_stale = app.execute_query(app.ANALYTICS_QUERIES[name], params), None, False
+    else:
+        rows, refreshed_at, is_stale = app.read_summary(name)
+    return {'name': name, 'rows': _records(_query_columns(name), rows),
+            'refreshed_at': refreshed_at, 'stale': is_stale}
+
+
+def submit_job(query_id=None, name=None, city=None):
+    """Runs a catalogue query live in the background (see app.submit_analytics_query)."""
+    name = _query_name(query_id, name)
+    return {'job_id': app.submit_analytics_query(app.ANALYTICS_QUERIES[name], _query_params(name, city), label=name)}
+
+
+def get_job(job_id):
+    state = app.poll_analytics_job(job_id)
+    if state is None:
+        raise ApiError(404, f"Unknown job: {job_id}")
+    if state['results'] is not None:
+        columns = _query_columns(state['label']) if state['label'] in app.ANALYTICS_QUERIES else None
+        state['results'] = _records(columns, state['results']) if columns else [list(row) for row in state['results']]
+    return state
+
+
+def cancel_job(job_id):
+    return {'cancelled': app.cancel_analytics_job(job_id)}
+
+
+def claim(food_id, receiver_id, quantity=1):
+    """Claims food through the group-commit claim writer (see app.submit_claim)."""
+    return app.submit_claim(food_id, receiver_id, quantity)
+
+
+def claims(claims):
+    """Claims a list of {food_id, receiver_id, quantity} in one transaction (see app.submit_claims)."""
+    return app.submit_claims([(item['food_id'], item['receiver_id'], item.get('quantity', 1)) for item in claims])
+
+
+# Operations callable over HTTP, in POST /batch and from the command line
+OPERATIONS = {
+    'health': health,
+    'stats': stats,
+    'metrics': metrics,
+    'listings': list_listings,
+    'listing': get_listing,
+    'create_listings': create_listings,
+    'change_listings': change_listings,
+    'queries': list_queries,
+    'query': run_query,
+    'submit_job': submit_job,
+    'job': get_job,
+    'cancel_job': cancel_job,
+    'claim': claim,
+    'claims': claims,
+}
+# Operations whose results are streamed as NDJSON
+STREAMS = {
+    'listings': stream_listings,
+    'table': stream_table,
+}
+
+# (method, path pattern, function of (query-string args, JSON body, path groups) -> (operation, args))
+ROUTES = [
+    ('GET', r'/health', lambda args, body: ('health', {})),
+    ('GET', r'/stats', lambda args, body: ('stats', {})),
+    ('GET', r'/metrics', lambda args, body: ('metrics', {})),
+    ('GET', r'/listings', lambda args, body: ('listings', args)),
+    ('POST', r'/listings', lambda args, body: ('create_listings', {'listings': body})),
+    ('POST', r'/listings/changes', lambda args, body: ('change_listings', {'changes': body})),
+    ('GET', r'/listings/(\d+)', lambda args, body, food_id: ('listing', {'food_id': food_id})),
+    ('PATCH', r'/listings/(\d+)',
+     lambda args, body, food_id: ('change_listings', {'changes': [dict(body or {}, Food_ID=food_id)]})),
+    ('DELETE', r'/listings/(\d+)',
+     lambda args, body, food_id: ('change_listings', {'changes': [{'Food_ID': food_id, 'Action': 'delete'}]})),
+    ('GET', r'/queries', lambda args, body: ('queries', {})),
+    ('GET', r'/queries/(\d+)', lambda args, body, query_id: ('query', dict(args, query_id=query_id))),
+    ('POST', r'/jobs', lambda args, body: ('submit_job', body or {})),
+    ('GET', r'/jobs/(\w+)', lambda args, body, job_id: ('job', {'job_id': job_id})),
+    ('DELETE', r'/jobs/(\w+)', lambda args, body, job_id: ('cancel_job', {'job_id': job_id})),
+    ('POST', r'/claims', lambda args, body: ('claims', {'claims': body}) if isinstance(body, list) else ('claim', body or {})),
+    ('GET', r'/tables/(\w+)', lambda args, body, table: ('table', {'table': table, 'format': 'ndjson'})),
+]
+ROUTES = [(method, re.compile(pattern + '$'), build) for method, pattern, build in ROUTES]
+
+
+def call(operation, args, functions=OPERATIONS):
+    """Runs an operation with keyword args, turning bad requests into ApiError(400, ...)."""
+    function = functions.get(operation)
+    if function is None:
+        raise ApiError(404, f"Unknown operation: {operation}")
+    try:
+        inspect.signature(function).bind(**args)
+    except TypeError as e:
+        raise ApiError(400, str(e))
+    try:
+        return function(**args)
+    except KeyError as e:
+        raise ApiError(400, f"Missing field {e}")
+    except (TypeError, ValueError) as e:
+        raise ApiError(400, str(e))
+    except queue.Full as e:
+        raise ApiError(503, str(e))
+
+
+def _dumps(value):
+    return json.dumps(value, default=str, separators=(',', ':'))
+
+
+async def _write_response(writer, status, body, content_type='application/json', keep_alive=True):
+    writer.write(f"HTTP/1.1 {status} {HTTP_REASONS[status]}\r\nContent-Type: {content_type}\r\n"
+                 f"Content-Length: {len(body)}\r\nConnection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+                 .encode('latin-1') + body)
+    await writer.drain()
+
+
+async def _write_chunk(writer, lines):
+    if lines:
+        chunk = ''.join(line + '\n' for line in lines).encode()
+        writer.write(f"{len(chunk):x}\r\n".encode('latin-1') + chunk + b"\r\n")
+        await writer.drain()
+
+
+def _start_stream(writer, keep_alive):
+    writer.write(f"HTTP/1.1 200 OK\r\nContent-Type: {NDJSON}\r\nTransfer-Encoding: chunked\r\n"
+                 f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode('latin-1'))
+
+
+async def _end_stream(writer):
+    writer.write(b"0\r\n\r\n")
+    await writer.drain()
+
+
+async def _write_stream(writer, pages, keep_alive):
+    """Sends pages of rows as chunked NDJSON, fetching each page on the thread pool."""
+    _start_stream(writer, keep_alive)
+    try:
+        while (page := await asyncio.to_thread(next, pages, None)) is not None:
+            await _write_chunk(writer, [_dumps(row) for row in page])
+    except Exception as e:
+        # Headers are gone, so the error becomes the stream's last line
+        logger.exception("Stream failed")
+        await _write_chunk(writer, [_dumps({'error': str(e)})])
+    await _end_stream(writer)
+
+
+async def _outcome(index, request):
+    """Runs one POST /batch request; errors are reported per request rather than failing the batch."""
+    try:
+        if not isinstance(request, dict) or not isinstance(request.get('args', {}), dict):
+            raise ApiError(400, "Each request needs an op and optional args object")
+        result = await asyncio.to_thread(call, request.get('op'), request.get('args', {}))
+        return {'index': index, 'status': 200, 'result': result}
+    except ApiError as e:
+        return {'index': index, 'status': e.status, 'error': str(e)}
+    except Exception as e:
+        logger.exception("Batch operation failed")
+        return {'index': index, 'status': 500, 'error': str(e)}
+
+
+async def _run_batch(writer, body, stream, keep_alive):
+    requests = body.get('requests') if isinstance(body, dict) else body
+    if not isinstance(requests, list) or len(requests) > API_MAX_BATCH:
+        raise ApiError(400, f"Expected a list of at most {API_MAX_BATCH} requests")
+    tasks = [asyncio.create_task(_outcome(index, request)) for index, request in enumerate(requests)]
+    if not stream:
+        results = await asyncio.gather(*tasks)
+        await _write_response(writer, 200, _dumps({'results': results}).encode(), keep_alive=keep_alive)
+        return
+    _start_stream(writer, keep_alive)
+    for task in asyncio.as_completed(tasks):
+        await _write_chunk(writer, [_dumps(await task)])
+    await _end_stream(writer)
+
+
+async def _respond(writer, method, target, headers, body, keep_alive):
+    """Routes one request and writes its response."""
+    url = urlsplit(target)
+    args = dict(parse_qsl(url.query))
+    stream = args.pop('format', None) == 'ndjson' or NDJSON in headers.get('accept', '')
+    try:
+        try:
+            body = json.loads(body) if body else None
+        except ValueError:
+            raise ApiError(400, "Request body is not valid JSON")
+        if url.path == '/batch':
+            if method != 'POST':
+                raise ApiError(405, "Use POST")
+            await _run_batch(writer, body, stream, keep_alive)
+            return
+        allowed = False
+        for route_method, pattern, build in ROUTES:
+            match = pattern.match(url.path)
+            if match:
+                allowed = True
+                if route_method == method:
+                    break
+        else:
+            raise ApiError(405 if allowed else 404, f"{'Method not allowed' if allowed else 'Not found'}: {method} {url.path}")
+        try:
+            operation, op_args = build(args, body, *match.groups())
+            op_args = dict(op_args)
+        except (TypeError, ValueError):
+            raise ApiError(400, "Request body has the wrong shape")
+        if op_args.pop('format', None) == 'ndjson' or (stream and operation in STREAMS):
+            pages = await asyncio.to_thread(call, operation, op_args, STREAMS)
+            await _write_stream(writer, pages, keep_alive)
+            return
+        result = await asyncio.to_thread(call, operation, op_args)
+    except ApiError as e:
+        await _write_response(writer, e.status, _dumps({'error': str(e)}).encode(), keep_alive=keep_alive)
+        return
+    except Exception as e:
+        logger.exception("Request failed: %s %s", method, target)
+        await _write_response(writer, 500, _dumps({'error': str(e)}).encode(), keep_alive=keep_alive)
+        return
+    if isinstance(result, str):
+        await _write_response(writer, 200, result.encode(), 'text/plain; version=0.0.4', keep_alive)
+    else:
+        await _write_response(writer, 200, _dumps(result).encode(), keep_alive=keep_alive)
+
+
+async def _handle_connection(reader, writer):
+    """Serves HTTP/1.1 requests on one client connection until it closes or idles out."""
+    try:
+        while True:
+            try:
+                request_line = await asyncio.wait_for(reader.readline(), API_KEEPALIVE_TIMEOUT)
+            except asyncio.TimeoutError:
+                break
+            if not request_line.strip():
+                break
+            headers = {}
+            while (line := await reader.readline()) not in (b'\r\n', b'\n', b''):
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+            try:
+                method, target, version = request_line.decode('latin-1').split()
+                length = int(headers.get('content-length', 0))
+            except ValueError:
+                await _write_response(writer, 400, b'{"error":"Malformed request"}', keep_alive=False)
+                break
+            if length > API_MAX_BODY_BYTES:
+                await _write_response(writer, 413, b'{"error":"Request body too large"}', keep_alive=False)
+                break
+            body = await reader.readexactly(length) if length else b''
+            connection = headers.get('connection', '').lower()
+            keep_alive = connection == 'keep-alive' if version == 'HTTP/1.0' else connection != 'close'
+            await _respond(writer, method, target, headers, body, keep_alive)
+            if not keep_alive:
+                break
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def _serve(host, port, workers, reuse_port=False):
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=workers, thread_name_prefix="api"))
+    server = await asyncio.start_server(_handle_connection, host, port, reuse_port=reuse_port or None)
+    print(f"Serving on http://{host}:{server.sockets[0].getsockname()[1]}", flush=True)
+    async with server:
+        await server.serve_forever()
+
+
+def _serve_process(db_name, host, port, workers):
+    """Entry point of one worker process started by serve()."""
+    app.DB_NAME = db_name
+    try:
+        asyncio.run(_serve(host, port, workers, reuse_port=True))
+    except KeyboardInterrupt:
+        pass
+
+
+def serve(host=API_HOST, port=API_PORT, workers=API_WORKERS, processes=API_PROCESSES):
+    """
+    Prepares the database as the app does (see app.init_database), then
+    serves until interrupted. With several processes the kernel spreads
+    connections across them; this process only runs the background summary
+    refresher and expiry sweeper. SQLite's WAL mode and the table versions
+    kept in the database keep every process's caches consistent.
+    """
+    app.init_database()
+    if processes <= 1:
+        try:
+            asyncio.run(_serve(host, port, workers))
+        except KeyboardInterrupt:
+            pass
+        return
+
+    # Holding the port here lets port 0 resolve to one free port for every worker
+    with socket.socket() as reserved:
+        reserved.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        reserved.bind((host, port))
+        port = reserved.getsockname()[1]
+        context = multiprocessing.get_context('spawn')
+        children = [context.Process(target=_serve_process, args=(app.DB_NAME, host, port, workers),
+                                    name=f"api-{i}", daemon=True) for i in range(processes)]
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        try:
+            for child in children:
+                child.start()
+            for child in children:
+                child.join()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            for child in children:
+                child.terminate()
+                child.join()
+
+
+async def _run_batch_locally(requests):
+    return await asyncio.gather(*(_outcome(index, request) for index, request in enumerate(requests)))
+
+
+def _parse_args(pairs):
+    """Parses key=value command-line arguments; values that are valid JSON are decoded."""
+    args = {}
+    for pair in pairs:
+        key, separator, value = pair.partition('=')
+        if not separator:
+            raise ValueError(f"Expected key=value, got {pair!r}")
+        try:
+            args[key] = json.loads(value)
+        except ValueError:
+            args[key] = value
+    return args
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', help=f'database file (default: {app.DB_NAME})')
+    parser.add_argument('--data-dir', help=f'CSV directory synced on startup (default: {app.DATA_DIR})')
+    commands = parser.add_subparsers(dest='command', required=True)
+    serve_parser = commands.add_parser('serve', help='run the HTTP server')
+    serve_parser.add_argument('--host', default=API_HOST)
+    serve_parser.add_argument('--port', type=int, default=API_PORT, help='0 picks a free port')
+    serve_parser.add_argument('--workers', type=int, default=API_WORKERS, help='threads per process')
+    serve_parser.add_argument('--processes', type=int, default=API_PROCESSES)
+    for command, names in (('call', OPERATIONS), ('stream', STREAMS)):
+        command_parser = commands.add_parser(command, help=f'run one operation ({", ".join(names)})')
+        command_parser.add_argument('operation', choices=list(names))
+        command_parser.add_argument('args', nargs='*', help='key=value arguments')
+    batch_parser = commands.add_parser('batch', help='run a JSON list of {"op", "args"} requests, printing NDJSON')
+    batch_parser.add_argument('file', help="requests file, or - for stdin")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        app.DB_NAME = args.db
+    if args.data_dir:
+        app.DATA_DIR = args.data_dir
+    if args.command == 'serve':
+        serve(args.host, args.port, args.workers, args.processes)
+        return 0
+    if not os.path.exists(app.DB_NAME):
+        parser.error(f"{app.DB_NAME} does not exist; start the app or `api.py serve` once to create it")
+
+    try:
+        if args.command == 'call':
+            result = call(args.operation, _parse_args(args.args))
+            print(result if isinstance(result, str) else json.dumps(result, indent=2, default=str))
+        elif args.command == 'stream':
+            for page in call(args.operation, _parse_args(args.args), STREAMS):
+                sys.stdout.writelines(_dumps(row) + '\n' for row in page)
+        else:
+            with (sys.stdin if args.file == '-' else open(args.file)) as f:
+                body = json.load(f)
+            requests = body.get('requests') if isinstance(body, dict) else body
+            for outcome in asyncio.run(_run_batch_locally(requests)):
+                print(_dumps(outcome))
+    except ApiError as e:
+        print(f"Error {e.status}: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,34 +1,830 @@
+import numpy as np
 import pandas as pd
+from pandas.api.types import union_categoricals
+import logging
+import numbers
 import sqlite3
-from datetime import datetime
-import matplotlib.pyplot as plt
-import seaborn as sns
+import re
+import hashlib
+import io
+import itertools
+import json
+import pickle
+import queue
+import random
+import sys
+import threading
+import uuid
+from collections import Counter, OrderedDict, deque
+from functools import lru_cache
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+from datetime import date, datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 import os
-!pip install streamlit
+import streamlit as st
 
 DB_NAME = 'food_waste.db'
 DATA_DIR = 'data'  # Directory to store CSV data files
 
+# Connection pool settings
+POOL_SIZE = 4  # Maximum number of pooled read-only connections
+POOL_TIMEOUT = 30  # Seconds to wait for a free connection before giving up
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',      # Readers no longer block the writer (and vice versa)
+    'synchronous': 'NORMAL',    # Safe with WAL, avoids an fsync on every commit
+    'cache_size': -64000,       # Page cache size in KiB (negative value) per connection
+    'mmap_size': 268435456,     # Memory-map up to 256 MiB of the database file
+    'temp_store': 'MEMORY',
+    'busy_timeout': 5000,       # Milliseconds to wait on a locked database
+    'recursive_triggers': 'ON',  # Rows removed by INSERT OR REPLACE fire DELETE triggers too
+}
+READ_ONLY_PREFIXES = ('SELECT', 'WITH', 'PRAGMA', 'EXPLAIN')
+
+# CSV ingestion settings
+INGEST_CHUNKSIZE = 50000  # Rows read, converted and committed per transaction
+CSV_FILES = {  # table -> (CSV file in DATA_DIR, primary key column)
+    'Providers': ('providers_data.csv', 'Provider_ID'),
+    'Receivers': ('receivers_data.csv', 'Receiver_ID'),
+    'FoodListings': ('food_listings_data.csv', 'Food_ID'),
+    'Claims': ('claims_data.csv', 'Claim_ID'),
+}
+CSV_DTYPES = {
+    'Providers': {'Provider_ID': 'Int64', 'Name': 'string', 'Type': 'string',
+                  'Address': 'string', 'City': 'string', 'Contact': 'string'},
+    'Receivers': {'Receiver_ID': 'Int64', 'Name': 'string', 'Type': 'string',
+                  'City': 'string', 'Contact': 'string'},
+    'FoodListings': {'Food_ID': 'Int64', 'Food_Name': 'string', 'Quantity': 'Int64',
+                     'Expiry_Date': 'string', 'Provider_ID': 'Int64', 'Provider_Type': 'string',
+                     'Location': 'string', 'Food_Type': 'string', 'Meal_Type': 'string'},
+    'Claims': {'Claim_ID': 'Int64', 'Food_ID': 'Int64', 'Receiver_ID': 'Int64',
+               'Status': 'string', 'Timestamp': 'string', 'Quantity': 'Int64'},
+}
+# Tables in the same stage have no foreign keys between them and load in parallel
+LOAD_STAGES = [('Providers', 'Receivers'), ('FoodListings',), ('Claims',)]
+
+# Expiry archive settings
+ARCHIVE_TABLES = {'FoodListings': 'FoodListingsArchive', 'Claims': 'ClaimsArchive'}
+ARCHIVE_VIEWS = {  # Hot + archived rows, for analytics that need full history
+    'AllFoodListings': ('FoodListings', 'FoodListingsArchive'),
+    'AllClaims': ('Claims', 'ClaimsArchive'),
+}
+CLOSED_CLAIM_STATUSES = ('Completed', 'Cancelled')
+SWEEP_BATCH_SIZE = 1000  # Listings archived per transaction
+SWEEP_INTERVAL = 3600  # Seconds between background archival sweeps
+
+# Claim engine settings
+CLAIM_MAX_RETRIES = 8  # Attempts per batch when the database stays locked (SQLITE_BUSY)
+CLAIM_RETRY_BASE_DELAY = 0.01  # Seconds; doubled on every retry, with jitter
+CLAIM_BATCH_SIZE = 256  # Claims committed together by the group-commit writer
+CLAIM_BATCH_WAIT = 0.002  # Seconds the writer waits for more claims to join a batch
+CLAIM_TIMEOUT = 30  # Seconds submit_claim waits for its batch to commit
+
+# Matching engine settings
+MATCH_TABLE = 'MatchAllocations'
+MATCH_WEIGHTS = {  # Score = sum of weight x feature, every feature in [0, 1]
+    'city': 1.0,  # Receiver is in the listing's city
+    'history': 0.5,  # Receiver's smoothed share of completed claims
+    'affinity': 0.5,  # Share of the receiver's past claims on this food type
+    'urgency': 0.25,  # 1 / (1 + days until expiry); also decides who is allocated first
+}
+MATCH_RECEIVER_CAPACITY = 10  # Listings allocated to one receiver per matching run
+MATCH_CANDIDATES = 25  # Best-ranked receivers considered for each listing
+
+# Full-text search settings
+SEARCH_INDEXES = {  # FTS5 index -> (content table, key column, indexed columns, ranking column weights)
+    'ListingSearch': ('FoodListings', 'Food_ID', ('Food_Name', 'Location', 'Food_Type', 'Meal_Type'),
+                      (10.0, 2.0, 1.0, 1.0)),
+    'ProviderSearch': ('Providers', 'Provider_ID', ('Name', 'Address', 'City', 'Type'), (10.0, 2.0, 4.0, 1.0)),
+    'ReceiverSearch': ('Receivers', 'Receiver_ID', ('Name', 'City', 'Type'), (10.0, 4.0, 1.0)),
+}
+SEARCH_PREFIX_LENGTHS = (2, 3, 4)  # Prefix lengths FTS5 keeps extra index entries for
+SEARCH_TOKENIZER = 'unicode61 remove_diacritics 2'
+SEARCH_LIMIT = 20  # Results per search
+SEARCH_RANK_WINDOW = 250  # Newest matches ranked per search, so common terms stay fast
+SEARCH_DEFERRED_MODES = ('replace', 'upsert')  # Bulk ingest modes that rebuild search indexes once at the end
+SUGGEST_LIMIT = 10  # Autocomplete suggestions per prefix
+SEARCH_TERM_PATTERN = re.compile(r"\w+")
+
+# Columnar snapshot settings
+SNAPSHOT_DIR = 'snapshots'  # Parquet copies of the tables for vectorized analytics
+SNAPSHOT_TABLES = ['Providers', 'Receivers', 'FoodListings', 'Claims', 'FoodListingsArchive', 'ClaimsArchive']
+SNAPSHOT_MANIFEST = 'manifest.json'  # Table versions and row counts at export time
+SNAPSHOT_COMPRESSION = 'zstd'
+SNAPSHOT_BATCH_ROWS = 100000  # Rows fetched from SQLite and written per Parquet row group
+
+# Result materialization settings
+FRAME_BATCH_ROWS = 10000  # Rows fetched and typed at a time by read_frame
+FRAME_CATEGORY_COLUMNS = {'Location', 'City', 'Food_Type', 'Meal_Type', 'Provider_Type', 'Type', 'Status'}
+FRAME_DATETIME_COLUMNS = {'Expiry_Date', 'Timestamp'}
+
+# Pagination settings
+PAGE_SIZES = [25, 50, 100, 250, 1000]
+DEFAULT_PAGE_SIZE = 50
+COUNT_ESTIMATE_CAP = 10000  # Row counts above this are shown as "10,000+"
+LISTING_COLUMNS = [
+    "Food_ID", "Food_Name", "Quantity", "Expiry_Date", "Provider_Name",
+    "Provider_Contact", "Location", "Food_Type", "Meal_Type"
+]
+LISTING_SORT_COLUMNS = {  # Sortable listing column -> SQL expression
+    "Food_ID": "fl.Food_ID",
+    "Food_Name": "fl.Food_Name",
+    "Quantity": "fl.Quantity",
+    "Expiry_Date": "fl.Expiry_Date",
+    "Location": "fl.Location",
+    "Food_Type": "fl.Food_Type",
+    "Meal_Type": "fl.Meal_Type",
+}
+
+# Batch editing settings
+LISTING_EDITABLE_COLUMNS = ["Food_Name", "Quantity", "Expiry_Date", "Location", "Food_Type", "Meal_Type"]
+BATCH_ACTIONS = ("update", "delete")
+BATCH_LOOKUP_SIZE = 500  # Food_IDs per existence-check query (below SQLite's variable limit)
+
+# Dropdown option cache settings
+DISTINCT_CACHE_TTL = 300  # Seconds before cached distinct values are re-read
+DISTINCT_CACHE_SIZE = 64  # Maximum number of cached (table, column) entries
+
+# Background analytics settings
+ANALYTICS_WORKERS = 2  # Threads running live analytics queries
+ANALYTICS_QUEUE_SIZE = 16  # Queued plus running jobs before submissions are refused
+ANALYTICS_TIMEOUT = 30  # Default seconds before a running query is interrupted
+ANALYTICS_JOB_HISTORY = 100  # Finished jobs kept for polling
+PROGRESS_HANDLER_STEPS = 10000  # SQLite VM instructions between cancellation checks
+
+# Query result cache settings
+RESULT_CACHE_ENABLED = True
+RESULT_CACHE_MAX_BYTES = 64 * 1024 * 1024  # Memory bound, measured as pickled result size
+RESULT_CACHE_MAX_ENTRY_BYTES = 4 * 1024 * 1024  # Larger results are never cached
+RESULT_CACHE_DB = None  # Path of the optional on-disk tier, e.g. 'query_cache.db'
+RESULT_CACHE_DB_MAX_ENTRIES = 10000
+
+# Query instrumentation settings
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)  # Seconds
+SLOW_QUERY_SECONDS = 0.5  # Queries slower than this are logged with their query plan
+SLOW_QUERY_LOG_SIZE = 50  # Recent slow queries kept for the stats panel
+METRICS_PORT = None  # Serve Prometheus metrics on this port when set, e.g. 9108
+
+logger = logging.getLogger(__name__)
+
+_pool_lock = threading.Lock()
+_write_lock = threading.RLock()
+_read_pool = queue.LifoQueue()
+_pool_state = {'db_name': None, 'read_connections': 0, 'write_conn': None}
+pool_metrics = {
+    'connections_opened': 0,
+    'read_checkouts': 0,
+    'write_checkouts': 0,
+    'read_waits': 0,
+    'wait_time': 0.0,
+    'commits': 0,
+    'rollbacks': 0,
+}
+
+
+def _open_connection(read_only=False):
+    """Opens a new SQLite connection with the tuned pragmas applied."""
+    conn = sqlite3.connect(DB_NAME, timeout=SQLITE_PRAGMAS['busy_timeout'] / 1000,
+                           check_same_thread=False)
+    for pragma, value in SQLITE_PRAGMAS.items():
+        conn.execute(f"PRAGMA {pragma} = {value}")
+    if read_only:
+        conn.execute("PRAGMA query_only = ON")
+    with _pool_lock:
+        pool_metrics['connections_opened'] += 1
+    return conn
+
+
+def _reset_pool_if_stale():
+    """Drops pooled connections and in-process caches when DB_NAME has been pointed at another file."""
+    if _pool_state['db_name'] != DB_NAME:
+        with _write_lock:
+            if _pool_state['db_name'] != DB_NAME:
+                close_pool()
+                _forget_database_caches()
+                _pool_state['db_name'] = DB_NAME
+
+
+def close_pool():
+    """Closes every pooled connection (e.g. before deleting the database file)."""
+    with _write_lock, _pool_lock:
+        while True:
+            try:
+                _read_pool.get_nowait().close()
+            except queue.Empty:
+                break
+        if _pool_state['write_conn'] is not None:
+            _pool_state['write_conn'].close()
+        _pool_state['read_connections'] = 0
+        _pool_state['write_conn'] = None
+
+
+@contextmanager
+def get_connection(read_only=True):
+    """
+    Checks a connection out of the pool.
+
+    Read-only connections come from a bounded pool and may be used concurrently.
+    There is a single writer connection, serialized by a lock, because SQLite
+    only allows one writer at a time anyway; waiting on the lock in-process is
+    cheaper than spinning on SQLITE_BUSY. Raises sqlite3.OperationalError if no
+    reader becomes free within POOL_TIMEOUT.
+    """
+    _reset_pool_if_stale()
+    if not read_only:
+        with _write_lock:
+            if _pool_state['write_conn'] is None:
+                _pool_state['write_conn'] = _open_connection()
+            with _pool_lock:
+                pool_metrics['write_checkouts'] += 1
+            yield _pool_state['write_conn']
+        return
+
+    conn = None
+    with _pool_lock:
+        pool_metrics['read_checkouts'] += 1
+        try:
+            conn = _read_pool.get_nowait()
+        except queue.Empty:
+            if _pool_state['read_connections'] < POOL_SIZE:
+                _pool_state['read_connections'] += 1
+            else:
+                pool_metrics['read_waits'] += 1
+                conn = False
+    if conn is None:
+        try:
+            conn = _open_connection(read_only=True)
+        except BaseException:
+            with _pool_lock:
+                _pool_state['read_connections'] -= 1  # Give the reserved slot back
+            raise
+    elif conn is False:
+        started = time.perf_counter()
+        try:
+            conn = _read_pool.get(timeout=POOL_TIMEOUT)
+        except queue.Empty:
+            raise sqlite3.OperationalError(
+                f"No database connection became free within {POOL_TIMEOUT}s.") from None
+        finally:
+            with _pool_lock:
+                pool_metrics['wait_time'] += time.perf_counter() - started
+    try:
+        yield conn
+    finally:
+        _read_pool.put(conn)
+
+
+def get_pool_metrics():
+    """Returns a snapshot of the connection pool counters."""
+    with _pool_lock:
+        metrics = dict(pool_metrics)
+        metrics['pool_size'] = POOL_SIZE
+        metrics['open_read_connections'] = _pool_state['read_connections']
+        metrics['idle_read_connections'] = _read_pool.qsize()
+    return metrics
+
+
+WRITE_TARGET_PATTERN = re.compile(
+    r"^\s*(?:INSERT(?:\s+OR\s+\w+)?\s+INTO|REPLACE\s+INTO|UPDATE(?:\s+OR\s+\w+)?|DELETE\s+FROM)\s+(\w+)",
+    re.IGNORECASE)
+
+
+def _versioned_tables():
+    """Returns every table with a write version: the base tables, their archives and allocations."""
+    return list(TABLE_SCHEMAS) + list(ARCHIVE_TABLES.values()) + [MATCH_TABLE]
+
+
+def _written_table(query):
+    """Returns the versioned table a write statement modifies, or None."""
+    match = WRITE_TARGET_PATTERN.match(query)
+    if match:
+        for table in _versioned_tables():
+            if table.lower() == match.group(1).lower():
+                return table
+    return None
+
+
+def _bump_table_versions(conn, tables):
+    """Increments the write version of base tables, inside the caller's transaction."""
+    conn.executemany("UPDATE TableVersions SET Version = Version + 1 WHERE Table_Name = ?",
+                     [(table,) for table in tables])
+
+
+_result_cache = OrderedDict()  # key -> (pickled size, results)
+_result_cache_lock = threading.Lock()
+_result_cache_state = {'bytes': 0, 'disk_conn': None, 'disk_path': None}
+result_cache_stats = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'bypassed': 0, 'evictions': 0}
+NONDETERMINISTIC_FUNCTIONS = {'random', 'randomblob', 'changes', 'total_changes', 'last_insert_rowid'}
+_cacheable_tables_memo = OrderedDict()  # query -> cacheable tables (or None); the tables never depend on params
+_cacheable_tables_lock = threading.Lock()
+
+
+@lru_cache(maxsize=1024)
+def _normalize_query(query):
+    """Strips comments and collapses whitespace so formatting differences share a cache entry."""
+    return " ".join(re.sub(r"--[^\n]*", " ", query).split()).rstrip(";")
+
+
+def _statement_reads(query, params=None):
+    """
+    Compiles a statement with EXPLAIN (so nothing runs) under an authorizer
+    and returns (tables read, functions called), as SQLite resolved them:
+    views report their base tables as well as themselves.
+    """
+    tables = set()
+    functions = set()
+
+    def authorize(action, arg1, arg2, db_name, source):
+        if action == sqlite3.SQLITE_READ:
+            tables.add(arg1)
+        elif action == sqlite3.SQLITE_FUNCTION:
+            functions.add(arg2.lower())
+        return sqlite3.SQLITE_OK
+
+    with get_connection() as conn:
+        conn.set_authorizer(authorize)
+        try:
+            conn.execute(f"EXPLAIN {query}", params or ())
+        finally:
+            conn.set_authorizer(None)
+    return tables, functions
+
+
+def _versioned_sources(reads):
+    """Maps the tables a statement read to versioned base tables; None if any has no write version."""
+    known = {table.lower(): (table,) for table in _versioned_tables()}
+    known.update({view.lower(): sources for view, sources in ARCHIVE_VIEWS.items()})
+    known.update({index.lower(): (spec[0],) for index, spec in SEARCH_INDEXES.items()})
+    # FTS5 reads the schema and its own shadow tables while connecting a search index
+    internal = ('sqlite_master', 'sqlite_schema') + tuple(f"{index.lower()}_" for index in SEARCH_INDEXES)
+    tables = set()
+    for name in reads:
+        if name.lower() in known:
+            tables.update(known[name.lower()])
+        elif not name.lower().startswith(internal):
+            return None
+    return tuple(sorted(tables)) or None
+
+
+def _cacheable_tables(query, params=None):
+    """
+    Returns the base tables a read query depends on, or None if its result
+    must not be cached (it reads something without a write version, does not
+    compile on a reader, or depends on the clock beyond the current date).
+    """
+    with _cacheable_tables_lock:
+        if query in _cacheable_tables_memo:
+            _cacheable_tables_memo.move_to_end(query)
+            return _cacheable_tables_memo[query]
+    tables = None
+    lowered = query.lower()
+    if (query.lstrip().upper().startswith(('SELECT', 'WITH'))
+            and lowered.count("'now'") == lowered.count("date('now')")):
+        try:
+            reads, functions = _statement_reads(query, params)
+        except sqlite3.Error:
+            reads, functions = None, None
+        if reads and not functions & NONDETERMINISTIC_FUNCTIONS:
+            tables = _versioned_sources(reads)
+    with _cacheable_tables_lock:
+        _cacheable_tables_memo[query] = tables
+        while len(_cacheable_tables_memo) > 1024:
+            _cacheable_tables_memo.popitem(last=False)
+    return tables
+
+
+def _sqlite_today(conn=None):
+    """Returns SQLite's DATE('now') (a UTC date), which every expiry query compares against."""
+    if conn is None:
+        with get_connection() as conn:
+            return conn.execute("SELECT DATE('now')").fetchone()[0]
+    return conn.execute("SELECT DATE('now')").fetchone()[0]
+
+
+def get_database_id(conn=None):
+    """
+    Returns the random id the database was created with (see DatabaseInfo).
+    Table versions restart when a database is rebuilt, so caches kept outside
+    it include this id to never serve one database's rows for another's.
+    """
+    if conn is None:
+        with get_connection() as conn:
+            return get_database_id(conn)
+    return conn.execute("SELECT Value FROM DatabaseInfo WHERE Key = 'database_id'").fetchone()[0]
+
+
+def _result_cache_key(conn, query, params, tables):
+    """Builds a cache key from the database id, normalized query, params and current table versions."""
+    placeholders = ", ".join("?" for _ in tables)
+    versions = conn.execute(
+        f"SELECT Table_Name, Version FROM TableVersions WHERE Table_Name IN ({placeholders}) ORDER BY Table_Name",
+        tables).fetchall()
+    normalized = _normalize_query(query)
+    today = _sqlite_today(conn) if "'now'" in normalized.lower() else ""
+    raw_key = repr((get_database_id(conn), normalized, tuple(params or ()), tuple(versions), today))
+    return hashlib.sha256(raw_key.encode()).hexdigest()
+
+
+def _disk_cache_connection():
+    """Returns the connection of the on-disk result tier, or None if disabled."""
+    if not RESULT_CACHE_DB:
+        return None
+    if _result_cache_state['disk_path'] != RESULT_CACHE_DB:
+        if _result_cache_state['disk_conn'] is not None:
+            _result_cache_state['disk_conn'].close()
+        conn = sqlite3.connect(RESULT_CACHE_DB, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = OFF")  # It is only a cache
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS ResultCache (
+                Cache_Key TEXT PRIMARY KEY,
+                Results BLOB,
+                Stored_At REAL
+            )
+        ''')
+        _result_cache_state['disk_conn'] = conn
+        _result_cache_state['disk_path'] = RESULT_CACHE_DB
+    return _result_cache_state['disk_conn']
+
+
+def _result_cache_get(key):
+    """Looks a key up in memory, then on disk. Returns the cached rows or None."""
+    with _result_cache_lock:
+        entry = _result_cache.get(key)
+        if entry is not None:
+            _result_cache.move_to_end(key)
+            result_cache_stats['hits'] += 1
+            return list(entry[1])
+        disk = _disk_cache_connection()
+        row = disk.execute("SELECT Results FROM ResultCache WHERE Cache_Key = ?", (key,)).fetchone() if disk else None
+        if row is None:
+            result_cache_stats['misses'] += 1
+            return None
+        result_cache_stats['disk_hits'] += 1
+    results = pickle.loads(row[0])
+    _result_cache_put(key, results, payload=row[0], to_disk=False)
+    return list(results)
+
+
+def _result_cache_put(key, results, payload=None, to_disk=True):
+    """Stores rows in the memory LRU (and the disk tier), evicting to stay under the byte bound."""
+    payload = payload or pickle.dumps(results, pickle.HIGHEST_PROTOCOL)
+    size = len(payload)
+    if size > RESULT_CACHE_MAX_ENTRY_BYTES:
+        return
+    with _result_cache_lock:
+        if key in _result_cache:
+            _result_cache_state['bytes'] -= _result_cache.pop(key)[0]
+        _result_cache[key] = (size, results)
+        _result_cache_state['bytes'] += size
+        while _result_cache_state['bytes'] > RESULT_CACHE_MAX_BYTES:
+            _result_cache_state['bytes'] -= _result_cache.popitem(last=False)[1][0]
+            result_cache_stats['evictions'] += 1
+        disk = _disk_cache_connection() if to_disk else None
+        if disk is not None:
+            disk.execute("INSERT OR REPLACE INTO ResultCache (Cache_Key, Results, Stored_At) VALUES (?, ?, ?)",
+                         (key, payload, time.time()))
+            disk.execute('''
+                DELETE FROM ResultCache WHERE Cache_Key IN (
+                    SELECT Cache_Key FROM ResultCache ORDER BY Stored_At DESC LIMIT -1 OFFSET ?
+                )
+            ''', (RESULT_CACHE_DB_MAX_ENTRIES,))
+            disk.commit()
+
+
+def clear_result_cache():
+    """Empties the in-memory and on-disk result caches."""
+    with _result_cache_lock:
+        _result_cache.clear()
+        _result_cache_state['bytes'] = 0
+        disk = _disk_cache_connection()
+        if disk is not None:
+            disk.execute("DELETE FROM ResultCache")
+            disk.commit()
+
+
+def _forget_database_caches():
+    """
+    Drops the in-process caches filled from the previous database: results,
+    cacheable-table lookups, charts and dropdown options. The disk tier
+    outlives the process and is keyed by database id instead.
+    """
+    with _result_cache_lock:
+        _result_cache.clear()
+        _result_cache_state['bytes'] = 0
+    with _cacheable_tables_lock:
+        _cacheable_tables_memo.clear()
+    with _chart_cache_lock:
+        _chart_cache.clear()
+    invalidate_unique_values()
+
+
+def get_result_cache_stats():
+    """Returns a snapshot of the result cache counters."""
+    with _result_cache_lock:
+        stats = dict(result_cache_stats)
+        stats['entries'] = len(_result_cache)
+        stats['bytes'] = _result_cache_state['bytes']
+    return stats
+
+
+def is_read_only_query(query):
+    """Returns True for statements that never modify the database."""
+    return query.lstrip().upper().startswith(READ_ONLY_PREFIXES)
+
+
+_query_stats = {}  # normalized query -> stats dict, see _record_query
+_query_stats_lock = threading.Lock()
+_slow_queries = deque(maxlen=SLOW_QUERY_LOG_SIZE)
+
+
+def _calling_function():
+    """Returns the name of the first public function above execute_query on the stack."""
+    frame = sys._getframe(2)
+    while frame is not None:
+        name = frame.f_code.co_name
+        if not name.startswith(('_', '<')) and name not in ('execute_query', 'read_frame', 'run'):
+            return name
+        frame = frame.f_back
+    return 'unknown'
+
+
+def _record_query(query, params, seconds, rows, cached, failed=False, caller=None):
+    """Adds one execution to the per-query latency histogram and counters."""
+    normalized = _normalize_query(query)
+    caller = caller or _calling_function()
+    with _query_stats_lock:
+        stats = _query_stats.get(normalized)
+        if stats is None:
+            stats = _query_stats[normalized] = {
+                'query_id': hashlib.sha1(normalized.encode()).hexdigest()[:12],
+                'calls': 0, 'errors': 0, 'cached': 0, 'rows': 0,
+                'total_seconds': 0.0, 'max_seconds': 0.0,
+                'buckets': [0] * len(LATENCY_BUCKETS), 'callers': Counter(),
+            }
+        stats['calls'] += 1
+        stats['errors'] += failed
+        stats['cached'] += cached
+        stats['rows'] += rows
+        stats['total_seconds'] += seconds
+        stats['max_seconds'] = max(stats['max_seconds'], seconds)
+        stats['callers'][caller] += 1
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                stats['buckets'][i] += 1
+                break
+    if seconds >= SLOW_QUERY_SECONDS and not cached:
+        _log_slow_query(normalized, params, seconds, rows, caller)
+
+
+def _log_slow_query(normalized, params, seconds, rows, caller):
+    """Logs a slow query together with its EXPLAIN QUERY PLAN."""
+    try:
+        with get_connection() as conn:
+            plan = [row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {normalized}", params or ()).fetchall()]
+    except sqlite3.Error as e:
+        plan = [f"unavailable: {e}"]
+    _slow_queries.append({
+        'at': datetime.now().isoformat(sep=' ', timespec='seconds'), 'seconds': seconds,
+        'rows': rows, 'caller': caller, 'query': normalized, 'plan': plan,
+    })
+    logger.warning("Slow query (%.3fs, %d rows) from %s: %s\n  plan: %s",
+                   seconds, rows, caller, normalized, "; ".join(plan))
+
+
+def get_query_stats():
+    """Returns per-query stats sorted by total time, most expensive first."""
+    with _query_stats_lock:
+        stats = [dict(stats, query=query, callers=dict(stats['callers']), buckets=list(stats['buckets']))
+                 for query, stats in _query_stats.items()]
+    for entry in stats:
+        entry['mean_seconds'] = entry['total_seconds'] / entry['calls']
+    return sorted(stats, key=lambda entry: entry['total_seconds'], reverse=True)
+
+
+def get_slow_queries():
+    """Returns the most recent slow queries, newest first."""
+    return list(reversed(_slow_queries))
+
+
+def reset_query_stats():
+    """Clears the per-query stats and the slow query log."""
+    with _query_stats_lock:
+        _query_stats.clear()
+        _slow_queries.clear()
+
+
+def _prometheus_label(value):
+    """Escapes a Prometheus label value."""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ')
+
+
+def export_prometheus_metrics():
+    """Renders query, pool and cache metrics in the Prometheus text exposition format."""
+    lines = [
+        "# HELP food_waste_query_seconds Query latency by normalized statement.",
+        "# TYPE food_waste_query_seconds histogram",
+    ]
+    stats = get_query_stats()
+    for entry in stats:
+        query_id = entry['query_id']
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS, entry['buckets']):
+            cumulative += count
+            lines.append(f'food_waste_query_seconds_bucket{{query_id="{query_id}",le="{bound}"}} {cumulative}')
+        lines.append(f'food_waste_query_seconds_bucket{{query_id="{query_id}",le="+Inf"}} {entry["calls"]}')
+        lines.append(f'food_waste_query_seconds_sum{{query_id="{query_id}"}} {entry["total_seconds"]}')
+        lines.append(f'food_waste_query_seconds_count{{query_id="{query_id}"}} {entry["calls"]}')
+    counters = [
+        ('food_waste_query_rows_total', 'Rows returned.', 'rows'),
+        ('food_waste_query_errors_total', 'Failed executions.', 'errors'),
+        ('food_waste_query_cache_hits_total', 'Executions served from the result cache.', 'cached'),
+    ]
+    for name, help_text, field in counters:
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+        lines += [f'{name}{{query_id="{entry["query_id"]}"}} {entry[field]}' for entry in stats]
+    lines += ["# HELP food_waste_query_calls_total Executions by calling function.",
+              "# TYPE food_waste_query_calls_total counter"]
+    for entry in stats:
+        for caller, count in entry['callers'].items():
+            lines.append(f'food_waste_query_calls_total{{query_id="{entry["query_id"]}",caller="{caller}"}} {count}')
+    lines += ["# HELP food_waste_query_info Statement text for each query_id.",
+              "# TYPE food_waste_query_info gauge"]
+    lines += [f'food_waste_query_info{{query_id="{entry["query_id"]}",query="{_prometheus_label(entry["query"][:200])}"}} 1'
+              for entry in stats]
+    gauges = [('pool', get_pool_metrics()), ('distinct_cache', get_distinct_cache_stats()),
+              ('result_cache', get_result_cache_stats())]
+    for prefix, values in gauges:
+        for key, value in values.items():
+            lines.append(f"food_waste_{prefix}_{key} {value}")
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    """Serves export_prometheus_metrics() at /metrics."""
+
+    def do_GET(self):
+        if self.path != '/metrics':
+            self.send_error(404)
+            return
+        body = export_prometheus_metrics().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Scrapes every few seconds would flood the console
+
+
+_metrics_server = {'server': None, 'lock': threading.Lock()}
+
+
+def start_metrics_server(port=None, host='127.0.0.1'):
+    """Serves Prometheus metrics on host:port from a daemon thread (once per process)."""
+    port = port or METRICS_PORT
+    with _metrics_server['lock']:
+        if _metrics_server['server'] is None and port:
+            server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+            _metrics_server['server'] = server
+    return _metrics_server['server']
+
+
 def execute_query(query, params=None):
     """Executes an SQL query and fetches the results."""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    if params:
-        cursor.execute(query, params)
-    else:
-        cursor.execute(query)
-    results = cursor.fetchall()
-    conn.commit()
-    conn.close()
+    started = time.perf_counter()
+    try:
+        results, cached = _run_query(query, params)
+    except Exception:
+        _record_query(query, params, time.perf_counter() - started, 0, False, failed=True)
+        raise
+    _record_query(query, params, time.perf_counter() - started, len(results), cached)
     return results
 
+
+def _run_query(query, params=None):
+    """Runs a statement through the result cache and pool. Returns (rows, served_from_cache)."""
+    read_only = is_read_only_query(query)
+    cache_tables = _cacheable_tables(query, params) if read_only and RESULT_CACHE_ENABLED else None
+    if read_only and cache_tables is None:
+        result_cache_stats['bypassed'] += 1
+    with get_connection(read_only=read_only) as conn:
+        cursor = conn.cursor()
+        try:
+            if cache_tables:
+                # Versions are read before the query, so a racing write can only
+                # make the stored rows newer than their key, never older
+                cache_key = _result_cache_key(conn, query, params, cache_tables)
+                cached = _result_cache_get(cache_key)
+                if cached is not None:
+                    return cached, True
+            if params:
+                cursor.execute(query, params)
+            else:
+                cursor.execute(query)
+            results = cursor.fetchall()
+            if cache_tables:
+                _result_cache_put(cache_key, results)
+            if not read_only:
+                table = _written_table(query)
+                if table and cursor.rowcount:
+                    _bump_table_versions(conn, [table])
+                conn.commit()
+                with _pool_lock:
+                    pool_metrics['commits'] += 1
+        except Exception:
+            if not read_only:
+                conn.rollback()
+                with _pool_lock:
+                    pool_metrics['rollbacks'] += 1
+            raise
+        finally:
+            cursor.close()
+    return results, False
+
+
+def _frame_column(name, values):
+    """Types one batch of column values: categories, datetimes or numbers, else strings."""
+    if name in FRAME_CATEGORY_COLUMNS:
+        return pd.Series(pd.Categorical(values))
+    if name in FRAME_DATETIME_COLUMNS:
+        return pd.to_datetime(pd.Series(values, dtype='object'), errors='coerce', format='ISO8601')
+    return pd.Series(values)
+
+
+def _concat_column(parts):
+    """
+    Joins a column's typed batches, merging categories and narrowing integers
+    to int32. union_categoricals needs one category dtype, but a batch whose
+    values are all NULL has empty float (or object) categories: those take
+    the other batches' dtype, and batches that still disagree fall back to object.
+    """
+    if isinstance(parts[0].dtype, pd.CategoricalDtype):
+        dtypes = {part.cat.categories.dtype for part in parts if len(part.cat.categories)}
+        dtype = dtypes.pop() if len(dtypes) == 1 else object
+        return pd.Series(union_categoricals([
+            part if part.cat.categories.dtype == dtype else part.cat.set_categories(part.cat.categories.astype(dtype))
+            for part in parts]))
+    column = pd.concat(parts, ignore_index=True) if len(parts) > 1 else parts[0]
+    int32 = np.iinfo(np.int32)
+    if column.dtype == np.int64 and (column.empty or int32.min <= column.min() <= column.max() <= int32.max):
+        return column.astype(np.int32)
+    return column
+
+
+def compact_frame(batches, columns):
+    """
+    Builds a memory-compact DataFrame from an iterable of row batches.
+
+    Each batch is typed as soon as it arrives, so only one batch of tuples
+    is alive at a time: FRAME_CATEGORY_COLUMNS become categoricals,
+    FRAME_DATETIME_COLUMNS datetime64 (unparseable values become NaT) and
+    integer columns int32 where they fit. Other columns keep pandas' usual types.
+    """
+    parts = {column: [] for column in columns}
+    for batch in batches:
+        for column, values in zip(columns, zip(*batch)):
+            parts[column].append(_frame_column(column, values))
+    if not columns or not parts[columns[0]]:
+        return pd.DataFrame({column: _frame_column(column, ()) for column in columns}, columns=columns)
+    return pd.DataFrame({column: _concat_column(parts[column]) for column in columns}, columns=columns)
+
+
+def read_frame(query, params=()):
+    """
+    Reads a query straight into a compact DataFrame (see compact_frame),
+    fetching FRAME_BATCH_ROWS at a time. Bypasses the result cache, so it
+    suits bulk reads; executions still count in the query statistics.
+    """
+    started = time.perf_counter()
+    try:
+        with get_connection() as conn:
+            cursor = conn.execute(query, params)
+            columns = [column[0] for column in cursor.description]
+            df = compact_frame(iter(lambda: cursor.fetchmany(FRAME_BATCH_ROWS), []), columns)
+    except Exception:
+        _record_query(query, params, time.perf_counter() - started, 0, False, failed=True)
+        raise
+    _record_query(query, params, time.perf_counter() - started, len(df), False)
+    return df
+
+
+def frame_bytes_per_row(df):
+    """Returns a DataFrame's in-memory size per row, counting the strings it holds."""
+    return df.memory_usage(deep=True).sum() / max(len(df), 1)
+
 def create_database():
     """Creates the SQLite database and tables."""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
+    with get_connection(read_only=False) as conn:
+        _create_tables(conn)
+    print(f"Database '{DB_NAME}' created successfully.")
 
-    # Create Providers table
-    cursor.execute('''
+
+TABLE_SCHEMAS = {
+    'Providers': '''
         CREATE TABLE IF NOT EXISTS Providers (
             Provider_ID INTEGER PRIMARY KEY,
             Name TEXT,
@@ -37,10 +833,8 @@ def create_database():
             City TEXT,
             Contact TEXT
         )
-    ''')
-
-    # Create Receivers table
-    cursor.execute('''
+    ''',
+    'Receivers': '''
         CREATE TABLE IF NOT EXISTS Receivers (
             Receiver_ID INTEGER PRIMARY KEY,
             Name TEXT,
@@ -48,10 +842,8 @@ def create_database():
             City TEXT,
             Contact TEXT
         )
-    ''')
-
-    # Create FoodListings table
-    cursor.execute('''
+    ''',
+    'FoodListings': '''
         CREATE TABLE IF NOT EXISTS FoodListings (
             Food_ID INTEGER PRIMARY KEY,
             Food_Name TEXT,
@@ -64,10 +856,8 @@ def create_database():
             Meal_Type TEXT,
             FOREIGN KEY (Provider_ID) REFERENCES Providers(Provider_ID)
         )
-    ''')
-
-    # Create Claims table
-    cursor.execute('''
+    ''',
+    'Claims': '''
         CREATE TABLE IF NOT EXISTS Claims (
             Claim_ID INTEGER PRIMARY KEY,
             Food_ID INTEGER,
@@ -77,61 +867,1102 @@ def create_database():
             FOREIGN KEY (Food_ID) REFERENCES FoodListings(Food_ID),
             FOREIGN KEY (Receiver_ID) REFERENCES Receivers(Receiver_ID)
         )
-    ''')
+    ''',
+}
 
+
+def _create_tables(conn):
+    """Creates the base tables, applies pending migrations and repairs interrupted search rebuilds."""
+    for ddl in TABLE_SCHEMAS.values():
+        conn.execute(ddl)
     conn.commit()
-    conn.close()
-    print(f"Database '{DB_NAME}' created successfully.")
+    migrate_database(conn)
+    if conn.execute("SELECT 1 FROM SearchState WHERE Deferred").fetchone():
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            _rebuild_search_indexes(conn)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
 
 
-def load_data_to_db():
-    """Loads data from CSV files into the SQLite database."""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
+def _set_search_deferred(conn, table):
+    """Switches off the search triggers of `table` until _rebuild_search_indexes, inside the caller's transaction."""
+    indexes = [index for index, spec in SEARCH_INDEXES.items() if spec[0] == table]
+    conn.executemany("UPDATE SearchState SET Deferred = 1 WHERE Index_Name = ?", [(index,) for index in indexes])
+    return indexes
 
-    # Load Providers data
-    try:
-        providers_df = pd.read_csv(os.path.join(DATA_DIR, 'providers_data.csv'))
-        providers_df.to_sql('Providers', conn, if_exists='replace', index=False)
-    except FileNotFoundError:
-        print(f"File not found: {os.path.join(DATA_DIR, 'providers_data.csv')}.  Please ensure the file exists or create a dummy file.")
 
-    # Load Receivers data
-    try:
-        receivers_df = pd.read_csv(os.path.join(DATA_DIR, 'receivers_data.csv'))
-        receivers_df.to_sql('Receivers', conn, if_exists='replace', index=False)
-    except FileNotFoundError:
-        print(f"File not found: {os.path.join(DATA_DIR, 'receivers_data.csv')}.  Please ensure the file exists or create a dummy file.")
-    # Load FoodListings data
-    try:
-        food_listings_df = pd.read_csv(os.path.join(DATA_DIR, 'food_listings_data.csv'))
-        food_listings_df.to_sql('FoodListings', conn, if_exists='replace', index=False)
-    except FileNotFoundError:
-        print(f"File not found: {os.path.join(DATA_DIR, 'food_listings_data.csv')}.  Please ensure the file exists or create a dummy file.")
+def _rebuild_search_indexes(conn, indexes=None):
+    """
+    Rebuilds search indexes (default: every deferred one) and switches their
+    triggers back on, inside the caller's transaction.
+    """
+    if indexes is None:
+        indexes = [row[0] for row in conn.execute("SELECT Index_Name FROM SearchState WHERE Deferred").fetchall()]
+    for index in indexes:
+        conn.execute(f"INSERT INTO {index} ({index}) VALUES ('rebuild')")
+    conn.executemany("UPDATE SearchState SET Deferred = 0 WHERE Index_Name = ?", [(index,) for index in indexes])
+    # Search results are cached under their content table's version
+    _bump_table_versions(conn, sorted({SEARCH_INDEXES[index][0] for index in indexes}))
+    return indexes
 
-    # Load Claims data
-    try:
-        claims_df = pd.read_csv(os.path.join(DATA_DIR, 'claims_data.csv'))
-        claims_df.to_sql('Claims', conn, if_exists='replace', index=False)
-    except FileNotFoundError:
-        print(f"File not found: {os.path.join(DATA_DIR, 'claims_data.csv')}.  Please ensure the file exists or create a dummy file.")
 
-    conn.commit()
-    conn.close()
+# Indexes backing the hot filters, joins and expiry scans. The three-column
+# FoodListings index covers the Location filter (alone or combined with the
+# others) and SELECT DISTINCT Location; the shorter ones cover filters that
+# start at Food_Type or Meal_Type.
+INDEXES = {
+    'idx_foodlistings_location_food_meal': 'FoodListings(Location, Food_Type, Meal_Type)',
+    'idx_foodlistings_food_meal': 'FoodListings(Food_Type, Meal_Type)',
+    'idx_foodlistings_meal': 'FoodListings(Meal_Type)',
+    'idx_foodlistings_provider': 'FoodListings(Provider_ID)',
+    'idx_foodlistings_expiry_location': 'FoodListings(Expiry_Date, Location)',
+    'idx_claims_food_status': 'Claims(Food_ID, Status)',
+    'idx_claims_receiver': 'Claims(Receiver_ID)',
+    'idx_claims_status': 'Claims(Status)',
+    'idx_claims_timestamp': 'Claims(Timestamp, Food_ID)',
+    'idx_providers_city': 'Providers(City)',
+    'idx_receivers_city': 'Receivers(City)',
+    'idx_receivers_type': 'Receivers(Type)',
+}
+
+# Indexes that let fetch_page() walk the listing and match views in the
+# order of any sortable column (the index's implicit rowid is the tiebreak).
+SORT_INDEXES = {
+    'idx_foodlistings_name': 'FoodListings(Food_Name)',
+    'idx_foodlistings_quantity': 'FoodListings(Quantity)',
+    'idx_foodlistings_expiry': 'FoodListings(Expiry_Date)',
+    'idx_foodlistings_location': 'FoodListings(Location)',
+    'idx_foodlistings_food_type': 'FoodListings(Food_Type)',
+    f'idx_{MATCH_TABLE.lower()}_score': f'{MATCH_TABLE}(Score)',
+}
+
+
+def _migration_restore_typed_schema(conn):
+    """Rebuilds tables that lost their declared schema to to_sql(if_exists='replace')."""
+    for table, ddl in TABLE_SCHEMAS.items():
+        columns = conn.execute(f"PRAGMA table_info({table})").fetchall()
+        if not columns or any(column[5] for column in columns):
+            continue  # Missing (created below) or still has its primary key
+        conn.execute(f"ALTER TABLE {table} RENAME TO {table}_untyped")
+        conn.execute(ddl)
+        names = ", ".join(column[1] for column in columns)
+        conn.execute(f"INSERT OR REPLACE INTO {table} ({names}) SELECT {names} FROM {table}_untyped")
+        conn.execute(f"DROP TABLE {table}_untyped")
+    for ddl in TABLE_SCHEMAS.values():
+        conn.execute(ddl)
+
+
+def _migration_create_indexes(conn):
+    """Creates the indexes for the listing filters, joins and expiry scans."""
+    for name, target in INDEXES.items():
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target}")
+
+
+def _migration_create_sync_watermarks(conn):
+    """Creates the table recording which version of each CSV file was last synced."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS SyncWatermarks (
+            File_Name TEXT PRIMARY KEY,
+            Table_Name TEXT,
+            Size INTEGER,
+            Mtime REAL,
+            Checksum TEXT,
+            Synced_At DATETIME
+        )
+    ''')
+
+
+def _migration_create_summary_tables(conn):
+    """Creates write-version tracking, summary state, and trigger-maintained claim counters."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS TableVersions (
+            Table_Name TEXT PRIMARY KEY,
+            Version INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    conn.executemany("INSERT OR IGNORE INTO TableVersions (Table_Name) VALUES (?)",
+                     [(table,) for table in TABLE_SCHEMAS])
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS SummaryState (
+            Summary_Name TEXT PRIMARY KEY,
+            Refreshed_At DATETIME,
+            Source_Signature TEXT
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS ClaimCountsByStatus (
+            Status TEXT PRIMARY KEY,
+            Claim_Count INTEGER NOT NULL
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS ClaimCountsByReceiver (
+            Receiver_ID INTEGER PRIMARY KEY,
+            Claim_Count INTEGER NOT NULL
+        )
+    ''')
+    conn.execute('''
+        INSERT INTO ClaimCountsByStatus (Status, Claim_Count)
+        SELECT IFNULL(Status, ''), COUNT(*) FROM Claims GROUP BY IFNULL(Status, '')
+    ''')
+    conn.execute('''
+        INSERT INTO ClaimCountsByReceiver (Receiver_ID, Claim_Count)
+        SELECT Receiver_ID, COUNT(*) FROM Claims WHERE Receiver_ID IS NOT NULL GROUP BY Receiver_ID
+    ''')
+    # NULL statuses are counted under '' (a NULL primary key would never conflict)
+    increment = '''
+        INSERT INTO ClaimCountsByStatus (Status, Claim_Count) VALUES (IFNULL(NEW.Status, ''), 1)
+            ON CONFLICT(Status) DO UPDATE SET Claim_Count = Claim_Count + 1;
+        INSERT INTO ClaimCountsByReceiver (Receiver_ID, Claim_Count)
+            SELECT NEW.Receiver_ID, 1 WHERE NEW.Receiver_ID IS NOT NULL
+            ON CONFLICT(Receiver_ID) DO UPDATE SET Claim_Count = Claim_Count + 1;
+    '''
+    decrement = '''
+        UPDATE ClaimCountsByStatus SET Claim_Count = Claim_Count - 1 WHERE Status = IFNULL(OLD.Status, '');
+        UPDATE ClaimCountsByReceiver SET Claim_Count = Claim_Count - 1 WHERE Receiver_ID = OLD.Receiver_ID;
+    '''
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS claims_counts_insert AFTER INSERT ON Claims BEGIN {increment} END")
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS claims_counts_delete AFTER DELETE ON Claims BEGIN {decrement} END")
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS claims_counts_update AFTER UPDATE OF Status, Receiver_ID ON Claims
+        BEGIN {decrement} {increment} END
+    """)
+
+
+def _migration_create_archive(conn):
+    """Creates archive tables for swept listings/claims and the hot + archive views."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS FoodListingsArchive (
+            Food_ID INTEGER PRIMARY KEY,
+            Food_Name TEXT,
+            Quantity INTEGER,
+            Expiry_Date DATE,
+            Provider_ID INTEGER,
+            Provider_Type TEXT,
+            Location TEXT,
+            Food_Type TEXT,
+            Meal_Type TEXT,
+            Archived_At DATETIME
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS ClaimsArchive (
+            Claim_ID INTEGER PRIMARY KEY,
+            Food_ID INTEGER,
+            Receiver_ID INTEGER,
+            Status TEXT,
+            Timestamp DATETIME,
+            Archived_At DATETIME
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_foodlistingsarchive_expiry_location "
+                 "ON FoodListingsArchive(Expiry_Date, Location)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_claimsarchive_food ON ClaimsArchive(Food_ID)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_claimsarchive_receiver ON ClaimsArchive(Receiver_ID)")
+    for view, (hot, archive) in ARCHIVE_VIEWS.items():
+        columns = ", ".join(column[1] for column in conn.execute(f"PRAGMA table_info({hot})").fetchall())
+        conn.execute(f"CREATE VIEW IF NOT EXISTS {view} AS "
+                     f"SELECT {columns} FROM {hot} UNION ALL SELECT {columns} FROM {archive}")
+    conn.executemany("INSERT OR IGNORE INTO TableVersions (Table_Name) VALUES (?)",
+                     [(archive,) for archive in ARCHIVE_TABLES.values()])
+    # The claim counters cover all history, so moving a claim into the
+    # archive (insert there first, then delete) must not decrement them
+    conn.execute("DROP TRIGGER IF EXISTS claims_counts_delete")
+    conn.execute('''
+        CREATE TRIGGER claims_counts_delete AFTER DELETE ON Claims
+        WHEN NOT EXISTS (SELECT 1 FROM ClaimsArchive WHERE Claim_ID = OLD.Claim_ID)
+        BEGIN
+            UPDATE ClaimCountsByStatus SET Claim_Count = Claim_Count - 1 WHERE Status = IFNULL(OLD.Status, '');
+            UPDATE ClaimCountsByReceiver SET Claim_Count = Claim_Count - 1 WHERE Receiver_ID = OLD.Receiver_ID;
+        END
+    ''')
+
+
+def _migration_add_claim_quantity(conn):
+    """Records how much of a listing each claim reserved (NULL for legacy claims)."""
+    for table in ('Claims', 'ClaimsArchive'):
+        columns = [column[1] for column in conn.execute(f"PRAGMA table_info({table})").fetchall()]
+        if 'Quantity' not in columns:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN Quantity INTEGER")
+    conn.execute("DROP VIEW IF EXISTS AllClaims")
+    columns = ", ".join(column[1] for column in conn.execute("PRAGMA table_info(Claims)").fetchall())
+    conn.execute(f"CREATE VIEW AllClaims AS SELECT {columns} FROM Claims UNION ALL SELECT {columns} FROM ClaimsArchive")
+
+
+def _migration_create_match_allocations(conn):
+    """Creates the table the matching engine writes its allocations to."""
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS {MATCH_TABLE} (
+            Food_ID INTEGER PRIMARY KEY,
+            Receiver_ID INTEGER NOT NULL,
+            Score REAL,
+            City_Match INTEGER,
+            Matched_At DATETIME
+        )
+    ''')
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_matchallocations_receiver ON {MATCH_TABLE}(Receiver_ID)")
+    conn.execute("INSERT OR IGNORE INTO TableVersions (Table_Name) VALUES (?)", (MATCH_TABLE,))
+
+
+def _migration_create_search_indexes(conn):
+    """Creates the FTS5 search indexes, the triggers keeping them in sync, and fills them."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS SearchState (
+            Index_Name TEXT PRIMARY KEY,
+            Deferred INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    conn.executemany("INSERT OR IGNORE INTO SearchState (Index_Name) VALUES (?)", [(index,) for index in SEARCH_INDEXES])
+    for index, (table, key, columns, _) in SEARCH_INDEXES.items():
+        names = ", ".join(columns)
+        new_values = ", ".join(f"NEW.{column}" for column in columns)
+        old_values = ", ".join(f"OLD.{column}" for column in columns)
+        conn.execute(f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS {index} USING fts5(
+                {names}, content='{table}', content_rowid='{key}',
+                tokenize='{SEARCH_TOKENIZER}', prefix='{" ".join(map(str, SEARCH_PREFIX_LENGTHS))}'
+            )
+        """)
+        # External-content index: removing a row needs the values it was indexed with.
+        # Bulk loads switch the triggers off (SearchState.Deferred) and rebuild once instead.
+        insert = f"INSERT INTO {index} (rowid, {names}) VALUES (NEW.{key}, {new_values});"
+        delete = f"INSERT INTO {index} ({index}, rowid, {names}) VALUES ('delete', OLD.{key}, {old_values});"
+        active = f"WHEN NOT EXISTS (SELECT 1 FROM SearchState WHERE Index_Name = '{index}' AND Deferred)"
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS {index.lower()}_insert AFTER INSERT ON {table} "
+                     f"{active} BEGIN {insert} END")
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS {index.lower()}_delete AFTER DELETE ON {table} "
+                     f"{active} BEGIN {delete} END")
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {index.lower()}_update AFTER UPDATE OF {key}, {names} ON {table}
+            {active} BEGIN {delete} {insert} END
+        """)
+        conn.execute(f"INSERT INTO {index} ({index}) VALUES ('rebuild')")
+
+
+def _migration_create_sort_indexes(conn):
+    """Creates the indexes backing the sortable columns of the paginated views."""
+    for name, target in SORT_INDEXES.items():
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target}")
+
+
+def _migration_create_city_counts(conn):
+    """Creates the trigger-maintained count of providers and receivers per city."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS CityCounts (
+            City TEXT PRIMARY KEY,
+            Provider_Count INTEGER NOT NULL DEFAULT 0,
+            Receiver_Count INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    # NULL cities are counted under '', as in ClaimCountsByStatus
+    for table, column in (('Providers', 'Provider_Count'), ('Receivers', 'Receiver_Count')):
+        conn.execute(f'''
+            INSERT INTO CityCounts (City, {column})
+            SELECT IFNULL(City, ''), COUNT(*) FROM {table} WHERE true GROUP BY IFNULL(City, '')
+            ON CONFLICT(City) DO UPDATE SET {column} = excluded.{column}
+        ''')
+        increment = f'''
+            INSERT INTO CityCounts (City, {column}) VALUES (IFNULL(NEW.City, ''), 1)
+                ON CONFLICT(City) DO UPDATE SET {column} = {column} + 1;
+        '''
+        decrement = f"UPDATE CityCounts SET {column} = {column} - 1 WHERE City = IFNULL(OLD.City, '');"
+        name = f"{table.lower()}_city_counts"
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS {name}_insert AFTER INSERT ON {table} BEGIN {increment} END")
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS {name}_delete AFTER DELETE ON {table} BEGIN {decrement} END")
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS {name}_update AFTER UPDATE OF City ON {table} "
+                     f"BEGIN {decrement} {increment} END")
+
+
+def _migration_create_database_identity(conn):
+    """Gives the database a random id that caches outside it are keyed by (see get_database_id)."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS DatabaseInfo (
+            Key TEXT PRIMARY KEY,
+            Value TEXT NOT NULL
+        )
+    ''')
+    conn.execute("INSERT OR IGNORE INTO DatabaseInfo (Key, Value) VALUES ('database_id', ?)", (str(uuid.uuid4()),))
+
+
+def _migration_create_receiver_history(conn):
+    """
+    Creates the trigger-maintained claim history the matching engine reads:
+    claims and completed claims per receiver and food type, over hot and
+    archived claims. Also widens the expiry index so the open listings the
+    matcher groups are read from the index alone.
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS ReceiverHistory (
+            Receiver_ID INTEGER NOT NULL,
+            Food_Type TEXT NOT NULL,
+            Claims INTEGER NOT NULL DEFAULT 0,
+            Completed INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (Receiver_ID, Food_Type)
+        ) WITHOUT ROWID
+    ''')
+    # NULL food types are counted under '', as in ClaimCountsByStatus
+    for listings, claims in [('FoodListings', 'Claims'), tuple(ARCHIVE_TABLES.values())]:
+        conn.execute(f'''
+            INSERT INTO ReceiverHistory (Receiver_ID, Food_Type, Claims, Completed)
+            SELECT c.Receiver_ID, IFNULL(fl.Food_Type, ''), COUNT(*), SUM(IFNULL(c.Status = 'Completed', 0))
+            FROM {claims} c
+            JOIN {listings} fl ON fl.Food_ID = c.Food_ID
+            WHERE c.Receiver_ID IS NOT NULL
+            GROUP BY c.Receiver_ID, IFNULL(fl.Food_Type, '')
+            ON CONFLICT(Receiver_ID, Food_Type) DO UPDATE SET
+                Claims = Claims + excluded.Claims, Completed = Completed + excluded.Completed
+        ''')
+    # A claim counts while it and its listing are both hot or both archived.
+    # The sweep inserts into the archive before deleting, so the delete
+    # triggers leave archived claims counted.
+    add_claim = '''
+        INSERT INTO ReceiverHistory (Receiver_ID, Food_Type, Claims, Completed)
+            SELECT NEW.Receiver_ID, IFNULL(fl.Food_Type, ''), 1, IFNULL(NEW.Status = 'Completed', 0)
+            FROM FoodListings fl WHERE fl.Food_ID = NEW.Food_ID AND NEW.Receiver_ID IS NOT NULL
+            ON CONFLICT(Receiver_ID, Food_Type) DO UPDATE SET
+                Claims = Claims + 1, Completed = Completed + excluded.Completed;
+    '''
+    remove_claim = '''
+        UPDATE ReceiverHistory SET Claims = Claims - 1, Completed = Completed - IFNULL(OLD.Status = 'Completed', 0)
+            WHERE Receiver_ID = OLD.Receiver_ID
+              AND Food_Type = (SELECT IFNULL(Food_Type, '') FROM FoodListings WHERE Food_ID = OLD.Food_ID);
+    '''
+    add_listing = '''
+        INSERT INTO ReceiverHistory (Receiver_ID, Food_Type, Claims, Completed)
+            SELECT c.Receiver_ID, IFNULL(NEW.Food_Type, ''), COUNT(*), SUM(IFNULL(c.Status = 'Completed', 0))
+            FROM Claims c WHERE c.Food_ID = NEW.Food_ID AND c.Receiver_ID IS NOT NULL
+            GROUP BY c.Receiver_ID
+            ON CONFLICT(Receiver_ID, Food_Type) DO UPDATE SET
+                Claims = Claims + excluded.Claims, Completed = Completed + excluded.Completed;
+    '''
+    remove_listing = '''
+        UPDATE ReceiverHistory SET
+            Claims = Claims - (SELECT COUNT(*) FROM Claims c
+                               WHERE c.Food_ID = OLD.Food_ID AND c.Receiver_ID = ReceiverHistory.Receiver_ID),
+            Completed = Completed - (SELECT SUM(IFNULL(c.Status = 'Completed', 0)) FROM Claims c
+                                     WHERE c.Food_ID = OLD.Food_ID AND c.Receiver_ID = ReceiverHistory.Receiver_ID)
+            WHERE Food_Type = IFNULL(OLD.Food_Type, '')
+              AND Receiver_ID IN (SELECT Receiver_ID FROM Claims WHERE Food_ID = OLD.Food_ID);
+    '''
+    claim_hot = "WHEN NOT EXISTS (SELECT 1 FROM ClaimsArchive WHERE Claim_ID = OLD.Claim_ID)"
+    listing_hot = "WHEN NOT EXISTS (SELECT 1 FROM FoodListingsArchive WHERE Food_ID = OLD.Food_ID)"
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS receiver_history_claim_insert AFTER INSERT ON Claims "
+                 f"BEGIN {add_claim} END")
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS receiver_history_claim_delete AFTER DELETE ON Claims "
+                 f"{claim_hot} BEGIN {remove_claim} END")
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS receiver_history_claim_update "
+                 f"AFTER UPDATE OF Food_ID, Receiver_ID, Status ON Claims BEGIN {remove_claim} {add_claim} END")
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS receiver_history_listing_insert AFTER INSERT ON FoodListings "
+                 f"BEGIN {add_listing} END")
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS receiver_history_listing_delete AFTER DELETE ON FoodListings "
+                 f"{listing_hot} BEGIN {remove_listing} END")
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS receiver_history_listing_update "
+                 f"AFTER UPDATE OF Food_ID, Food_Type ON FoodListings BEGIN {remove_listing} {add_listing} END")
+    # Covers the open-listing scan of _load_match_inputs; as its prefix it
+    # serves every query idx_foodlistings_expiry_location did
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_foodlistings_expiry_location_food_quantity "
+                 "ON FoodListings(Expiry_Date, Location, Food_Type, Quantity)")
+    conn.execute("DROP INDEX IF EXISTS idx_foodlistings_expiry_location")
+
+
+def _migration_create_listing_totals(conn):
+    """
+    Creates the trigger-maintained totals the provider, food type and expiry
+    questions are answered from, and drops the snapshot tables they replace:
+    units contributed (listed plus claimed) per provider type, over all
+    history and over hot rows; claims per provider and per food type; and
+    listings per expiry date and location.
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS QuantityByProviderType (
+            Provider_Type TEXT PRIMARY KEY,
+            Listing_Count INTEGER NOT NULL DEFAULT 0,
+            Quantity INTEGER NOT NULL DEFAULT 0,
+            Hot_Listing_Count INTEGER NOT NULL DEFAULT 0,
+            Hot_Quantity INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS ClaimCountsByProvider (
+            Provider_ID INTEGER PRIMARY KEY,
+            Claim_Count INTEGER NOT NULL DEFAULT 0,
+            Completed_Count INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS ClaimCountsByFoodType (
+            Food_Type TEXT PRIMARY KEY,
+            Claim_Count INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS ListingCountsByExpiry (
+            Expiry_Date DATE NOT NULL,
+            Location TEXT NOT NULL,
+            Listing_Count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (Expiry_Date, Location)
+        ) WITHOUT ROWID
+    ''')
+
+    # Each statement adds its SELECT's rows to a counter table. NULL keys are
+    # counted under '', as in ClaimCountsByStatus, except that listings
+    # without a Provider_ID are skipped, as ClaimCountsByReceiver does.
+    def add(table, key, columns, select):
+        updates = ", ".join(f"{column} = {column} + excluded.{column}" for column in columns)
+        return f'''
+            INSERT INTO {table} ({key}, {", ".join(columns)})
+                {select}
+                ON CONFLICT({key}) DO UPDATE SET {updates};
+        '''
+
+    quantity_columns = ['Listing_Count', 'Quantity', 'Hot_Listing_Count', 'Hot_Quantity']
+
+    # `sign` adds (1) or removes (-1) a row. `history` is 0 when a delete only
+    # moves the row into the archive, which keeps it in the all-history
+    # columns. A listing brings its hot claims' units with it.
+    def listing_quantity(row, sign, history):
+        quantity = f"(IFNULL({row}.Quantity, 0) + IFNULL(SUM(c.Quantity), 0))"
+        return add('QuantityByProviderType', 'Provider_Type', quantity_columns, f'''
+            SELECT IFNULL({row}.Provider_Type, ''), {sign} * {history}, {sign} * {history} * {quantity},
+                   {sign}, {sign} * {quantity}
+            FROM Claims c WHERE c.Food_ID = {row}.Food_ID
+        ''')
+
+    def claim_quantity(row, sign, history):
+        quantity = f"IFNULL({row}.Quantity, 0)"
+        return add('QuantityByProviderType', 'Provider_Type', quantity_columns, f'''
+            SELECT IFNULL(fl.Provider_Type, ''), 0, {sign} * {history} * {quantity}, 0, {sign} * {quantity}
+            FROM FoodListings fl WHERE fl.Food_ID = {row}.Food_ID
+        ''')
+
+    # Claim counts cover all history, so archiving a row leaves them alone.
+    # Grouping skips the statement for listings without claims.
+    def listing_claims(row, sign):
+        completed = f"{sign} * SUM(IFNULL(c.Status = 'Completed', 0))"
+        return (add('ClaimCountsByProvider', 'Provider_ID', ['Claim_Count', 'Completed_Count'], f'''
+                    SELECT {row}.Provider_ID, {sign} * COUNT(*), {completed}
+                    FROM Claims c WHERE c.Food_ID = {row}.Food_ID AND {row}.Provider_ID IS NOT NULL
+                    GROUP BY c.Food_ID
+                ''')
+                + add('ClaimCountsByFoodType', 'Food_Type', ['Claim_Count'], f'''
+                    SELECT IFNULL({row}.Food_Type, ''), {sign} * COUNT(*)
+                    FROM Claims c WHERE c.Food_ID = {row}.Food_ID GROUP BY c.Food_ID
+                '''))
+
+    def claim_claims(row, sign):
+        completed = f"{sign} * IFNULL({row}.Status = 'Completed', 0)"
+        return (add('ClaimCountsByProvider', 'Provider_ID', ['Claim_Count', 'Completed_Count'], f'''
+                    SELECT fl.Provider_ID, {sign}, {completed}
+                    FROM FoodListings fl WHERE fl.Food_ID = {row}.Food_ID AND fl.Provider_ID IS NOT NULL
+                ''')
+                + add('ClaimCountsByFoodType', 'Food_Type', ['Claim_Count'], f'''
+                    SELECT IFNULL(fl.Food_Type, ''), {sign}
+                    FROM FoodListings fl WHERE fl.Food_ID = {row}.Food_ID
+                '''))
+
+    def listing_expiry(row, sign):
+        return add('ListingCountsByExpiry', 'Expiry_Date, Location', ['Listing_Count'], f'''
+            SELECT IFNULL({row}.Expiry_Date, ''), IFNULL({row}.Location, ''), {sign} WHERE true
+        ''')
+
+    # Claims count while they and their listing are both hot or both archived
+    for (listings, claims), hot in ((('FoodListings', 'Claims'), 1), (tuple(ARCHIVE_TABLES.values()), 0)):
+        statements = [
+            add('QuantityByProviderType', 'Provider_Type', quantity_columns, f'''
+                SELECT IFNULL(Provider_Type, ''), COUNT(*), SUM(IFNULL(Quantity, 0)),
+                       {hot} * COUNT(*), {hot} * SUM(IFNULL(Quantity, 0))
+                FROM {listings} WHERE true GROUP BY 1
+            '''),
+            add('QuantityByProviderType', 'Provider_Type', quantity_columns, f'''
+                SELECT IFNULL(fl.Provider_Type, ''), 0, SUM(IFNULL(c.Quantity, 0)), 0, {hot} * SUM(IFNULL(c.Quantity, 0))
+                FROM {claims} c JOIN {listings} fl ON fl.Food_ID = c.Food_ID WHERE true GROUP BY 1
+            '''),
+            add('ClaimCountsByProvider', 'Provider_ID', ['Claim_Count', 'Completed_Count'], f'''
+                SELECT fl.Provider_ID, COUNT(*), SUM(IFNULL(c.Status = 'Completed', 0))
+                FROM {claims} c JOIN {listings} fl ON fl.Food_ID = c.Food_ID WHERE fl.Provider_ID IS NOT NULL
+                GROUP BY 1
+            '''),
+            add('ClaimCountsByFoodType', 'Food_Type', ['Claim_Count'], f'''
+                SELECT IFNULL(fl.Food_Type, ''), COUNT(*)
+                FROM {claims} c JOIN {listings} fl ON fl.Food_ID = c.Food_ID WHERE true GROUP BY 1
+            '''),
+            add('ListingCountsByExpiry', 'Expiry_Date, Location', ['Listing_Count'], f'''
+                SELECT IFNULL(Expiry_Date, ''), IFNULL(Location, ''), COUNT(*) FROM {listings} WHERE true GROUP BY 1, 2
+            '''),
+        ]
+        for statement in statements:
+            conn.execute(statement)
+
+    listing_hot = "NOT EXISTS (SELECT 1 FROM FoodListingsArchive WHERE Food_ID = OLD.Food_ID)"
+    claim_hot = "NOT EXISTS (SELECT 1 FROM ClaimsArchive WHERE Claim_ID = OLD.Claim_ID)"
+    triggers = {
+        'listing_totals_insert': ("AFTER INSERT ON FoodListings",
+                                  listing_quantity('NEW', 1, 1) + listing_claims('NEW', 1) + listing_expiry('NEW', 1)),
+        'listing_totals_delete': ("AFTER DELETE ON FoodListings", listing_quantity('OLD', -1, f"({listing_hot})")),
+        'listing_counts_delete': (f"AFTER DELETE ON FoodListings WHEN {listing_hot}",
+                                  listing_claims('OLD', -1) + listing_expiry('OLD', -1)),
+        'listing_quantity_update': ("AFTER UPDATE OF Food_ID, Quantity, Provider_Type ON FoodListings",
+                                    listing_quantity('OLD', -1, 1) + listing_quantity('NEW', 1, 1)),
+        'listing_claims_update': ("AFTER UPDATE OF Food_ID, Provider_ID, Food_Type ON FoodListings",
+                                  listing_claims('OLD', -1) + listing_claims('NEW', 1)),
+        'listing_expiry_update': ("AFTER UPDATE OF Expiry_Date, Location ON FoodListings",
+                                  listing_expiry('OLD', -1) + listing_expiry('NEW', 1)),
+        'claim_totals_insert': ("AFTER INSERT ON Claims", claim_quantity('NEW', 1, 1) + claim_claims('NEW', 1)),
+        'claim_totals_delete': ("AFTER DELETE ON Claims", claim_quantity('OLD', -1, f"({claim_hot})")),
+        'claim_counts_delete': (f"AFTER DELETE ON Claims WHEN {claim_hot}", claim_claims('OLD', -1)),
+        'claim_quantity_update': ("AFTER UPDATE OF Food_ID, Quantity ON Claims",
+                                  claim_quantity('OLD', -1, 1) + claim_quantity('NEW', 1, 1)),
+        'claim_claims_update': ("AFTER UPDATE OF Food_ID, Status ON Claims",
+                                claim_claims('OLD', -1) + claim_claims('NEW', 1)),
+    }
+    for name, (event, body) in triggers.items():
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {event} BEGIN {body} END")
+
+    replaced = ['SummaryProviderTypeQuantity', 'SummaryTotalQuantity', 'SummaryProviderSuccessRate',
+                'SummaryFoodTypeDemand', 'SummaryExpiredByLocation']
+    for table in replaced:
+        conn.execute(f"DROP TABLE IF EXISTS {table}")
+    conn.executemany("DELETE FROM SummaryState WHERE Summary_Name = ?", [(table,) for table in replaced])
+
+
+# (version, description, function) tuples, applied in order. The schema
+# version is tracked in PRAGMA user_version; never renumber or edit an
+# entry once it has shipped, add a new one instead.
+MIGRATIONS = [
+    (1, "Restore typed schema", _migration_restore_typed_schema),
+    (2, "Indexes for listing filters, joins and expiry scans", _migration_create_indexes),
+    (3, "Sync watermarks", _migration_create_sync_watermarks),
+    (4, "Table versions, summary state and claim counters", _migration_create_summary_tables),
+    (5, "Expiry archive tables and views", _migration_create_archive),
+    (6, "Claimed quantity", _migration_add_claim_quantity),
+    (7, "Match allocations", _migration_create_match_allocations),
+    (8, "Full-text search indexes", _migration_create_search_indexes),
+    (9, "Indexes for sortable view columns", _migration_create_sort_indexes),
+    (10, "Provider and receiver counts per city", _migration_create_city_counts),
+    (11, "Database identity", _migration_create_database_identity),
+    (12, "Receiver claim history and open listing index", _migration_create_receiver_history),
+    (13, "Listing totals and expiry counts", _migration_create_listing_totals),
+]
+
+
+def migrate_database(conn):
+    """Applies pending schema migrations, each in its own transaction."""
+    current_version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for version, description, migration in MIGRATIONS:
+        if version <= current_version:
+            continue
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            migration(conn)
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        print(f"Applied migration {version}: {description}")
+
+
+# Queries that must stay index-backed, as (table, query, params). Each is
+# checked with EXPLAIN QUERY PLAN by find_full_scans().
+INDEXED_QUERIES = [
+    ('FoodListings', "SELECT * FROM FoodListings WHERE Location = ?", ('Anytown',)),
+    ('FoodListings', "SELECT * FROM FoodListings WHERE Food_Type = ?", ('Produce',)),
+    ('FoodListings', "SELECT * FROM FoodListings WHERE Meal_Type = ?", ('Lunch',)),
+    ('FoodListings', "SELECT * FROM FoodListings WHERE Food_Type = ? AND Meal_Type = ?", ('Produce', 'Lunch')),
+    ('FoodListings', "SELECT * FROM FoodListings WHERE Provider_ID = ?", (1,)),
+    ('FoodListings', "SELECT DISTINCT Location FROM FoodListings", ()),
+    ('FoodListings', "SELECT DISTINCT Food_Type FROM FoodListings", ()),
+    ('FoodListings', "SELECT DISTINCT Meal_Type FROM FoodListings", ()),
+    ('FoodListings', "SELECT Location, COUNT(*) FROM FoodListings WHERE Expiry_Date < DATE('now') GROUP BY Location", ()),
+    ('Claims', "SELECT * FROM Claims WHERE Food_ID = ?", (1001,)),
+    ('Claims', "SELECT * FROM Claims WHERE Receiver_ID = ?", (101,)),
+    ('Providers', "SELECT Name, Contact FROM Providers WHERE City = ?", ('Anytown',)),
+]
+# Keyset pages of the sortable views (see fetch_page) must follow an index, not sort the table
+INDEXED_QUERIES += [
+    ('FoodListings', f"SELECT * FROM FoodListings WHERE ({column}, Food_ID) > (?, ?) ORDER BY {column}, Food_ID LIMIT 51",
+     ('', 0))
+    for column in LISTING_SORT_COLUMNS if column != 'Food_ID'
+] + [
+    (MATCH_TABLE, f"SELECT * FROM {MATCH_TABLE} WHERE (Score, Food_ID) > (?, ?) ORDER BY Score, Food_ID LIMIT 51", (0, 0)),
+]
+
+
+def find_full_scans(queries=INDEXED_QUERIES):
+    """
+    Runs EXPLAIN QUERY PLAN over queries and returns the ones that scan a table
+    without an index or sort all of its rows for an ORDER BY, as (query, plan
+    detail) pairs. An empty list means every access path is index-backed; use
+    it as a regression check after schema changes.
+    """
+    scans = []
+    for table, query, params in queries:
+        for row in execute_query(f"EXPLAIN QUERY PLAN {query}", params):
+            detail = row[-1]
+            if (detail.startswith(f"SCAN {table}") and "INDEX" not in detail) or detail == "USE TEMP B-TREE FOR ORDER BY":
+                scans.append((query, detail))
+    return scans
+
+
+def load_data_to_db(mode='replace', chunksize=INGEST_CHUNKSIZE, parallel=True, progress=None):
+    """
+    Loads data from CSV files into the SQLite database.
+
+    Each CSV is streamed in chunks of `chunksize` rows and written with
+    executemany, so memory stays bounded. 'replace' swaps each table's rows
+    in one transaction; the other modes commit every chunk. `mode` is 'replace'
+    (clear the table first), 'append' (skip rows whose key already exists)
+    or 'upsert' (insert new rows, update existing ones by primary key).
+    Tables without dependencies between them are loaded in parallel.
+    `progress(table, rows, seconds)` is called after every chunk.
+    Returns per-table row counts and rows/sec.
+    """
+    with get_connection(read_only=False) as conn:
+        _create_tables(conn)
+
+    stats = _run_in_stages(lambda table: ingest_csv(table, mode, chunksize, progress), parallel)
+    for table, table_stats in stats.items():
+        if table_stats is not None:
+            _record_watermark(table)
+    invalidate_unique_values()
+    with get_connection(read_only=False) as conn:
+        conn.execute("PRAGMA optimize")
     print("Data loaded successfully into the database.")
+    return stats
 
 
+def _run_in_stages(worker, parallel=True):
+    """Calls worker(table) for every table in LOAD_STAGES order, returning {table: result}."""
+    results = {}
+    for stage in LOAD_STAGES:
+        if parallel and len(stage) > 1:
+            with ThreadPoolExecutor(max_workers=len(stage)) as executor:
+                results.update(zip(stage, executor.map(worker, stage)))
+        else:
+            for table in stage:
+                results[table] = worker(table)
+    return results
 
-def display_food_listings():
-    """Displays the food listings with filtering, update, and delete options."""
 
-    st.header("Food Listings")
+def _ingest_statement(table, columns, mode):
+    """
+    Builds the INSERT statement used for one ingest mode. For tables with an
+    archive, rows already archived are skipped and the statement takes the
+    key a second time as its last parameter. Updated listings keep their
+    claimed units off the CSV's Quantity.
+    """
+    key = CSV_FILES[table][1]
+    names = ", ".join(columns)
+    placeholders = ", ".join("?" for _ in columns)
+    source = f"VALUES ({placeholders})"
+    if table in ARCHIVE_TABLES:
+        # An expired listing that was swept must not come back on the next load
+        source = f"SELECT {placeholders} WHERE NOT EXISTS (SELECT 1 FROM {ARCHIVE_TABLES[table]} WHERE {key} = ?)"
+    if mode == 'replace':
+        return f"INSERT OR REPLACE INTO {table} ({names}) {source}"
+    if mode == 'append':
+        return f"INSERT OR IGNORE INTO {table} ({names}) {source}"
+    values = {column: f"excluded.{column}" for column in columns if column != key}
+    if table == 'FoodListings' and 'Quantity' in values:
+        # The CSV holds the listed quantity; units already claimed stay taken
+        values['Quantity'] = ("MAX(excluded.Quantity - IFNULL((SELECT SUM(c.Quantity) FROM Claims c "
+                              "WHERE c.Food_ID = excluded.Food_ID), 0), 0)")
+    updates = ", ".join(f"{column} = {value}" for column, value in values.items())
+    if mode == 'upsert':
+        return (f"INSERT INTO {table} ({names}) {source} "
+                f"ON CONFLICT({key}) DO UPDATE SET {updates}")
+    if mode == 'sync':
+        # Like upsert, but rows whose values are unchanged are not rewritten
+        changed = " OR ".join(f"{column} IS NOT {value}" for column, value in values.items())
+        return (f"INSERT INTO {table} ({names}) {source} "
+                f"ON CONFLICT({key}) DO UPDATE SET {updates} WHERE {changed}")
+    raise ValueError(f"Unknown ingest mode: {mode}")
 
-    # Filtering options
-    city_filter = st.selectbox("Filter by City", ["All"] + get_unique_values("FoodListings", "Location"))
-    food_type_filter = st.selectbox("Filter by Food Type", ["All"] + get_unique_values("FoodListings", "Food_Type"))
-    meal_type_filter = st.selectbox("Filter by Meal Type", ["All"] + get_unique_values("FoodListings", "Meal_Type"))
 
+def _chunk_records(chunk):
+    """Converts a DataFrame chunk into plain Python tuples (NA -> None) for sqlite3."""
+    return chunk.astype(object).where(chunk.notna(), None).itertuples(index=False, name=None)
+
+
+def _write_chunk(conn, table, mode, chunk):
+    """Writes one CSV chunk inside the caller's transaction. Returns the number of rows it changed."""
+    statement = _ingest_statement(table, list(chunk.columns), mode)
+    records = _chunk_records(chunk)
+    if table in ARCHIVE_TABLES:
+        key_index = list(chunk.columns).index(CSV_FILES[table][1])
+        records = (record + (record[key_index],) for record in records)
+    # rowcount sums over executemany and, unlike total_changes, excludes rows written by triggers
+    return conn.executemany(statement, records).rowcount
+
+
+def ingest_csv(table, mode='upsert', chunksize=INGEST_CHUNKSIZE, progress=None):
+    """
+    Streams one table's CSV file into the database. Returns its load stats.
+
+    'replace' reloads the table in a single transaction, so readers keep
+    seeing the old rows until the new ones are all in; the other modes
+    commit each chunk on its own.
+    """
+    path = os.path.join(DATA_DIR, CSV_FILES[table][0])
+    if not os.path.exists(path):
+        print(f"File not found: {path}.  Please ensure the file exists or create a dummy file.")
+        return None
+
+    started = time.perf_counter()
+    rows = 0
+    changes = 0
+    chunks = pd.read_csv(path, chunksize=chunksize, dtype=CSV_DTYPES[table])
+    if mode == 'replace':
+        with get_connection(read_only=False) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                deferred = _set_search_deferred(conn, table) if mode in SEARCH_DEFERRED_MODES else []
+                conn.execute(f"DELETE FROM {table}")
+                for chunk in chunks:
+                    changes += _write_chunk(conn, table, mode, chunk)
+                    rows += len(chunk)
+                    if progress:
+                        progress(table, rows, time.perf_counter() - started)
+                _rebuild_search_indexes(conn, deferred)
+                _bump_table_versions(conn, [table])
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+    else:
+        first_chunk = True
+        deferred = []
+        try:
+            for chunk in chunks:
+                with get_connection(read_only=False) as conn:
+                    conn.execute("BEGIN IMMEDIATE")
+                    try:
+                        if first_chunk and mode in SEARCH_DEFERRED_MODES:
+                            deferred = _set_search_deferred(conn, table)
+                        changes += _write_chunk(conn, table, mode, chunk)
+                        _bump_table_versions(conn, [table])
+                        conn.commit()
+                    except Exception:
+                        conn.rollback()
+                        raise
+                first_chunk = False
+                rows += len(chunk)
+                if progress:
+                    progress(table, rows, time.perf_counter() - started)
+        finally:
+            if deferred:
+                with get_connection(read_only=False) as conn:
+                    conn.execute("BEGIN IMMEDIATE")
+                    try:
+                        _rebuild_search_indexes(conn, deferred)
+                        conn.commit()
+                    except Exception:
+                        conn.rollback()
+                        raise
+
+    seconds = time.perf_counter() - started
+    rows_per_sec = rows / seconds if seconds else 0.0
+    print(f"Loaded {rows} rows into {table} in {seconds:.2f}s ({rows_per_sec:,.0f} rows/sec).")
+    return {'rows': rows, 'changes': changes, 'seconds': seconds, 'rows_per_sec': rows_per_sec}
+
+
+def _file_checksum(path, block_size=1 << 20):
+    """Returns the SHA-256 hex digest of a file, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _prune_missing_rows(table, path, chunksize=INGEST_CHUNKSIZE):
+    """Deletes rows whose primary key no longer appears in the table's CSV file."""
+    key = CSV_FILES[table][1]
+    with get_connection(read_only=False) as conn:
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS sync_keys (Key INTEGER PRIMARY KEY)")
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM sync_keys")
+            for chunk in pd.read_csv(path, usecols=[key], chunksize=chunksize, dtype={key: 'Int64'}):
+                conn.executemany("INSERT OR IGNORE INTO sync_keys VALUES (?)", _chunk_records(chunk.dropna()))
+            deleted = conn.execute(f"DELETE FROM {table} WHERE {key} NOT IN (SELECT Key FROM sync_keys)").rowcount
+            _bump_table_versions(conn, [table])
+            conn.execute("DELETE FROM sync_keys")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return deleted
+
+
+def sync_table(table, chunksize=INGEST_CHUNKSIZE, prune=False, progress=None):
+    """
+    Applies only the new or changed rows of one table's CSV file.
+
+    The file's size and mtime are compared with the SyncWatermarks row first,
+    so an untouched file costs one stat() call; a touched file whose checksum
+    is unchanged costs one read. Otherwise rows are upserted by primary key
+    and rows with identical values are left alone. With `prune`, rows missing
+    from the CSV are deleted. Returns the sync stats, or None if skipped.
+    """
+    file_name = CSV_FILES[table][0]
+    path = os.path.join(DATA_DIR, file_name)
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    watermark = execute_query(
+        "SELECT Size, Mtime, Checksum FROM SyncWatermarks WHERE File_Name = ?", (file_name,))
+    if watermark and watermark[0][:2] == (stat.st_size, stat.st_mtime):
+        return None
+
+    checksum = _file_checksum(path)
+    stats = None
+    if not watermark or watermark[0][2] != checksum:
+        stats = ingest_csv(table, 'sync', chunksize, progress)
+        if prune:
+            stats['deleted'] = _prune_missing_rows(table, path, chunksize)
+
+    _record_watermark(table, stat, checksum)
+    return stats
+
+
+def _record_watermark(table, stat=None, checksum=None):
+    """Records the size, mtime and checksum of the CSV file a table was last loaded from."""
+    file_name = CSV_FILES[table][0]
+    path = os.path.join(DATA_DIR, file_name)
+    stat = stat or os.stat(path)
+    checksum = checksum or _file_checksum(path)
+    execute_query('''
+        INSERT OR REPLACE INTO SyncWatermarks (File_Name, Table_Name, Size, Mtime, Checksum, Synced_At)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', (file_name, table, stat.st_size, stat.st_mtime, checksum, datetime.now().isoformat(sep=' ')))
+
+
+def sync_data_dir(chunksize=INGEST_CHUNKSIZE, prune=False, parallel=True, progress=None):
+    """
+    Incrementally syncs every CSV in DATA_DIR into the existing database.
+
+    Unlike load_data_to_db, tables are never cleared, and each chunk is its
+    own short transaction, so the app keeps serving reads during a sync.
+    """
+    with get_connection(read_only=False) as conn:
+        _create_tables(conn)
+    stats = _run_in_stages(lambda table: sync_table(table, chunksize, prune, progress), parallel)
+    for table, table_stats in stats.items():
+        if table_stats and (table_stats['changes'] or table_stats.get('deleted')):
+            invalidate_unique_values(table)
+    return stats
+
+
+
+_expiry_sweeper = {'thread': None, 'stop': threading.Event(), 'lock': threading.Lock()}
+
+
+def _next_id(conn, table):
+    """
+    Returns the next key for a new row of a table with an archive: above
+    every hot and archived key, so the id of a swept row is never reused
+    (INTEGER PRIMARY KEY alone only looks at the hot table).
+    """
+    key = CSV_FILES[table][1]
+    return conn.execute(f"""
+        SELECT MAX(IFNULL((SELECT MAX({key}) FROM {table}), 0),
+                   IFNULL((SELECT MAX({key}) FROM {ARCHIVE_TABLES[table]}), 0)) + 1
+    """).fetchone()[0]
+
+
+def sweep_expired_listings(as_of=None, batch_size=SWEEP_BATCH_SIZE):
+    """
+    Moves expired listings whose claims are all closed, together with those
+    claims, into FoodListingsArchive/ClaimsArchive.
+
+    A listing qualifies once its Expiry_Date is before `as_of` (default:
+    today) and none of its claims is still open; a claim is closed when its
+    status is in CLOSED_CLAIM_STATUSES. Work is done in transactions of
+    `batch_size` listings so readers and writers are never blocked for long.
+    Returns {'listings': archived listings, 'claims': archived claims}.
+    """
+    as_of = as_of or _sqlite_today()
+    closed = ", ".join("?" for _ in CLOSED_CLAIM_STATUSES)
+    archived = {'listings': 0, 'claims': 0}
+    while True:
+        with get_connection(read_only=False) as conn:
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS sweep_ids (Food_ID INTEGER PRIMARY KEY)")
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("DELETE FROM sweep_ids")
+                conn.execute(f"""
+                    INSERT INTO sweep_ids (Food_ID)
+                    SELECT fl.Food_ID FROM FoodListings fl
+                    WHERE fl.Expiry_Date < ?
+                      AND NOT EXISTS (
+                          SELECT 1 FROM Claims c
+                          WHERE c.Food_ID = fl.Food_ID AND IFNULL(c.Status, '') NOT IN ({closed})
+                      )
+                    LIMIT ?
+                """, (as_of, *CLOSED_CLAIM_STATUSES, batch_size))
+                batch = conn.execute("SELECT COUNT(*) FROM sweep_ids").fetchone()[0]
+                if batch:
+                    archived_at = datetime.now().isoformat(sep=' ', timespec='seconds')
+                    # Archive rows are inserted before the deletes, which the claim counter trigger relies on
+                    claims = conn.execute("""
+                        INSERT INTO ClaimsArchive (Claim_ID, Food_ID, Receiver_ID, Status, Timestamp, Quantity, Archived_At)
+                        SELECT Claim_ID, Food_ID, Receiver_ID, Status, Timestamp, Quantity, ? FROM Claims
+                        WHERE Food_ID IN (SELECT Food_ID FROM sweep_ids)
+                    """, (archived_at,)).rowcount
+                    conn.execute("""
+                        INSERT INTO FoodListingsArchive (Food_ID, Food_Name, Quantity, Expiry_Date, Provider_ID,
+                                                         Provider_Type, Location, Food_Type, Meal_Type, Archived_At)
+                        SELECT Food_ID, Food_Name, Quantity, Expiry_Date, Provider_ID,
+                               Provider_Type, Location, Food_Type, Meal_Type, ? FROM FoodListings
+                        WHERE Food_ID IN (SELECT Food_ID FROM sweep_ids)
+                    """, (archived_at,))
+                    conn.execute("DELETE FROM Claims WHERE Food_ID IN (SELECT Food_ID FROM sweep_ids)")
+                    conn.execute("DELETE FROM FoodListings WHERE Food_ID IN (SELECT Food_ID FROM sweep_ids)")
+                    _bump_table_versions(conn, ['FoodListings', 'Claims', 'FoodListingsArchive', 'ClaimsArchive'])
+                    archived['listings'] += batch
+                    archived['claims'] += claims
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        if batch < batch_size:
+            break
+    if archived['listings']:
+        invalidate_unique_values('FoodListings')
+    return archived
+
+
+def start_expiry_sweeper(interval=SWEEP_INTERVAL):
+    """Starts (once per process) a daemon thread that archives expired listings every `interval` seconds."""
+    def run():
+        while True:
+            try:
+                archived = sweep_expired_listings()
+                if archived['listings']:
+                    print(f"Archived {archived['listings']} expired listings and {archived['claims']} claims.")
+            except sqlite3.Error as e:
+                print(f"Expiry sweep failed: {e}")
+            if _expiry_sweeper['stop'].wait(interval):
+                break
+
+    with _expiry_sweeper['lock']:
+        if _expiry_sweeper['thread'] is None or not _expiry_sweeper['thread'].is_alive():
+            _expiry_sweeper['stop'].clear()
+            _expiry_sweeper['thread'] = threading.Thread(target=run, name="expiry-sweeper", daemon=True)
+            _expiry_sweeper['thread'].start()
+    return _expiry_sweeper['thread']
+
+
+def stop_expiry_sweeper():
+    """Stops the background expiry sweeper, if running."""
+    _expiry_sweeper['stop'].set()
+
+
+def build_search_expression(text, prefix_length=None):
+    """
+    Turns free text into an FTS5 query: every word must match and the last
+    one may be a prefix, for search-as-you-type. Words are quoted, so FTS5
+    operators typed by the user are matched literally. A last word shorter
+    than the smallest prefix index matches whole words only; `prefix_length`
+    truncates a longer one. Returns None if the text has no words.
+    """
+    terms = SEARCH_TERM_PATTERN.findall(text or "")
+    if not terms:
+        return None
+    if len(terms[-1]) < min(SEARCH_PREFIX_LENGTHS):
+        return " ".join(f'"{term}"' for term in terms)
+    terms[-1] = terms[-1][:prefix_length]
+    return " ".join(f'"{term}"' for term in terms) + "*"
+
+
+def _match_score(row, terms, weights):
+    """
+    Scores a matching row: for each column, the share of its words that
+    match a search term (half for completions of the last term), times the
+    column's weight. Like bm25 without the corpus statistics, which are the same for
+    every row of one query but cost a pass over every match to compute.
+    Returns 0 when no word starts with the last term.
+    """
+    score = 0.0
+    prefix_found = False
+    for value, weight in zip(row, weights):
+        words = SEARCH_TERM_PATTERN.findall(str(value).lower()) if value is not None else []
+        hits = 0
+        for word in words:
+            if word in terms:
+                hits += 1
+            elif word.startswith(terms[-1]):
+                hits += 0.5  # Whole-word matches rank above completions
+            prefix_found = prefix_found or word.startswith(terms[-1])
+        if words:
+            score += weight * hits / len(words)
+    return score if prefix_found else 0.0
+
+
+def ranked_matches(index, text):
+    """
+    Ranked full-text search. Only the newest SEARCH_RANK_WINDOW matches are
+    fetched and scored with the index's column weights (see _match_score):
+    bm25 would read every match of a common term and take hundreds of
+    milliseconds on large tables. A last word longer than the prefix indexes
+    is looked up by its indexed prefix and filtered here, falling back to the
+    exact (slower) query if too few rows survive. Returns (rows, complete):
+    (key, *indexed columns) rows, best match first, and whether they are
+    every match rather than the newest window of them.
+    """
+    _, _, columns, weights = SEARCH_INDEXES[index]
+    expression = build_search_expression(text)
+    if expression is None:
+        return [], True
+    terms = [term.lower() for term in SEARCH_TERM_PATTERN.findall(text)]
+    query = f"""
+        SELECT rowid, {", ".join(columns)} FROM {index}
+        WHERE {index} MATCH ?
+        ORDER BY rowid DESC
+        LIMIT ?
+    """
+    rows = None
+    if len(terms[-1]) > max(SEARCH_PREFIX_LENGTHS):
+        candidates = execute_query(query, (build_search_expression(text, max(SEARCH_PREFIX_LENGTHS)),
+                                           SEARCH_RANK_WINDOW))
+        rows = [row for row in candidates if _match_score(row[1:], terms, weights)]
+        complete = len(candidates) < SEARCH_RANK_WINDOW
+        if len(rows) < SEARCH_LIMIT and not complete:
+            rows = None
+    if rows is None:
+        rows = execute_query(query, (expression, SEARCH_RANK_WINDOW))
+        complete = len(rows) < SEARCH_RANK_WINDOW
+    return sorted(rows, key=lambda row: -_match_score(row[1:], terms, weights)), complete
+
+
+def search(index, text, limit=SEARCH_LIMIT):
+    """Returns the best `limit` rows of ranked_matches."""
+    return ranked_matches(index, text)[0][:limit]
+
+
+def suggest(text, rows, limit=SUGGEST_LIMIT):
+    """
+    Autocompletes the last word of `text` with the words that complete it
+    most often in `rows` (from ranked_matches). (FTS5's vocabulary table
+    would count every posting of every candidate word, which is slow for
+    common prefixes.)
+    """
+    terms = [term.lower() for term in SEARCH_TERM_PATTERN.findall(text or "")]
+    if not terms:
+        return []
+    completions = Counter(word for row in rows for value in row[1:]
+                          if value is not None
+                          for word in SEARCH_TERM_PATTERN.findall(str(value).lower())
+                          if word.startswith(terms[-1]))
+    return [word for word, _ in completions.most_common(limit)]
+
+
+def build_listing_query(location=None, food_type=None, meal_type=None, search_text=None):
+    """Builds the filtered food listing query, returning (query, params)."""
     query = """
         SELECT
             fl.Food_ID,
@@ -147,75 +1978,886 @@ def display_food_listings():
         JOIN Providers p ON fl.Provider_ID = p.Provider_ID
         WHERE 1=1  -- Base condition to easily add filters
     """
-    filters = []
-    params = []
+    filters = []
+    params = []
+
+    if location is not None:
+        filters.append("fl.Location = ?")
+        params.append(location)
+    if food_type is not None:
+        filters.append("fl.Food_Type = ?")
+        params.append(food_type)
+    if meal_type is not None:
+        filters.append("fl.Meal_Type = ?")
+        params.append(meal_type)
+    expression = build_search_expression(search_text)
+    if expression is not None:
+        filters.append("fl.Food_ID IN (SELECT rowid FROM ListingSearch WHERE ListingSearch MATCH ?)")
+        params.append(expression)
+
+    if filters:
+        query += " AND " + " AND ".join(filters)
+    return query, params
+
+
+def _keyset_ranges(sort_column, key_column, after, descending):
+    """
+    Returns the (condition, params) ranges holding the rows after `after`, in
+    page order. SQLite sorts NULLs first, so rows with a NULL sort value get
+    a range of their own at the start (the end when descending): a NULL never
+    compares true, and wrapping the column in IFNULL() would stop the ORDER
+    BY from using its index.
+    """
+    op = '<' if descending else '>'
+    if sort_column == key_column:
+        return [(f"{key_column} {op} ?", [after[1]])] if after is not None else [("1=1", [])]
+    null_range = (f"{sort_column} IS NULL", [])
+    value_range = (f"{sort_column} IS NOT NULL", [])
+    if after is not None and after[0] is None:
+        null_range = (f"{sort_column} IS NULL AND {key_column} {op} ?", [after[1]])
+    elif after is not None:
+        value_range = (f"({sort_column}, {key_column}) {op} (?, ?)", list(after))
+    ranges = [value_range, null_range] if descending else [null_range, value_range]
+    if after is not None:
+        # Ranges before the cursor's own have been paged through already
+        ranges = ranges[ranges.index(null_range if after[0] is None else value_range):]
+    return ranges
+
+
+def fetch_page(query, params, columns, sort_column, key_column, page_size=DEFAULT_PAGE_SIZE,
+               after=None, descending=False):
+    """
+    Fetches one page of a query with keyset pagination.
+
+    `query` must end in a WHERE clause and select the sort and key columns.
+    `sort_column` and `key_column` are SQL expressions (e.g. 'fl.Quantity');
+    the key must be unique so (sort, key) totally orders the rows. `after`
+    is the cursor returned for the previous page. With an index on the sort
+    column (see SORT_INDEXES) each page is an index range scan instead of an
+    OFFSET that re-reads every earlier row.
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    direction = "DESC" if descending else "ASC"
+    rows = []
+    for condition, range_params in _keyset_ranges(sort_column, key_column, after, descending):
+        rows += execute_query(
+            f"{query} AND {condition} ORDER BY {sort_column} {direction}, {key_column} {direction} LIMIT ?",
+            list(params) + range_params + [page_size + 1 - len(rows)])
+        if len(rows) > page_size:
+            break
+    if len(rows) <= page_size:
+        return rows, None
+    rows = rows[:page_size]
+    sort_value = rows[-1][columns.index(sort_column.split('.')[-1])]
+    key_value = rows[-1][columns.index(key_column.split('.')[-1])]
+    return rows, (sort_value, key_value)
+
+
+def estimate_count(query, params, cap=COUNT_ESTIMATE_CAP):
+    """Counts a query's rows, stopping at `cap`. Returns (count, is_capped)."""
+    count = execute_query(f"SELECT COUNT(*) FROM ({query} LIMIT ?)", list(params) + [cap + 1])[0][0]
+    return min(count, cap), count > cap
+
+
+def display_paginated(view_key, query, params, columns, sort_columns, key_column):
+    """
+    Renders one page of a query with sort, page size and Previous/Next controls.
+
+    `sort_columns` maps column names to SQL expressions. The stack of page
+    cursors lives in st.session_state under `view_key` and is reset whenever
+    the query, filters or sort order change. Returns the page as a compact DataFrame.
+    """
+    sort_col, order_col, size_col = st.columns(3)
+    sort_label = sort_col.selectbox("Sort by", list(sort_columns), key=f"{view_key}_sort")
+    descending = order_col.checkbox("Descending", key=f"{view_key}_descending")
+    page_size = size_col.selectbox("Rows per page", PAGE_SIZES,
+                                   index=PAGE_SIZES.index(DEFAULT_PAGE_SIZE), key=f"{view_key}_page_size")
+
+    signature = (query, tuple(params), sort_label, descending, page_size)
+    if st.session_state.get(f"{view_key}_signature") != signature:
+        st.session_state[f"{view_key}_signature"] = signature
+        st.session_state[f"{view_key}_cursors"] = [None]
+    cursors = st.session_state[f"{view_key}_cursors"]
+
+    rows, next_cursor = fetch_page(query, params, columns, sort_columns[sort_label], key_column,
+                                   page_size, cursors[-1], descending)
+    df = compact_frame([rows], columns)
+    st.dataframe(df)
+
+    # Counting re-reads up to COUNT_ESTIMATE_CAP rows, so only recount when the filters or data change
+    count_signature = (query, tuple(params), tuple(get_table_versions(_cacheable_tables(query, params)).items()))
+    if st.session_state.get(f"{view_key}_count_signature") != count_signature:
+        st.session_state[f"{view_key}_count_signature"] = count_signature
+        st.session_state[f"{view_key}_count"] = estimate_count(query, params)
+    count, capped = st.session_state[f"{view_key}_count"]
+    st.caption(f"Page {len(cursors)} of about {count:,}{'+' if capped else ''} rows"
+               f" · {frame_bytes_per_row(df):,.0f} bytes per row in memory")
+    prev_col, next_col = st.columns(2)
+    if prev_col.button("Previous", key=f"{view_key}_prev", disabled=len(cursors) == 1):
+        cursors.pop()
+        st.rerun()
+    if next_col.button("Next", key=f"{view_key}_next", disabled=next_cursor is None):
+        cursors.append(next_cursor)
+        st.rerun()
+    return df
+
+
+def display_food_listings():
+    """Displays the food listings with filtering, update, and delete options."""
+
+    st.header("Food Listings")
+
+    # Filtering options
+    search_text = st.text_input("Search listings", placeholder="e.g. rice, bakery, dinner")
+    city_filter = st.selectbox("Filter by City", ["All"] + get_unique_values("FoodListings", "Location"))
+    food_type_filter = st.selectbox("Filter by Food Type", ["All"] + get_unique_values("FoodListings", "Food_Type"))
+    meal_type_filter = st.selectbox("Filter by Meal Type", ["All"] + get_unique_values("FoodListings", "Meal_Type"))
+
+    query, params = build_listing_query(
+        location=None if city_filter == "All" else city_filter,
+        food_type=None if food_type_filter == "All" else food_type_filter,
+        meal_type=None if meal_type_filter == "All" else meal_type_filter,
+        search_text=search_text,
+    )
+    df = display_paginated("listings", query, params, LISTING_COLUMNS, LISTING_SORT_COLUMNS, "fl.Food_ID")
+    display_batch_edit(df)
+
+    # Update and Delete Functionality
+    st.subheader("Update/Delete Food Listing")
+    selected_food_id = st.selectbox("Select Food Listing to Update/Delete", ["None"] + df["Food_ID"].tolist())
+
+    if selected_food_id != "None":
+        update_delete_food_listing(selected_food_id)
+
+
+def update_delete_food_listing(food_id):
+    """Updates or deletes a selected food listing."""
+
+    query = "SELECT * FROM FoodListings WHERE Food_ID = ?"
+    result = execute_query(query, (food_id,))
+    if result:
+        listing = result[0]  # Get the first (and only) row
+        food_name, quantity, expiry_date, provider_id, provider_type, location, food_type, meal_type = listing[1:]
+        food_types = get_unique_values("FoodListings", "Food_Type")
+        meal_types = get_unique_values("FoodListings", "Meal_Type")
+
+        # Update
+        st.subheader("Update Listing")
+        new_food_name = st.text_input("Food Name", food_name)
+        new_quantity = st.number_input("Quantity", value=quantity, min_value=1, step=1)
+        new_expiry_date = st.date_input("Expiry Date", datetime.strptime(expiry_date, '%Y-%m-%d'))
+        new_location = st.text_input("Location", location)
+        new_food_type = st.selectbox("Food Type", food_types, index=food_types.index(food_type))
+        new_meal_type = st.selectbox("Meal Type", meal_types, index=meal_types.index(meal_type))
+
+        if st.button("Update"):
+            update_query = """
+                UPDATE FoodListings
+                SET Food_Name = ?, Quantity = ?, Expiry_Date = ?, Location = ?, Food_Type = ?, Meal_Type = ?
+                WHERE Food_ID = ?
+            """
+            execute_query(update_query, (new_food_name, new_quantity, new_expiry_date, new_location, new_food_type, new_meal_type, food_id))
+            invalidate_unique_values("FoodListings")
+            st.success("Food listing updated successfully!")
+            st.rerun()  # Refresh the page to show updated data
+
+        # Delete
+        st.subheader("Delete Listing")
+        if st.button("Delete"):
+            delete_query = "DELETE FROM FoodListings WHERE Food_ID = ?"
+            execute_query(delete_query, (food_id,))
+            invalidate_unique_values("FoodListings")
+            st.success("Food listing deleted successfully!")
+            st.rerun()
+
+
+def _is_missing(value):
+    """True for None and pandas/numpy missing values."""
+    return value is None or (not isinstance(value, str) and pd.isna(value))
+
+
+def _normalize_listing_columns(change):
+    """Cleans the LISTING_EDITABLE_COLUMNS of a change dict; missing values become None."""
+    normalized = {}
+    for column in LISTING_EDITABLE_COLUMNS:
+        value = change.get(column)
+        normalized[column] = None if _is_missing(value) else value
+    if normalized["Quantity"] is not None:
+        quantity = float(normalized["Quantity"])
+        if quantity < 0 or quantity != int(quantity):
+            raise ValueError("Quantity must be a whole number of at least 0")
+        normalized["Quantity"] = int(quantity)
+    if normalized["Expiry_Date"] is not None:
+        expiry_date = normalized["Expiry_Date"]
+        if not hasattr(expiry_date, "strftime"):
+            expiry_date = datetime.strptime(str(expiry_date).strip()[:10], '%Y-%m-%d')
+        normalized["Expiry_Date"] = expiry_date.strftime('%Y-%m-%d')
+    for column in ("Food_Name", "Location", "Food_Type", "Meal_Type"):
+        if normalized[column] is not None:
+            normalized[column] = str(normalized[column]).strip()
+            if not normalized[column]:
+                raise ValueError(f"{column} cannot be blank")
+    return normalized
+
+
+def _existing_ids(table, key_column, ids):
+    """Returns the subset of `ids` present in table.key_column, looked up BATCH_LOOKUP_SIZE at a time."""
+    ids, existing = list(ids), set()
+    for start in range(0, len(ids), BATCH_LOOKUP_SIZE):
+        batch = ids[start:start + BATCH_LOOKUP_SIZE]
+        placeholders = ", ".join("?" for _ in batch)
+        existing.update(row[0] for row in execute_query(
+            f"SELECT {key_column} FROM {table} WHERE {key_column} IN ({placeholders})", batch))
+    return existing
+
+
+def validate_listing_changes(changes):
+    """
+    Validates the format of batch changes to FoodListings.
+
+    Each change is a dict with Food_ID, an optional Action ('update', the
+    default, or 'delete') and, for updates, any of LISTING_EDITABLE_COLUMNS;
+    missing columns keep their current value. Whether the Food_ID exists is
+    only known when the change is applied. Returns (valid, errors): valid is
+    a list of (row number, normalized change) and errors maps row number to
+    a message.
+    """
+    valid, errors = [], {}
+    for row, change in enumerate(changes):
+        try:
+            food_id = change.get("Food_ID")
+            if _is_missing(food_id):
+                raise ValueError("Food_ID is required")
+            normalized = {"Food_ID": int(food_id)}
+            action = change.get("Action")
+            normalized["Action"] = "update" if _is_missing(action) else str(action).strip().lower()
+            if normalized["Action"] not in BATCH_ACTIONS:
+                raise ValueError(f"Action must be one of {', '.join(BATCH_ACTIONS)}")
+            normalized.update(_normalize_listing_columns(change))
+            if normalized["Action"] == "update" and all(normalized[column] is None for column in LISTING_EDITABLE_COLUMNS):
+                raise ValueError("Update changes no columns")
+            valid.append((row, normalized))
+        except (TypeError, ValueError) as e:
+            errors[row] = str(e)
+    return valid, errors
+
+
+def apply_listing_changes(changes):
+    """
+    Validates and applies batch changes (see validate_listing_changes) in
+    file order in a single transaction: either every valid row is applied
+    or, if the database rejects the batch, none is. Each row's status comes
+    from the rows it actually changed, so a row deleted earlier in the batch
+    (or by someone else) is reported as missing. Invalid rows are skipped
+    and reported. Returns {'results': per-row dicts, 'applied', 'failed',
+    'seconds', 'rows_per_sec'}.
+    """
+    started = time.perf_counter()
+    valid, errors = validate_listing_changes(changes)
+    applied = {}
+
+    if valid:
+        with get_connection(read_only=False) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for row, change in valid:
+                    if change["Action"] == "update":
+                        cursor = conn.execute("""
+                            UPDATE FoodListings
+                            SET Food_Name = COALESCE(?, Food_Name), Quantity = COALESCE(?, Quantity),
+                                Expiry_Date = COALESCE(?, Expiry_Date), Location = COALESCE(?, Location),
+                                Food_Type = COALESCE(?, Food_Type), Meal_Type = COALESCE(?, Meal_Type)
+                            WHERE Food_ID = ?
+                        """, tuple(change[column] for column in LISTING_EDITABLE_COLUMNS) + (change["Food_ID"],))
+                    else:
+                        cursor = conn.execute("DELETE FROM FoodListings WHERE Food_ID = ?", (change["Food_ID"],))
+                    if cursor.rowcount:
+                        applied[row] = "updated" if change["Action"] == "update" else "deleted"
+                    else:
+                        errors[row] = f"Food_ID {change['Food_ID']} does not exist"
+                if applied:
+                    _bump_table_versions(conn, ["FoodListings"])
+                conn.commit()
+            except sqlite3.Error:
+                conn.rollback()
+                raise
+        if applied:
+            invalidate_unique_values("FoodListings")
+
+    results = [{"Row": row, "Food_ID": change["Food_ID"], "Action": change["Action"],
+                "Status": applied[row], "Error": None}
+               for row, change in valid if row in applied]
+    results += [{"Row": row, "Food_ID": changes[row].get("Food_ID"), "Action": changes[row].get("Action"),
+                 "Status": "error", "Error": error} for row, error in errors.items()]
+    results.sort(key=lambda result: result["Row"])
+    seconds = time.perf_counter() - started
+    return {"results": results, "applied": len(applied), "failed": len(errors), "seconds": seconds,
+            "rows_per_sec": len(applied) / seconds if seconds else 0.0}
+
+
+def validate_new_listings(listings):
+    """
+    Validates new FoodListings rows: dicts with Provider_ID and every one of
+    LISTING_EDITABLE_COLUMNS. Returns (valid, errors) like validate_listing_changes,
+    after also checking that each Provider_ID exists.
+    """
+    valid, errors = [], {}
+    for row, listing in enumerate(listings):
+        try:
+            normalized = _normalize_listing_columns(listing)
+            missing = [column for column in ["Provider_ID"] + LISTING_EDITABLE_COLUMNS
+                       if _is_missing(listing.get(column))]
+            if missing:
+                raise ValueError(f"Missing {', '.join(missing)}")
+            if normalized["Quantity"] < 1:
+                raise ValueError("Quantity must be at least 1")
+            normalized["Provider_ID"] = int(listing["Provider_ID"])
+            valid.append((row, normalized))
+        except (TypeError, ValueError) as e:
+            errors[row] = str(e)
+
+    existing = _existing_ids("Providers", "Provider_ID", {listing["Provider_ID"] for _, listing in valid})
+    for row, listing in valid:
+        if listing["Provider_ID"] not in existing:
+            errors[row] = f"Provider_ID {listing['Provider_ID']} does not exist"
+    return [(row, listing) for row, listing in valid if row not in errors], errors
+
+
+def insert_food_listings(listings):
+    """
+    Validates and inserts new food listings (see validate_new_listings) in a
+    single transaction. Invalid rows are skipped and reported. Returns a
+    report shaped like apply_listing_changes', with each new row's Food_ID.
+    """
+    started = time.perf_counter()
+    valid, errors = validate_new_listings(listings)
+    food_ids = {}
+
+    if valid:
+        with get_connection(read_only=False) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for row, listing in valid:
+                    food_ids[row] = _next_id(conn, "FoodListings")
+                    conn.execute("""
+                        INSERT INTO FoodListings (Food_ID, Food_Name, Quantity, Expiry_Date, Provider_ID, Location,
+                                                  Food_Type, Meal_Type)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    """, (food_ids[row], *(listing[column] for column in ("Food_Name", "Quantity", "Expiry_Date",
+                                                                          "Provider_ID", "Location", "Food_Type",
+                                                                          "Meal_Type"))))
+                _bump_table_versions(conn, ["FoodListings"])
+                conn.commit()
+            except sqlite3.Error:
+                conn.rollback()
+                raise
+        invalidate_unique_values("FoodListings")
+
+    results = [{"Row": row, "Food_ID": food_ids[row], "Action": "insert", "Status": "created", "Error": None}
+               for row, _ in valid]
+    results += [{"Row": row, "Food_ID": None, "Action": "insert", "Status": "error", "Error": error}
+                for row, error in errors.items()]
+    results.sort(key=lambda result: result["Row"])
+    seconds = time.perf_counter() - started
+    return {"results": results, "applied": len(valid), "failed": len(errors), "seconds": seconds,
+            "rows_per_sec": len(valid) / seconds if seconds else 0.0}
+
+
+def read_listing_change_file(uploaded_file):
+    """Reads a CSV change file (Food_ID, optional Action, editable columns) into change dicts."""
+    df = pd.read_csv(uploaded_file, dtype={"Food_ID": "Int64", "Quantity": "string", "Expiry_Date": "string"})
+    unknown = set(df.columns) - {"Food_ID", "Action"} - set(LISTING_EDITABLE_COLUMNS)
+    if "Food_ID" not in df.columns or unknown:
+        raise ValueError(f"Change file needs a Food_ID column; unknown columns: {', '.join(sorted(unknown)) or 'none'}")
+    return df.astype(object).where(df.notna(), None).to_dict("records")
+
+
+def _display_batch_report(report):
+    """Shows the outcome of apply_listing_changes."""
+    st.success(f"Applied {report['applied']} change(s) in {report['seconds'] * 1000:.0f} ms "
+               f"({report['rows_per_sec']:,.0f} rows/sec); {report['failed']} rejected.")
+    st.dataframe(pd.DataFrame(report["results"]))
+
+
+def display_batch_edit(df):
+    """Batch edit mode: edit or delete several listings at once, or apply an uploaded change file."""
+    st.subheader("Batch Edit")
+    page_tab, file_tab = st.tabs(["Edit This Page", "Upload Change File"])
+
+    with page_tab:
+        # Plain strings and dates, so the editor offers free text and a date picker
+        original = df[["Food_ID"] + LISTING_EDITABLE_COLUMNS].astype(
+            {column: object for column in LISTING_EDITABLE_COLUMNS if column in FRAME_CATEGORY_COLUMNS})
+        original["Expiry_Date"] = original["Expiry_Date"].dt.date
+        original.insert(1, "Delete", False)
+        edited = st.data_editor(original, disabled=["Food_ID"], hide_index=True, key="batch_editor")
+        if st.button("Apply Changes"):
+            changes = []
+            for before, after in zip(original.to_dict("records"), edited.to_dict("records")):
+                if after["Delete"]:
+                    changes.append({"Food_ID": after["Food_ID"], "Action": "delete"})
+                    continue
+                changed = {column: after[column] for column in LISTING_EDITABLE_COLUMNS
+                           if str(after[column]) != str(before[column])}
+                if changed:
+                    changes.append(dict(changed, Food_ID=after["Food_ID"], Action="update"))
+            if changes:
+                _display_batch_report(apply_listing_changes(changes))
+            else:
+                st.info("No changes to apply.")
+
+    with file_tab:
+        st.caption("CSV with a Food_ID column, an optional Action column (update or delete) "
+                   f"and any of: {', '.join(LISTING_EDITABLE_COLUMNS)}.")
+        uploaded_file = st.file_uploader("Change file", type="csv")
+        if uploaded_file is not None and st.button("Apply Change File"):
+            try:
+                changes = read_listing_change_file(uploaded_file)
+            except ValueError as e:
+                st.error(str(e))
+            else:
+                _display_batch_report(apply_listing_changes(changes))
+
+
+def _run_with_busy_retry(func, *args):
+    """Calls func, retrying with exponential backoff and jitter while the database is locked."""
+    for attempt in range(CLAIM_MAX_RETRIES):
+        try:
+            return func(*args)
+        except sqlite3.OperationalError as e:
+            busy = 'locked' in str(e) or 'busy' in str(e)
+            if not busy or attempt == CLAIM_MAX_RETRIES - 1:
+                raise
+            time.sleep(CLAIM_RETRY_BASE_DELAY * 2 ** attempt * random.uniform(0.5, 1.5))
+
+
+def _claim_rejection(conn, food_id, receiver_id, quantity):
+    """Explains why a claim could not reserve its quantity."""
+    if not conn.execute("SELECT 1 FROM Receivers WHERE Receiver_ID = ?", (receiver_id,)).fetchone():
+        return f"Receiver {receiver_id} does not exist"
+    listing = conn.execute("SELECT Quantity, Expiry_Date >= DATE('now') FROM FoodListings WHERE Food_ID = ?",
+                           (food_id,)).fetchone()
+    if listing is None:
+        return f"Food listing {food_id} does not exist"
+    if not listing[1]:
+        return f"Food listing {food_id} has expired"
+    return f"Only {listing[0]} left of food listing {food_id}"
+
+
+def _apply_claim_batch(claims):
+    """Reserves quantity and records each claim, all in one BEGIN IMMEDIATE transaction."""
+    results = []
+    timestamp = datetime.now().isoformat(sep=' ', timespec='seconds')
+    with get_connection(read_only=False) as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for food_id, receiver_id, quantity in claims:
+                # Compare-and-set: the decrement only happens if enough is left, so
+                # concurrent claims can never take a listing below zero
+                reserved = conn.execute("""
+                    UPDATE FoodListings SET Quantity = Quantity - ?
+                    WHERE Food_ID = ? AND Quantity >= ? AND Expiry_Date >= DATE('now')
+                      AND EXISTS (SELECT 1 FROM Receivers WHERE Receiver_ID = ?)
+                """, (quantity, food_id, quantity, receiver_id)).rowcount
+                if not reserved:
+                    results.append({'claim_id': None, 'status': 'rejected',
+                                    'reason': _claim_rejection(conn, food_id, receiver_id, quantity)})
+                    continue
+                claim_id = _next_id(conn, 'Claims')
+                conn.execute("""
+                    INSERT INTO Claims (Claim_ID, Food_ID, Receiver_ID, Status, Timestamp, Quantity)
+                    VALUES (?, ?, ?, 'Pending', ?, ?)
+                """, (claim_id, food_id, receiver_id, timestamp, quantity))
+                results.append({'claim_id': claim_id, 'status': 'accepted', 'reason': None})
+            if any(result['status'] == 'accepted' for result in results):
+                _bump_table_versions(conn, ['FoodListings', 'Claims'])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return results
+
+
+def _claim_arguments(food_id, receiver_id, quantity):
+    """
+    Converts one claim's arguments to ints (ids may also be numeric strings),
+    raising ValueError with the reason if they are invalid.
+    """
+    ids = []
+    for name, value in (("Food ID", food_id), ("Receiver ID", receiver_id)):
+        if isinstance(value, str) and re.fullmatch(r"\s*\d+\s*", value):
+            value = int(value)
+        if isinstance(value, bool) or not isinstance(value, numbers.Integral):
+            raise ValueError(f"{name} must be a whole number, not {value!r}")
+        ids.append(int(value))
+    if isinstance(quantity, bool) or not isinstance(quantity, numbers.Integral):
+        raise ValueError(f"Quantity must be a whole number, not {quantity!r}")
+    if quantity < 1:
+        raise ValueError("Quantity must be at least 1")
+    return ids[0], ids[1], int(quantity)
+
+
+def submit_claims(claims):
+    """
+    Atomically claims food for a batch of (food_id, receiver_id, quantity)
+    tuples in a single transaction, retrying while the database is busy.
+    Returns one {'claim_id', 'status', 'reason'} dict per claim, in order;
+    status is 'accepted' or 'rejected'. Claims with invalid arguments are
+    rejected on their own, without failing the rest of the batch.
+    """
+    results, valid = [], []
+    for food_id, receiver_id, quantity in claims:
+        try:
+            valid.append(_claim_arguments(food_id, receiver_id, quantity))
+            results.append(None)
+        except ValueError as e:
+            results.append({'claim_id': None, 'status': 'rejected', 'reason': str(e)})
+    applied = iter(_run_with_busy_retry(_apply_claim_batch, valid) if valid else ())
+    return [result or next(applied) for result in results]
+
+
+_claim_writer = {'thread': None, 'queue': queue.Queue(), 'lock': threading.Lock()}
+claim_stats = {'submitted': 0, 'accepted': 0, 'rejected': 0, 'batches': 0}
+
+
+def _claim_writer_loop():
+    """Group commit: drains queued claims into batches so many claims share one commit."""
+    claim_queue = _claim_writer['queue']
+    while True:
+        batch = [claim_queue.get()]
+        deadline = time.monotonic() + CLAIM_BATCH_WAIT
+        while len(batch) < CLAIM_BATCH_SIZE:
+            try:
+                batch.append(claim_queue.get(timeout=max(deadline - time.monotonic(), 0)))
+            except queue.Empty:
+                break
+        try:
+            results = submit_claims([claim for claim, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            continue
+        claim_stats['batches'] += 1
+        for (_, future), result in zip(batch, results):
+            claim_stats[result['status']] += 1
+            future.set_result(result)
+
+
+def submit_claim(food_id, receiver_id, quantity=1, timeout=CLAIM_TIMEOUT):
+    """
+    Claims `quantity` of a food listing for a receiver. Safe to call from
+    many threads at once: claims are queued to a single writer thread that
+    commits them in groups. Returns the claim's result dict (see submit_claims).
+    Invalid arguments are rejected before queuing. If the batch has not
+    committed within `timeout` the status is 'unknown': the claim may still
+    be recorded.
+    """
+    try:
+        claim = _claim_arguments(food_id, receiver_id, quantity)
+    except ValueError as e:
+        with _claim_writer['lock']:
+            claim_stats['submitted'] += 1
+            claim_stats['rejected'] += 1
+        return {'claim_id': None, 'status': 'rejected', 'reason': str(e)}
+    with _claim_writer['lock']:
+        if _claim_writer['thread'] is None or not _claim_writer['thread'].is_alive():
+            _claim_writer['thread'] = threading.Thread(target=_claim_writer_loop, name="claim-writer", daemon=True)
+            _claim_writer['thread'].start()
+        claim_stats['submitted'] += 1
+    future = Future()
+    _claim_writer['queue'].put((claim, future))
+    try:
+        return future.result(timeout)
+    except FutureTimeoutError:
+        return {'claim_id': None, 'status': 'unknown',
+                'reason': f"No answer within {timeout}s; the claim may still be recorded, check before retrying"}
+
+
+def display_claim_food():
+    """Lets a receiver claim part of a food listing."""
+    st.header("Claim Food")
+    food_id = st.number_input("Food ID", min_value=1, step=1)
+    receiver_id = st.selectbox("Receiver", get_unique_values("Receivers", "Receiver_ID"))
+    quantity = st.number_input("Quantity", min_value=1, step=1)
+    if st.button("Claim"):
+        result = submit_claim(int(food_id), int(receiver_id), int(quantity))
+        if result['status'] == 'accepted':
+            st.success(f"Claim {result['claim_id']} recorded.")
+        elif result['status'] == 'unknown':
+            st.warning(result['reason'])
+        else:
+            st.error(result['reason'])
+
+
+def _shared_codes(values, categories):
+    """Positions of a categorical column's values in `categories`, -1 where missing or unknown."""
+    codes = values.cat.codes.to_numpy()
+    # Map the column's own (few) categories once, then look each row up by code
+    mapping = np.append(categories.get_indexer(values.cat.categories), -1).astype(np.int32)
+    return mapping[codes]
+
+
+def _split_ints(concatenated):
+    """Parses a column of comma-joined integers (group_concat) into one flat int64 array."""
+    if not len(concatenated):
+        return np.zeros(0, dtype=np.int64)
+    return np.fromstring(",".join(concatenated.tolist()), dtype=np.int64, sep=',')
+
+
+def _load_match_inputs(as_of):
+    """
+    Loads open listings, receivers and per-receiver claim history as compact,
+    code-encoded frames. Open listings are read from the covering expiry
+    index one (expiry, city, food type) group per row, with the group's
+    Food_IDs concatenated, which saves building Python objects for every
+    listing; they are returned in Food_ID order. The claim history comes
+    from the trigger-maintained ReceiverHistory table, one food type per row.
+    """
+    groups = read_frame("""
+        SELECT Location, Food_Type, CAST(julianday(Expiry_Date) - julianday(?1) AS INTEGER) AS Days_Left,
+               COUNT(*) AS Listings, group_concat(Food_ID) AS Food_IDs
+        FROM FoodListings
+        WHERE Quantity > 0 AND Expiry_Date >= ?1
+        GROUP BY Expiry_Date, Location, Food_Type
+    """, (as_of,))
+    food_ids = _split_ints(groups['Food_IDs'])
+    sizes = groups['Listings'].to_numpy(dtype=np.int64)
+    order = np.argsort(food_ids)
+    listings = pd.DataFrame({
+        'Food_ID': _concat_column([pd.Series(food_ids[order])]),  # int32 where it fits
+        'Location': groups['Location'].repeat(sizes).iloc[order].reset_index(drop=True),
+        'Food_Type': groups['Food_Type'].repeat(sizes).iloc[order].reset_index(drop=True),
+        'Days_Left': groups['Days_Left'].fillna(0).to_numpy(dtype=np.int64).repeat(sizes)[order],
+    })
+    receivers = read_frame("SELECT Receiver_ID, City FROM Receivers WHERE Receiver_ID IS NOT NULL")
+    history = read_frame("""
+        SELECT NULLIF(Food_Type, '') AS Food_Type, COUNT(*) AS Receivers,
+               group_concat(Receiver_ID) AS Receiver_IDs, group_concat(Claims) AS Claims,
+               group_concat(Completed) AS Completed
+        FROM ReceiverHistory
+        WHERE Claims > 0
+        GROUP BY Food_Type
+    """)
+
+    # Shared category codes, so cities and food types compare as small integers
+    cities = pd.Index(pd.unique(pd.concat([listings['Location'], receivers['City']]).dropna()))
+    food_types = pd.Index(pd.unique(pd.concat([listings['Food_Type'], history['Food_Type']]).dropna()))
+    listings['city'] = _shared_codes(listings['Location'], cities)
+    listings['food_type'] = _shared_codes(listings['Food_Type'], food_types)
+    receivers['city'] = _shared_codes(receivers['City'], cities)
+
+    claims = _split_ints(history['Claims']).astype(np.float32)
+    completed = _split_ints(history['Completed']).astype(np.float32)
+    type_codes = _shared_codes(history['Food_Type'], food_types).repeat(history['Receivers'].to_numpy(dtype=np.int64))
+    rows = pd.Index(receivers['Receiver_ID']).get_indexer(_split_ints(history['Receiver_IDs']))
+    known = rows >= 0
+    rows, claims, completed, type_codes = rows[known], claims[known], completed[known], type_codes[known]
+    total = np.bincount(rows, weights=claims, minlength=len(receivers))
+    completed = np.bincount(rows, weights=completed, minlength=len(receivers))
+    # Laplace smoothing keeps receivers with no history at a neutral 0.5
+    receivers['history'] = ((completed + 1) / (total + 2)).astype(np.float32)
+    affinity = np.zeros((len(receivers), max(len(food_types), 1)), dtype=np.float32)
+    known = type_codes >= 0
+    np.add.at(affinity, (rows[known], type_codes[known]), claims[known])
+    affinity /= np.maximum(total, 1)[:, None]
+    return listings, receivers, affinity
+
+
+def _rank_receivers(group_city, group_type, receivers, affinity):
+    """
+    Finds the best MATCH_CANDIDATES receivers, best first, for each (city,
+    food type) group of listings. A receiver scores its history and food
+    type affinity, plus the city weight when it is in the group's city, so a
+    group's best are among the food type's best receivers overall and its
+    best in that city. Each food type ranks the receivers once; each group
+    then merges two short lists instead of scoring every receiver. Ties go
+    to the earlier receiver. Returns (receiver rows, scores, city matches),
+    each shaped (groups, candidates).
+    """
+    receiver_city = receivers['city'].to_numpy()
+    rows = np.arange(len(receivers))
+    # Column -1 is all zeros, for listings with no food type
+    base = (MATCH_WEIGHTS['history'] * receivers['history'].to_numpy(dtype=np.float64)[:, None]
+            + MATCH_WEIGHTS['affinity'] * np.hstack([affinity, np.zeros((len(receivers), 1), dtype=np.float32)]))
+    k = min(MATCH_CANDIDATES, len(receivers))
+    top = np.empty((len(group_city), k), dtype=np.int64)
+    top_scores = np.empty((len(group_city), k), dtype=np.float64)
+    for food_type in np.unique(group_type):
+        scores = base[:, food_type]
+        ranked = np.lexsort((rows, -scores))
+        # Every city's receivers as one run, each still best first
+        by_city = ranked[np.argsort(receiver_city[ranked], kind='stable')]
+        city_bounds = receiver_city[by_city]
+        for group in np.flatnonzero(group_type == food_type):
+            city = group_city[group]
+            candidates = ranked[:k]
+            if city >= 0:
+                start = np.searchsorted(city_bounds, city, side='left')
+                end = min(np.searchsorted(city_bounds, city, side='right'), start + k)
+                candidates = np.union1d(candidates, by_city[start:end])
+            candidate_scores = scores[candidates] + MATCH_WEIGHTS['city'] * ((receiver_city[candidates] == city) & (city >= 0))
+            best = np.lexsort((candidates, -candidate_scores))[:k]
+            top[group] = candidates[best]
+            top_scores[group] = candidate_scores[best]
+    top_city = (receiver_city[top] == group_city[:, None]) & (group_city[:, None] >= 0)
+    return top, top_scores.astype(np.float32), top_city
 
-    if city_filter != "All":
-        filters.append("fl.Location = ?")
-        params.append(city_filter)
-    if food_type_filter != "All":
-        filters.append("fl.Food_Type = ?")
-        params.append(food_type_filter)
-    if meal_type_filter != "All":
-        filters.append("fl.Meal_Type = ?")
-        params.append(meal_type_filter)
 
-    if filters:
-        query += " AND " + " AND ".join(filters)
+def _allocate(top, groups, urgency, n_receivers, capacity):
+    """
+    Greedily gives each listing its best-ranked receiver with capacity left.
+    `top` holds each group's candidate receivers, best first, and `groups`
+    each listing's group. Each round every group bids for its best open
+    candidate; an over-subscribed receiver takes the most urgent bids (the
+    earlier listing on ties). Only a group's `remaining` most urgent
+    unallocated listings can win at a receiver, so only they bid: a round
+    costs at most groups x capacity bids, not one per listing. Returns the
+    chosen candidate column per listing, -1 where none was left.
+    """
+    remaining = np.full(n_receivers, capacity, dtype=np.int64)
+    choice = np.full(len(groups), -1, dtype=np.int64)
+    # Each group's listings, most urgent first; a group always allocates a prefix of them
+    order = np.lexsort((np.arange(len(groups)), -urgency, groups))
+    sizes = np.bincount(groups, minlength=len(top))
+    starts = np.cumsum(sizes) - sizes
+    allocated = np.zeros(len(top), dtype=np.int64)
+    active = np.flatnonzero(sizes)
+    while len(active):
+        is_open = remaining[top[active]] > 0
+        has_open = is_open.any(axis=1)
+        active = active[has_open]
+        if not len(active):
+            break
+        column = is_open[has_open].argmax(axis=1)
+        receiver = top[active, column]
+        bids = np.minimum(sizes[active] - allocated[active], remaining[receiver])
+        bid_group = np.repeat(np.arange(len(active)), bids)
+        offset = np.arange(len(bid_group)) - np.repeat(np.cumsum(bids) - bids, bids)
+        listing = order[(starts[active] + allocated[active])[bid_group] + offset]
+        bid_receiver = receiver[bid_group]
+        # Rank bids per receiver, most urgent first, and accept up to its remaining capacity
+        ranked = np.lexsort((listing, -urgency[listing], bid_receiver))
+        sorted_receiver = bid_receiver[ranked]
+        first = np.searchsorted(sorted_receiver, sorted_receiver, side='left')
+        rank = np.empty(len(ranked), dtype=np.int64)
+        rank[ranked] = np.arange(len(ranked)) - first
+        accepted = rank < remaining[bid_receiver]
+        choice[listing[accepted]] = column[bid_group[accepted]]
+        remaining -= np.bincount(bid_receiver[accepted], minlength=n_receivers)
+        allocated[active] += np.bincount(bid_group[accepted], minlength=len(active))
+        active = active[allocated[active] < sizes[active]]
+    return choice
 
-    results = execute_query(query, params)
-    df = pd.DataFrame(results, columns=[
-        "Food_ID", "Food_Name", "Quantity", "Expiry_Date", "Provider_Name",
-        "Provider_Contact", "Location", "Food_Type", "Meal_Type"
-    ])
 
-    st.dataframe(df)
+def match_listings(as_of=None, capacity=MATCH_RECEIVER_CAPACITY):
+    """
+    Proposes a receiver for every open (unexpired, non-empty) food listing.
 
-    # Update and Delete Functionality
-    st.subheader("Update/Delete Food Listing")
-    selected_food_id = st.selectbox("Select Food Listing to Update/Delete", ["None"] + list(df["Food_ID"]))
+    Receivers are ranked by MATCH_WEIGHTS on city match, their
+    completed-claim history and their past claims of the listing's food
+    type; the most urgent listings are allocated first and each receiver
+    gets at most `capacity` listings.
+    Returns a DataFrame of Food_ID, Receiver_ID, Score, City_Match.
+    """
+    as_of = as_of or _sqlite_today()
+    listings, receivers, affinity = _load_match_inputs(as_of)
+    columns = ['Food_ID', 'Receiver_ID', 'Score', 'City_Match']
+    if listings.empty or receivers.empty:
+        return pd.DataFrame(columns=columns)
+    groups = listings.groupby(['city', 'food_type'], sort=False).ngroup().to_numpy()
+    keys = listings[['city', 'food_type']].to_numpy()[np.unique(groups, return_index=True)[1]]
+    top, top_scores, top_city = _rank_receivers(keys[:, 0], keys[:, 1], receivers, affinity)
 
-    if selected_food_id != "None":
-        update_delete_food_listing(selected_food_id)
+    days_left = listings['Days_Left'].clip(lower=0).to_numpy()
+    urgency = (1 / (1 + days_left)).astype(np.float32)
+    choice = _allocate(top, groups, urgency, len(receivers), capacity)
+    matched = np.flatnonzero(choice >= 0)
+    group, column = groups[matched], choice[matched]
+    return pd.DataFrame({
+        'Food_ID': listings['Food_ID'].to_numpy()[matched],
+        'Receiver_ID': receivers['Receiver_ID'].to_numpy()[top[group, column]],
+        'Score': top_scores[group, column] + MATCH_WEIGHTS['urgency'] * urgency[matched],
+        'City_Match': top_city[group, column].astype(np.int8),
+    }, columns=columns)
 
 
-def update_delete_food_listing(food_id):
-    """Updates or deletes a selected food listing."""
+def save_allocations(allocations):
+    """Replaces the stored allocations with `allocations` in a single transaction. Returns the row count."""
+    matched_at = datetime.now().isoformat(sep=' ', timespec='seconds')
+    # Columns to Python lists, then zipped: much cheaper than a tuple per row from pandas
+    records = list(zip(*(allocations[column].to_numpy().tolist()
+                         for column in ['Food_ID', 'Receiver_ID', 'Score', 'City_Match']),
+                       itertools.repeat(matched_at)))
+    with get_connection(read_only=False) as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(f"DELETE FROM {MATCH_TABLE}")
+            conn.executemany(f"""
+                INSERT INTO {MATCH_TABLE} (Food_ID, Receiver_ID, Score, City_Match, Matched_At)
+                VALUES (?, ?, ?, ?, ?)
+            """, records)
+            _bump_table_versions(conn, [MATCH_TABLE])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return len(records)
 
-    query = "SELECT * FROM FoodListings WHERE Food_ID = ?"
-    result = execute_query(query, (food_id,))
-    if result:
-        listing = result[0]  # Get the first (and only) row
-        food_name, quantity, expiry_date, provider_id, location, food_type, meal_type = listing[1:]
 
-        # Update
-        st.subheader("Update Listing")
-        new_food_name = st.text_input("Food Name", food_name)
-        new_quantity = st.number_input("Quantity", value=quantity, min_value=1, step=1)
-        new_expiry_date = st.date_input("Expiry Date", datetime.strptime(expiry_date, '%Y-%m-%d'))
-        new_location = st.text_input("Location", location)
-        new_food_type = st.selectbox("Food Type", get_unique_values("FoodListings", "Food_Type"),
-                                    index=get_unique_values("FoodListings", "Food_Type").index(food_type))
-        new_meal_type = st.selectbox("Meal Type", get_unique_values("FoodListings", "Meal_Type"),
-                                    index=get_unique_values("FoodListings", "Meal_Type").index(meal_type))
+def run_matching(as_of=None, capacity=MATCH_RECEIVER_CAPACITY):
+    """Matches open listings to receivers and stores the result. Returns the allocations."""
+    started = time.perf_counter()
+    allocations = match_listings(as_of, capacity)
+    save_allocations(allocations)
+    print(f"Matched {len(allocations)} listings in {time.perf_counter() - started:.2f}s.")
+    return allocations
 
-        if st.button("Update"):
-            update_query = """
-                UPDATE FoodListings
-                SET Food_Name = ?, Quantity = ?, Expiry_Date = ?, Location = ?, Food_Type = ?, Meal_Type = ?
-                WHERE Food_ID = ?
-            """
-            execute_query(update_query, (new_food_name, new_quantity, new_expiry_date, new_location, new_food_type, new_meal_type, food_id))
-            st.success("Food listing updated successfully!")
-            st.rerun()  # Refresh the page to show updated data
 
-        # Delete
-        st.subheader("Delete Listing")
-        if st.button("Delete"):
-            delete_query = "DELETE FROM FoodListings WHERE Food_ID = ?"
-            execute_query(delete_query, (food_id,))
-            st.success("Food listing deleted successfully!")
-            st.rerun()
+MATCH_COLUMNS = ["Food_ID", "Food_Name", "Location", "Expiry_Date", "Receiver_ID", "Receiver_Name", "Score"]
+
+
+def display_matches():
+    """Runs the matching engine and shows the proposed allocations."""
+    st.header("Suggested Matches")
+    capacity = st.number_input("Listings per receiver", min_value=1, value=MATCH_RECEIVER_CAPACITY, step=1)
+    if st.button("Run matching"):
+        with st.spinner("Matching listings to receivers..."):
+            allocations = run_matching(capacity=int(capacity))
+        st.success(f"Matched {len(allocations):,} listings.")
+    query = f"""
+        SELECT m.Food_ID, fl.Food_Name, fl.Location, fl.Expiry_Date, m.Receiver_ID, r.Name, ROUND(m.Score, 3)
+        FROM {MATCH_TABLE} m
+        JOIN FoodListings fl ON fl.Food_ID = m.Food_ID
+        JOIN Receivers r ON r.Receiver_ID = m.Receiver_ID
+        WHERE 1=1
+    """
+    display_paginated("matches", query, [], MATCH_COLUMNS,
+                      {"Food_ID": "m.Food_ID", "Expiry_Date": "fl.Expiry_Date", "Score": "m.Score"}, "m.Food_ID")
+
+
+def display_search():
+    """Ranked search across food listings, providers and receivers, with autocomplete."""
+    st.header("Search")
+    text = st.text_input("Search food, providers and receivers")
+    if not build_search_expression(text):
+        return
+    # One search per index; reruns with the same text and data reuse them
+    tables = sorted({table for table, _, _, _ in SEARCH_INDEXES.values()})
+    key = (text, tuple(sorted(get_table_versions(tables).items())))
+    if st.session_state.get("search_key") != key:
+        st.session_state["search_results"] = {index: ranked_matches(index, text) for index in SEARCH_INDEXES}
+        st.session_state["search_key"] = key
+    results = st.session_state["search_results"]
+    suggestions = suggest(text, [row for rows, _ in results.values() for row in rows])
+    if suggestions:
+        st.caption("Suggestions: " + ", ".join(sorted(suggestions)))
+    for tab, (index, (_, key_column, columns, _)) in zip(st.tabs(["Food Listings", "Providers", "Receivers"]),
+                                                         SEARCH_INDEXES.items()):
+        rows, complete = results[index]
+        with tab:
+            if not complete:
+                st.caption(f"Best matches among the newest {SEARCH_RANK_WINDOW:,}; add words to search older ones.")
+            st.dataframe(pd.DataFrame(rows[:SEARCH_LIMIT], columns=[key_column, *columns]))
 
 
 def add_food_listing():
@@ -230,32 +2872,577 @@ def add_food_listing():
     meal_type = st.selectbox("Meal Type", get_unique_values("FoodListings", "Meal_Type"))
 
     if st.button("Add Listing"):
-        query = """
-            INSERT INTO FoodListings (Food_Name, Quantity, Expiry_Date, Provider_ID, Location, Food_Type, Meal_Type)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """
-        params = (food_name, quantity, expiry_date, provider_id, location, food_type, meal_type)
-        execute_query(query, params)
-        st.success("Food listing added successfully!")
+        report = insert_food_listings([{
+            "Food_Name": food_name, "Quantity": quantity, "Expiry_Date": expiry_date, "Provider_ID": provider_id,
+            "Location": location, "Food_Type": food_type, "Meal_Type": meal_type,
+        }])
+        if report["failed"]:
+            st.error(report["results"][0]["Error"])
+        else:
+            st.success("Food listing added successfully!")
+
 
 
+_distinct_cache = OrderedDict()  # (table, column) -> (loaded_at, values)
+_distinct_cache_lock = threading.Lock()
+_distinct_generations = {}  # table -> invalidation count, guards against racing reloads
+distinct_cache_stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+
 
 def get_unique_values(table, column):
     """Gets unique values from a table column for filter/dropdown options."""
+    if table not in TABLE_SCHEMAS or not re.fullmatch(r"\w+", column):
+        raise ValueError(f"Unknown column: {table}.{column}")
+    key = (table, column)
+    now = time.monotonic()
+    with _distinct_cache_lock:
+        entry = _distinct_cache.get(key)
+        if entry is not None and now - entry[0] < DISTINCT_CACHE_TTL:
+            _distinct_cache.move_to_end(key)
+            distinct_cache_stats['hits'] += 1
+            return list(entry[1])
+        distinct_cache_stats['misses'] += 1
+        generation = _distinct_generations.get(table, 0)
+
     query = f"SELECT DISTINCT {column} FROM {table}"
     results = execute_query(query)
-    return [row[0] for row in results]
+    values = [row[0] for row in results]
+
+    with _distinct_cache_lock:
+        if _distinct_generations.get(table, 0) != generation:
+            return list(values)  # A write landed while we were reading
+        _distinct_cache[key] = (now, values)
+        _distinct_cache.move_to_end(key)
+        while len(_distinct_cache) > DISTINCT_CACHE_SIZE:
+            _distinct_cache.popitem(last=False)
+            distinct_cache_stats['evictions'] += 1
+    return list(values)
+
+
+def invalidate_unique_values(table=None):
+    """Drops cached distinct values for a table (or every table) after a write."""
+    with _distinct_cache_lock:
+        for key in [key for key in _distinct_cache if table is None or key[0] == table]:
+            del _distinct_cache[key]
+            distinct_cache_stats['invalidations'] += 1
+        for name in ([table] if table else list(TABLE_SCHEMAS)):
+            _distinct_generations[name] = _distinct_generations.get(name, 0) + 1
+
+
+def get_distinct_cache_stats():
+    """Returns a snapshot of the dropdown option cache counters."""
+    with _distinct_cache_lock:
+        stats = dict(distinct_cache_stats)
+        stats['entries'] = len(_distinct_cache)
+    return stats
+
 
+def _indexed_columns(table_name):
+    """Returns the columns of a table that lead one of its indexes."""
+    return {execute_query(f"PRAGMA index_info({index[1]})")[0][2]
+            for index in execute_query(f"PRAGMA index_list({table_name})")}
 
 
 def display_data(table_name):
-    """Displays data from a given table."""
+    """Displays data from a given table, sortable by its key and indexed columns."""
+    if table_name not in TABLE_SCHEMAS:
+        raise ValueError(f"Unknown table: {table_name}")
     st.header(f"View {table_name}")
-    query = f"SELECT * FROM {table_name}"
-    results = execute_query(query)
-    df = pd.DataFrame(results, columns=[description[0] for description in execute_query(f"PRAGMA table_info({table_name})")])
-    st.dataframe(df)
+    columns = [column[1] for column in execute_query(f"PRAGMA table_info({table_name})")]
+    query = f"SELECT * FROM {table_name} WHERE 1=1"
+    key_column = CSV_FILES[table_name][1]
+    sortable = _indexed_columns(table_name) | {key_column}
+    display_paginated(f"view_{table_name}", query, [], columns,
+                      {column: column for column in columns if column in sortable}, key_column)
+
+
+
+CITY_CONTACTS_QUERY = "What is the contact information of food providers in a specific city?"
+
+# The canned questions shown by display_sql_queries, in display order. These
+# are the raw queries; the dashboard serves most of them from the summaries
+# below instead of running them on every button press. Historical questions
+# read the AllFoodListings/AllClaims views so swept (archived) rows still count.
+ANALYTICS_QUERIES = {
+    "How many food providers and receivers are there in each city?": """
+        SELECT
+            City,
+            COUNT(DISTINCT CASE WHEN table_name = 'Providers' THEN ID ELSE NULL END) as num_providers,
+            COUNT(DISTINCT CASE WHEN table_name = 'Receivers' THEN ID ELSE NULL END) as num_receivers
+        FROM (
+            SELECT City, Provider_ID as ID, 'Providers' as table_name FROM Providers
+            UNION ALL
+            SELECT City, Receiver_ID as ID, 'Receivers' as table_name FROM Receivers
+        )
+        GROUP BY City
+    """,
+    # Claims take their Quantity out of the listing's, so what a provider
+    # contributed is a listing's remaining Quantity plus the units claimed
+    "Which type of food provider contributes the most food?": """
+        SELECT
+            fl.Provider_Type,
+            SUM(IFNULL(fl.Quantity, 0) + IFNULL(cq.Claimed, 0)) as total_quantity
+        FROM AllFoodListings fl
+        LEFT JOIN (SELECT Food_ID, SUM(Quantity) AS Claimed FROM AllClaims GROUP BY Food_ID) cq
+            ON cq.Food_ID = fl.Food_ID
+        GROUP BY fl.Provider_Type
+        ORDER BY total_quantity DESC
+        LIMIT 1
+    """,
+    CITY_CONTACTS_QUERY: """
+        SELECT
+            Name,
+            Contact
+        FROM Providers
+        WHERE City = ?
+    """,
+    "Which receivers have claimed the most food?": """
+        SELECT
+            r.Name,
+            COUNT(c.Receiver_ID) as num_claims
+        FROM Receivers r
+        JOIN AllClaims c ON r.Receiver_ID = c.Receiver_ID
+        GROUP BY r.Name
+        ORDER BY num_claims DESC
+    """,
+    "What is the total quantity of food available from all providers?": """
+        SELECT SUM(IFNULL(fl.Quantity, 0) + IFNULL(cq.Claimed, 0)) AS Total_Quantity
+        FROM FoodListings fl
+        LEFT JOIN (SELECT Food_ID, SUM(Quantity) AS Claimed FROM Claims GROUP BY Food_ID) cq
+            ON cq.Food_ID = fl.Food_ID
+    """,
+    "What percentage of food claims are completed?": """
+        SELECT
+            CAST(SUM(CASE WHEN Status = 'Completed' THEN 1 ELSE 0 END) AS REAL) * 100 / COUNT(*)
+        FROM AllClaims
+    """,
+    "What is the average quantity of food claimed per receiver?": """
+        SELECT
+            r.Name,
+            AVG(COALESCE(c.Quantity, fl.Quantity)) AS Average_Quantity
+        FROM AllClaims c
+        JOIN Receivers r ON c.Receiver_ID = r.Receiver_ID
+        JOIN AllFoodListings fl ON c.Food_ID = fl.Food_ID
+        GROUP BY r.Name
+    """,
+    "Providers with highest success rate in fulfilling claims": """
+        SELECT
+            p.Name AS ProviderName,
+            CAST(SUM(CASE WHEN c.Status = 'Completed' THEN 1 ELSE 0 END) AS REAL) / COUNT(c.Claim_ID) AS SuccessRate
+        FROM
+            Providers p
+        JOIN
+            AllFoodListings fl ON p.Provider_ID = fl.Provider_ID
+        JOIN
+            AllClaims c ON fl.Food_ID = c.Food_ID
+        GROUP BY
+            p.Provider_ID, p.Name
+        ORDER BY
+            SuccessRate DESC
+    """,
+    "Food type with the highest demand": """
+        SELECT
+            Food_Type,
+            COUNT(c.Food_ID) AS ClaimCount
+        FROM
+            AllFoodListings fl
+        JOIN
+            AllClaims c ON fl.Food_ID = c.Food_ID
+        GROUP BY
+            Food_Type
+        ORDER BY
+            ClaimCount DESC
+        LIMIT 1
+    """,
+    "Quantity of food claimed over time": """
+        SELECT
+            DATE(Timestamp) AS ClaimDate,
+            SUM(COALESCE(c.Quantity, fl.Quantity)) AS TotalQuantityClaimed
+        FROM
+            AllClaims c
+        JOIN
+            AllFoodListings fl ON c.Food_ID = fl.Food_ID
+        GROUP BY
+            DATE(Timestamp)
+        ORDER BY
+            ClaimDate
+    """,
+    "Locations with the most expired food": """
+        SELECT
+            Location,
+            COUNT(*) AS ExpiredFoodCount
+        FROM
+            AllFoodListings
+        WHERE
+            Expiry_Date < DATE('now')
+        GROUP BY
+            Location
+        ORDER BY
+            ExpiredFoodCount DESC
+    """,
+    "Distribution of claims status": """
+        SELECT
+            Status,
+            COUNT(*) AS ClaimCount,
+            (COUNT(*) * 100.0 / (SELECT COUNT(*) FROM AllClaims)) AS Percentage
+        FROM
+            AllClaims
+        GROUP BY
+            Status
+    """,
+    "Providers who have provided food claimed by NGOs": """
+        SELECT DISTINCT
+            p.Name AS ProviderName
+        FROM
+            Providers p
+        JOIN
+            AllFoodListings fl ON p.Provider_ID = fl.Provider_ID
+        JOIN
+            AllClaims c ON fl.Food_ID = c.Food_ID
+        JOIN
+            Receivers r ON c.Receiver_ID = r.Receiver_ID
+        WHERE
+            r.Type = 'NGO'
+    """,
+}
+
+# Questions answered from counter tables that triggers keep current row by
+# row (see migrations 4, 10 and 13), so they are never stale.
+COUNTER_SUMMARIES = {
+    "Which type of food provider contributes the most food?": """
+        SELECT
+            NULLIF(Provider_Type, '') AS Provider_Type,
+            Quantity AS total_quantity
+        FROM QuantityByProviderType
+        WHERE Listing_Count > 0
+        ORDER BY total_quantity DESC
+        LIMIT 1
+    """,
+    "How many food providers and receivers are there in each city?": """
+        SELECT
+            NULLIF(City, '') AS City,
+            Provider_Count AS num_providers,
+            Receiver_Count AS num_receivers
+        FROM CityCounts
+        WHERE Provider_Count > 0 OR Receiver_Count > 0
+        ORDER BY City
+    """,
+    "Which receivers have claimed the most food?": """
+        SELECT
+            r.Name,
+            SUM(cc.Claim_Count) as num_claims
+        FROM ClaimCountsByReceiver cc
+        JOIN Receivers r ON r.Receiver_ID = cc.Receiver_ID
+        WHERE cc.Claim_Count > 0
+        GROUP BY r.Name
+        ORDER BY num_claims DESC
+    """,
+    "What percentage of food claims are completed?": """
+        SELECT
+            CAST(SUM(CASE WHEN Status = 'Completed' THEN Claim_Count ELSE 0 END) AS REAL) * 100 / SUM(Claim_Count)
+        FROM ClaimCountsByStatus
+    """,
+    "Distribution of claims status": """
+        SELECT
+            NULLIF(Status, '') AS Status,
+            Claim_Count AS ClaimCount,
+            (Claim_Count * 100.0 / (SELECT SUM(Claim_Count) FROM ClaimCountsByStatus)) AS Percentage
+        FROM
+            ClaimCountsByStatus
+        WHERE
+            Claim_Count > 0
+        ORDER BY
+            Status
+    """,
+    "What is the total quantity of food available from all providers?": """
+        SELECT SUM(Hot_Quantity) AS Total_Quantity
+        FROM QuantityByProviderType
+        WHERE Hot_Listing_Count > 0
+    """,
+    "Providers with highest success rate in fulfilling claims": """
+        SELECT
+            p.Name AS ProviderName,
+            CAST(cc.Completed_Count AS REAL) / cc.Claim_Count AS SuccessRate
+        FROM ClaimCountsByProvider cc
+        JOIN Providers p ON p.Provider_ID = cc.Provider_ID
+        WHERE cc.Claim_Count > 0
+        ORDER BY SuccessRate DESC
+    """,
+    "Food type with the highest demand": """
+        SELECT
+            NULLIF(Food_Type, '') AS Food_Type,
+            Claim_Count AS ClaimCount
+        FROM ClaimCountsByFoodType
+        WHERE Claim_Count > 0
+        ORDER BY ClaimCount DESC
+        LIMIT 1
+    """,
+    # '' is where NULL expiry dates are counted, and sorts before every date
+    "Locations with the most expired food": """
+        SELECT
+            NULLIF(Location, '') AS Location,
+            SUM(Listing_Count) AS ExpiredFoodCount
+        FROM ListingCountsByExpiry
+        WHERE Expiry_Date != '' AND Expiry_Date < DATE('now')
+        GROUP BY Location
+        HAVING SUM(Listing_Count) > 0
+        ORDER BY ExpiredFoodCount DESC
+    """,
+}
+
+# Questions served from snapshot tables, as name -> (summary table, source
+# tables). A snapshot is stale once any source table's write version (or the
+# date) has moved on since it was built. These have no counters: a claim
+# without a Quantity counts its listing's current Quantity, which each new
+# claim on the listing changes, and the NGO question depends on every
+# receiver's current Type.
+MATERIALIZED_SUMMARIES = {
+    "What is the average quantity of food claimed per receiver?": ('SummaryReceiverAverageQuantity', ('Claims', 'ClaimsArchive', 'Receivers', 'FoodListings', 'FoodListingsArchive')),
+    "Quantity of food claimed over time": ('SummaryQuantityOverTime', ('Claims', 'ClaimsArchive', 'FoodListings', 'FoodListingsArchive')),
+    "Providers who have provided food claimed by NGOs": ('SummaryNgoProviders', ('Providers', 'FoodListings', 'FoodListingsArchive', 'Claims', 'ClaimsArchive', 'Receivers')),
+}
+SUMMARY_REFRESH_INTERVAL = 60  # Seconds between background refreshes of stale summaries
+
+_summary_refresher = {'thread': None, 'stop': threading.Event(), 'lock': threading.Lock()}
+
+
+def get_table_versions(tables=None):
+    """Returns {table: write version} for the given (or all) base tables."""
+    versions = dict(execute_query("SELECT Table_Name, Version FROM TableVersions"))
+    return {table: versions.get(table, 0) for table in (tables or _versioned_tables())}
+
+
+def _summary_signature(conn, source_tables):
+    """Describes the source data a summary reflects: today's date plus each source's version."""
+    placeholders = ", ".join("?" for _ in source_tables)
+    versions = dict(conn.execute(
+        f"SELECT Table_Name, Version FROM TableVersions WHERE Table_Name IN ({placeholders})",
+        source_tables).fetchall())
+    return _sqlite_today(conn) + ";" + ";".join(f"{table}={versions.get(table, 0)}" for table in source_tables)
+
+
+def refresh_summary(name):
+    """
+    Rebuilds one materialized summary from its raw query.
+
+    The query runs in one read transaction on a pooled reader, so it sees a
+    consistent WAL snapshot without blocking writers. The writer is only
+    held to replace the summary's (small) result rows and SummaryState entry.
+    """
+    summary_table, source_tables = MATERIALIZED_SUMMARIES[name]
+    with get_connection() as conn:
+        conn.execute("BEGIN")
+        try:
+            signature = _summary_signature(conn, source_tables)
+            cursor = conn.execute(ANALYTICS_QUERIES[name])
+            rows = cursor.fetchall()
+            columns = [column[0] for column in cursor.description]
+        finally:
+            conn.rollback()
+
+    names = ", ".join('"' + column.replace('"', '""') + '"' for column in columns)
+    placeholders = ", ".join("?" for _ in columns)
+    with get_connection(read_only=False) as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(f"DROP TABLE IF EXISTS {summary_table}")
+            conn.execute(f"CREATE TABLE {summary_table} ({names})")
+            conn.executemany(f"INSERT INTO {summary_table} VALUES ({placeholders})", rows)
+            conn.execute("""
+                INSERT OR REPLACE INTO SummaryState (Summary_Name, Refreshed_At, Source_Signature)
+                VALUES (?, ?, ?)
+            """, (summary_table, datetime.now().isoformat(sep=' ', timespec='seconds'), signature))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+
+def get_stale_summaries():
+    """Returns the names of materialized summaries whose source data has changed."""
+    states = {table: signature for table, signature in
+              execute_query("SELECT Summary_Name, Source_Signature FROM SummaryState")}
+    stale = []
+    with get_connection() as conn:
+        for name, (summary_table, source_tables) in MATERIALIZED_SUMMARIES.items():
+            if states.get(summary_table) != _summary_signature(conn, source_tables):
+                stale.append(name)
+    return stale
+
+
+def refresh_summaries(force=False, names=None):
+    """Refreshes stale (or, with `force`, all) materialized summaries. Returns the names refreshed."""
+    names = [name for name in (names or MATERIALIZED_SUMMARIES) if name in MATERIALIZED_SUMMARIES]
+    if not force:
+        stale = set(get_stale_summaries())
+        names = [name for name in names if name in stale]
+    for name in names:
+        refresh_summary(name)
+    return names
+
+
+def read_summary(name):
+    """
+    Reads a precomputed answer to a catalogue question.
+
+    Returns (rows, refreshed_at, is_stale). Counter-backed answers are always
+    current (refreshed_at is None); a materialized summary is only computed
+    here if it has never been built.
+    """
+    if name in COUNTER_SUMMARIES:
+        return execute_query(COUNTER_SUMMARIES[name]), None, False
+    summary_table, source_tables = MATERIALIZED_SUMMARIES[name]
+    state = execute_query("SELECT Refreshed_At, Source_Signature FROM SummaryState WHERE Summary_Name = ?",
+                          (summary_table,))
+    if not state:
+        refresh_summary(name)
+        return read_summary(name)
+    with get_connection() as conn:
+        is_stale = state[0][1] != _summary_signature(conn, source_tables)
+    rows = execute_query(f"SELECT * FROM {summary_table} ORDER BY rowid")
+    return rows, state[0][0], is_stale
+
+
+def start_summary_refresher(interval=SUMMARY_REFRESH_INTERVAL):
+    """Starts (once per process) a daemon thread that refreshes stale summaries every `interval` seconds."""
+    def run():
+        while not _summary_refresher['stop'].wait(interval):
+            try:
+                refresh_summaries()
+            except sqlite3.Error as e:
+                print(f"Summary refresh failed: {e}")
+
+    with _summary_refresher['lock']:
+        if _summary_refresher['thread'] is None or not _summary_refresher['thread'].is_alive():
+            _summary_refresher['stop'].clear()
+            _summary_refresher['thread'] = threading.Thread(target=run, name="summary-refresher", daemon=True)
+            _summary_refresher['thread'].start()
+    return _summary_refresher['thread']
+
+
+def stop_summary_refresher():
+    """Stops the background summary refresher, if running."""
+    _summary_refresher['stop'].set()
+
+
+_analytics = {'executor': None, 'jobs': OrderedDict(), 'lock': threading.Lock()}
+JOB_ACTIVE_STATES = ('queued', 'running')
+
+
+def submit_analytics_query(query, params=None, timeout=ANALYTICS_TIMEOUT, label=None, caller=None):
+    """
+    Queues a read-only query to run on a background thread. Returns a job id
+    for poll_analytics_job() and cancel_analytics_job(). Raises queue.Full
+    when ANALYTICS_QUEUE_SIZE jobs are already queued or running. The query
+    stats attribute the job to `caller`, by default the function submitting it.
+    """
+    caller = caller or _calling_function()
+    if not is_read_only_query(query):
+        raise ValueError("Only read-only queries can run in the background")
+    with _analytics['lock']:
+        jobs = _analytics['jobs']
+        if sum(job['status'] in JOB_ACTIVE_STATES for job in jobs.values()) >= ANALYTICS_QUEUE_SIZE:
+            raise queue.Full("Too many analytics queries are already running; try again shortly.")
+        if _analytics['executor'] is None:
+            _analytics['executor'] = ThreadPoolExecutor(max_workers=ANALYTICS_WORKERS,
+                                                        thread_name_prefix="analytics")
+        job_id = uuid.uuid4().hex
+        jobs[job_id] = {
+            'label': label or _normalize_query(query)[:80], 'caller': caller, 'status': 'queued', 'timeout': timeout,
+            'submitted_at': time.time(), 'started_at': None, 'finished_at': None,
+            'results': None, 'error': None, 'cancel': threading.Event(),
+        }
+        finished = [old_id for old_id, job in jobs.items() if job['status'] not in JOB_ACTIVE_STATES]
+        for old_id in finished[:max(len(finished) - ANALYTICS_JOB_HISTORY, 0)]:
+            del jobs[old_id]
+        _analytics['executor'].submit(_run_analytics_job, job_id, query, params)
+    return job_id
+
+
+def _run_analytics_job(job_id, query, params):
+    """Runs one job, interrupting SQLite through the progress handler on cancel or timeout."""
+    job = _analytics['jobs'][job_id]
+    with _analytics['lock']:
+        if job['cancel'].is_set():
+            job['status'], job['finished_at'] = 'cancelled', time.time()
+            return
+        job['status'], job['started_at'] = 'running', time.time()
+    deadline = time.monotonic() + job['timeout']
+
+    def should_interrupt():
+        return job['cancel'].is_set() or time.monotonic() > deadline
 
+    started = time.perf_counter()
+    status, results, error = 'done', None, None
+    try:
+        with get_connection() as conn:
+            conn.set_progress_handler(should_interrupt, PROGRESS_HANDLER_STEPS)
+            try:
+                results = conn.execute(query, params or ()).fetchall()
+            except sqlite3.OperationalError as e:
+                if job['cancel'].is_set():
+                    status = 'cancelled'
+                elif time.monotonic() > deadline:
+                    status, error = 'timeout', f"Query exceeded {job['timeout']}s and was stopped."
+                else:
+                    status, error = 'failed', str(e)
+            finally:
+                conn.set_progress_handler(None, 0)
+    except Exception as e:  # Whatever happens, the job must not stay 'running'
+        status, error = 'failed', str(e)
+    try:
+        _record_query(query, params, time.perf_counter() - started, len(results or ()), False,
+                      failed=status != 'done', caller=job['caller'])
+    finally:
+        with _analytics['lock']:
+            job.update(status=status, results=results, error=error, finished_at=time.time())
+
+
+def poll_analytics_job(job_id):
+    """
+    Returns a job's state: status ('queued', 'running', 'done', 'failed',
+    'timeout' or 'cancelled'), results once done, error and elapsed seconds.
+    Returns None for unknown (or expired) job ids.
+    """
+    with _analytics['lock']:
+        job = _analytics['jobs'].get(job_id)
+        if job is None:
+            return None
+        state = {key: value for key, value in job.items() if key != 'cancel'}
+    end = state['finished_at'] or time.time()
+    state['elapsed'] = end - (state['started_at'] or state['submitted_at'])
+    return state
+
+
+def cancel_analytics_job(job_id):
+    """Asks a queued or running job to stop. Returns False if it had already finished."""
+    with _analytics['lock']:
+        job = _analytics['jobs'].get(job_id)
+        if job is None or job['status'] not in JOB_ACTIVE_STATES:
+            return False
+        job['cancel'].set()
+    return True
+
+
+@st.fragment(run_every="1s")
+def _display_analytics_job():
+    """Shows the session's background query, re-polling every second while it runs."""
+    job_id = st.session_state.get('analytics_job')
+    state = poll_analytics_job(job_id) if job_id else None
+    if state is None:
+        return
+    st.subheader(f"Live Query: {state['label']}")
+    if state['status'] in JOB_ACTIVE_STATES:
+        st.info(f"{state['status'].capitalize()} for {state['elapsed']:.1f}s...")
+        if st.button("Cancel Query"):
+            cancel_analytics_job(job_id)
+    elif state['status'] == 'done':
+        st.caption(f"Finished in {state['elapsed']:.2f}s")
+        st.dataframe(state['results'])
+    elif state['status'] == 'cancelled':
+        st.warning("Query cancelled.")
+    else:
+        st.error(state['error'])
 
 
 def display_sql_queries():
@@ -263,204 +3450,495 @@ def display_sql_queries():
 
     st.header("Execute SQL Queries")
 
-    query_choice = st.selectbox("Select a Query", [
-        "How many food providers and receivers are there in each city?",
-        "Which type of food provider contributes the most food?",
-        "What is the contact information of food providers in a specific city?",
-        "Which receivers have claimed the most food?",
-        "What is the total quantity of food available from all providers?",
-        "What percentage of food claims are completed?",
-        "What is the average quantity of food claimed per receiver?",
-        "Providers with highest success rate in fulfilling claims",
-        "Food type with the highest demand",
-        "Quantity of food claimed over time",
-        "Locations with the most expired food",
-        "Distribution of claims status",
-        "Providers who have provided food claimed by NGOs"
-    ])
+    query_choice = st.selectbox("Select a Query", list(ANALYTICS_QUERIES))
 
-    if st.button("Execute Query"):
-        if query_choice == "How many food providers and receivers are there in each city?":
-            query = """
-                SELECT
-                    City,
-                    COUNT(DISTINCT CASE WHEN table_name = 'Providers' THEN Provider_ID ELSE NULL END) as num_providers,
-                    COUNT(DISTINCT CASE WHEN table_name = 'Receivers' THEN Receiver_ID ELSE NULL END) as num_receivers
-                FROM (
-                    SELECT City, Provider_ID, 'Providers' as table_name FROM Providers
-                    UNION ALL
-                    SELECT City, Receiver_ID, 'Receivers' as table_name FROM Receivers
-                )
-                GROUP BY City
-            """
-        elif query_choice == "Which type of food provider contributes the most food?":
-            query = """
-                SELECT
-                    Provider_Type,
-                    SUM(Quantity) as total_quantity
-                FROM FoodListings
-                GROUP BY Provider_Type
-                ORDER BY total_quantity DESC
-                LIMIT 1
-            """
-        elif query_choice == "What is the contact information of food providers in a specific city?":
-            city = st.text_input("Enter City Name")
-            if city:
-                query = f"""
-                    SELECT
-                        Name,
-                        Contact
-                    FROM Providers
-                    WHERE City = '{city}'
-                """
-            else:
+    if query_choice == CITY_CONTACTS_QUERY:
+        city = st.text_input("Enter City Name")
+        if st.button("Execute Query"):
+            if not city:
                 st.warning("Please enter a city name.")
                 return
-        elif query_choice == "Which receivers have claimed the most food?":
-            query = """
-                SELECT
-                    r.Name,
-                    COUNT(c.Receiver_ID) as num_claims
-                FROM Receivers r
-                JOIN Claims c ON r.Receiver_ID = c.Receiver_ID
-                GROUP BY r.Name
-                ORDER BY num_claims DESC
-            """
-        elif query_choice == "What is the total quantity of food available from all providers?":
-            query = "SELECT SUM(Quantity) FROM FoodListings"
-        elif query_choice == "What percentage of food claims are completed?":
-            query = """
-                SELECT
-                    CAST(SUM(CASE WHEN Status = 'Completed' THEN 1 ELSE 0 END) AS REAL) * 100 / COUNT(*)
-                FROM Claims
-            """
-        elif query_choice == "What is the average quantity of food claimed per receiver?":
-            query = """
-                SELECT
-                    r.Name,
-                    AVG(fl.Quantity)
-                FROM Claims c
-                JOIN Receivers r ON c.Receiver_ID = r.Receiver_ID
-                JOIN FoodListings fl ON c.Food_ID = fl.Food_ID
-                GROUP BY r.Name
-            """
-        elif query_choice == "Providers with highest success rate in fulfilling claims":
-            query = """
-                SELECT
-                    p.Name AS ProviderName,
-                    CAST(SUM(CASE WHEN c.Status = 'Completed' THEN 1 ELSE 0 END) AS REAL) / COUNT(c.Claim_ID) AS SuccessRate
-                FROM
-                    Providers p
-                JOIN
-                    FoodListings fl ON p.Provider_ID = fl.Provider_ID
-                JOIN
-                    Claims c ON fl.Food_ID = c.Food_ID
-                GROUP BY
-                    p.Provider_ID, p.Name
-                ORDER BY
-                    SuccessRate DESC;
-                """
-        elif query_choice == "Food type with the highest demand":
-            query = """
-                SELECT
-                    Food_Type,
-                    COUNT(c.Food_ID) AS ClaimCount
-                FROM
-                    FoodListings fl
-                JOIN
-                    Claims c ON fl.Food_ID = c.Food_ID
-                GROUP BY
-                    Food_Type
-                ORDER BY
-                    ClaimCount DESC
-                LIMIT 1;
-                """
-        elif query_choice == "Quantity of food claimed over time":
-            query = """
-                SELECT
-                    DATE(Timestamp) AS ClaimDate,
-                    SUM(fl.Quantity) AS TotalQuantityClaimed
-                FROM
-                    Claims c
-                JOIN
-                    FoodListings fl ON c.Food_ID = fl.Food_ID
-                GROUP BY
-                    DATE(Timestamp)
-                ORDER BY
-                    ClaimDate;
-                """
-        elif query_choice == "Locations with the most expired food":
-            query = """
-                SELECT
-                    Location,
-                    COUNT(*) AS ExpiredFoodCount
-                FROM
-                    FoodListings
-                WHERE
-                    Expiry_Date < DATE('now')
-                GROUP BY
-                    Location
-                ORDER BY
-                    ExpiredFoodCount DESC;
-                """
-        elif query_choice == "Distribution of claims status":
-            query = """
-                SELECT
-                    Status,
-                    COUNT(*) AS ClaimCount,
-                    (COUNT(*) * 100.0 / (SELECT COUNT(*) FROM Claims)) AS Percentage
-                FROM
-                    Claims
-                GROUP BY
-                    Status;
-                """
-        elif query_choice == "Providers who have provided food claimed by NGOs":
-            query = """
-                SELECT DISTINCT
-                    p.Name AS ProviderName
-                FROM
-                    Providers p
-                JOIN
-                    FoodListings fl ON p.Provider_ID = fl.Provider_ID
-                JOIN
-                    Claims c ON fl.Food_ID = c.Food_ID
-                JOIN
-                    Receivers r ON c.Receiver_ID = r.Receiver_ID
-                WHERE
-                    r.Type = 'NGO';
-                """
-        else:
-            query = ""
+            results = execute_query(ANALYTICS_QUERIES[CITY_CONTACTS_QUERY], (city,))
+            st.subheader("Query Results")
+            st.dataframe(results)
+        return
+
+    if st.button("Execute Query"):
+        results, refreshed_at, is_stale = read_summary(query_choice)
+        st.subheader("Query Results")
+        st.dataframe(results)
+        if refreshed_at is not None:
+            st.caption(f"Precomputed at {refreshed_at}" + (" (source data has changed since)" if is_stale else ""))
 
-        if query:
-            results = execute_query(query)
+    if query_choice in MATERIALIZED_SUMMARIES and st.button("Refresh Summary"):
+        refresh_summaries(force=True, names=[query_choice])
+        st.success("Summary refreshed.")
+
+    if query_choice in SNAPSHOT_ANALYTICS and st.button("Run on Snapshot"):
+        snapshot = run_snapshot_analytics(query_choice)
+        if snapshot is None:
+            st.warning("No snapshot yet; export one first.")
+        else:
+            results, created_at, is_stale = snapshot
             st.subheader("Query Results")
             st.dataframe(results)
+            st.caption(f"Snapshot taken at {created_at}" + (" (source data has changed since)" if is_stale else ""))
 
+    if st.button("Export Snapshot"):
+        with st.spinner("Exporting snapshot..."):
+            manifest = export_snapshot()
+        st.success(f"Snapshot of {sum(manifest['tables'].values()):,} rows written to {SNAPSHOT_DIR}.")
 
-def display_food_wastage_by_type_chart():
-    """Displays a bar chart of food wastage by food type."""
+    if st.button("Run Live Query"):
+        try:
+            st.session_state['analytics_job'] = submit_analytics_query(
+                ANALYTICS_QUERIES[query_choice], label=query_choice)
+        except queue.Full as e:
+            st.warning(str(e))
+    _display_analytics_job()
 
-    st.header("Food Wastage by Food Type")
 
-    query = """
-        SELECT
-            Food_Type,
-            SUM(Quantity) as Total_Quantity
-        FROM FoodListings
-        GROUP BY Food_Type
-        ORDER BY Total_Quantity DESC
+def display_query_stats():
+    """Displays live query latency, cache and pool statistics."""
+    st.header("Query Statistics")
+    if st.button("Reset Statistics"):
+        reset_query_stats()
+
+    stats = get_query_stats()
+    if stats:
+        df = pd.DataFrame([{
+            'Query': entry['query'][:120],
+            'Calls': entry['calls'],
+            'Total (ms)': entry['total_seconds'] * 1000,
+            'Mean (ms)': entry['mean_seconds'] * 1000,
+            'Max (ms)': entry['max_seconds'] * 1000,
+            'Rows': entry['rows'],
+            'Cache Hits': entry['cached'],
+            'Errors': entry['errors'],
+            'Callers': ", ".join(f"{caller} ({count})" for caller, count in entry['callers'].items()),
+        } for entry in stats])
+        st.dataframe(df)
+    else:
+        st.info("No queries recorded yet.")
+
+    st.subheader("Slow Queries")
+    slow_queries = get_slow_queries()
+    if not slow_queries:
+        st.caption(f"No queries slower than {SLOW_QUERY_SECONDS}s.")
+    for entry in slow_queries:
+        with st.expander(f"{entry['at']} · {entry['seconds'] * 1000:.0f} ms · {entry['caller']}"):
+            st.code(entry['query'], language='sql')
+            st.text("\n".join(entry['plan']))
+
+    st.subheader("Connection Pool and Caches")
+    st.json({'pool': get_pool_metrics(), 'distinct_cache': get_distinct_cache_stats(),
+             'result_cache': get_result_cache_stats()})
+
+
+def _snapshot_type(sql_type):
+    """Maps a declared SQLite column type to its Arrow type."""
+    import pyarrow as pa
+
+    sql_type = (sql_type or '').upper()
+    if 'INT' in sql_type:
+        return pa.int64()
+    if sql_type in ('REAL', 'FLOAT', 'DOUBLE'):
+        return pa.float64()
+    if sql_type == 'DATE':
+        return pa.date32()
+    if sql_type == 'DATETIME':
+        return pa.timestamp('s')
+    return pa.string()
+
+
+def _snapshot_column(values, arrow_type):
+    """Builds one Arrow column from SQLite values; unparseable dates become null."""
+    import pyarrow as pa
+
+    if arrow_type in (pa.date32(), pa.timestamp('s')):
+        parsed = pd.to_datetime(pd.Series(values, dtype='object'), errors='coerce', format='ISO8601')
+        if arrow_type == pa.date32():
+            parsed = parsed.dt.date
+        return pa.array(parsed, type=arrow_type, from_pandas=True)
+    return pa.array(values, type=arrow_type)
+
+
+def export_snapshot(out_dir=None):
     """
-    results = execute_query(query)
-    df = pd.DataFrame(results, columns=["Food_Type", "Total_Quantity"])
+    Writes every table in SNAPSHOT_TABLES to a compressed Parquet file in
+    `out_dir` (default SNAPSHOT_DIR), streaming SNAPSHOT_BATCH_ROWS rows at
+    a time so memory stays flat however large the tables are. All tables
+    are read in one transaction, so the snapshot is consistent; the database
+    id and table versions it reflects go into the manifest. Returns the manifest.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    out_dir = out_dir or SNAPSHOT_DIR
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = {'created_at': datetime.now().isoformat(sep=' ', timespec='seconds'), 'tables': {}}
+    with get_connection() as conn:
+        conn.execute("BEGIN")
+        try:
+            manifest['database_id'] = get_database_id(conn)
+            manifest['versions'] = dict(conn.execute("SELECT Table_Name, Version FROM TableVersions").fetchall())
+            for table in SNAPSHOT_TABLES:
+                columns = conn.execute(f"PRAGMA table_info({table})").fetchall()
+                schema = pa.schema([(column[1], _snapshot_type(column[2])) for column in columns])
+                path = os.path.join(out_dir, f"{table}.parquet")
+                cursor = conn.execute(f"SELECT {', '.join(schema.names)} FROM {table}")
+                rows = 0
+                # Written under a temporary name so readers never see a half-written file
+                with pq.ParquetWriter(path + '.tmp', schema, compression=SNAPSHOT_COMPRESSION) as writer:
+                    while batch := cursor.fetchmany(SNAPSHOT_BATCH_ROWS):
+                        values = list(zip(*batch))
+                        writer.write_table(pa.table([_snapshot_column(column_values, field.type)
+                                                     for column_values, field in zip(values, schema)],
+                                                    schema=schema))
+                        rows += len(batch)
+                os.replace(path + '.tmp', path)
+                manifest['tables'][table] = rows
+        finally:
+            conn.rollback()
+    with open(os.path.join(out_dir, SNAPSHOT_MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    print(f"Exported snapshot of {sum(manifest['tables'].values())} rows to {out_dir}.")
+    return manifest
+
+
+def get_snapshot_manifest(out_dir=None):
+    """Returns the manifest of the snapshot in `out_dir`, or None if there is none."""
+    path = os.path.join(out_dir or SNAPSHOT_DIR, SNAPSHOT_MANIFEST)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def snapshot_is_current(tables=None, out_dir=None):
+    """True if a snapshot exists and none of `tables` (default: all snapshotted) has been written since."""
+    manifest = get_snapshot_manifest(out_dir)
+    if manifest is None or manifest.get('database_id') != get_database_id():
+        return False
+    tables = list(tables or SNAPSHOT_TABLES)
+    current = get_table_versions(tables)
+    return all(manifest['versions'].get(table) == current.get(table) for table in tables)
+
+
+def read_snapshot(table, columns, out_dir=None):
+    """
+    Reads `columns` of a snapshotted table (or an ARCHIVE_VIEWS view, which
+    concatenates a table and its archive) as a pyarrow Table. The file is
+    memory-mapped and only the requested columns are decoded; string
+    columns stay dictionary-encoded, so repeated values such as cities and
+    food types are stored once.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if table in ARCHIVE_VIEWS:
+        return pa.concat_tables([read_snapshot(source, columns, out_dir)
+                                 for source in ARCHIVE_VIEWS[table]]).unify_dictionaries()
+    path = os.path.join(out_dir or SNAPSHOT_DIR, f"{table}.parquet")
+    schema = pq.read_schema(path)
+    strings = [column for column in columns if schema.field(column).type == pa.string()]
+    # Each row group has its own dictionary; group_by needs one per column
+    return pq.read_table(path, columns=columns, memory_map=True, read_dictionary=strings).unify_dictionaries()
+
+
+def _snapshot_result(table, columns, sort=None, limit=None):
+    """
+    Picks and renames the columns of an aggregated pyarrow Table ({column:
+    output name}), sorts and trims it by output names and converts it to a
+    small DataFrame.
+    """
+    import pyarrow as pa
+
+    table = table.select(list(columns)).rename_columns(list(columns.values()))
+    # Results are small, so decode dictionary columns (which cannot be sorted)
+    table = table.cast(pa.schema([(field.name, field.type.value_type if pa.types.is_dictionary(field.type)
+                                   else field.type) for field in table.schema]))
+    if sort:
+        table = table.sort_by(sort)
+    if limit is not None:
+        table = table.slice(0, limit)
+    return table.to_pandas(types_mapper={pa.int64(): pd.Int64Dtype()}.get)
+
+
+def _claims_with_listings(out_dir, claim_columns, listing_columns, claims_table='AllClaims',
+                          listings_table='AllFoodListings'):
+    """
+    Joins claims to the listings they claimed (hot and archived by default),
+    like AllClaims JOIN AllFoodListings. Food_ID is unique among listings,
+    so each claim looks up its listing's position directly, which is
+    several times faster than a general hash join. Listing columns that a
+    claim column shares a name with come back prefixed with 'Listing_'.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    claims = read_snapshot(claims_table, ['Food_ID', *claim_columns], out_dir)
+    listings = read_snapshot(listings_table, ['Food_ID', *listing_columns], out_dir)
+    positions = pc.index_in(claims['Food_ID'], value_set=listings['Food_ID'].combine_chunks())
+    matched = pc.is_valid(positions)
+    claims = claims.filter(matched)
+    listings = listings.select(listing_columns).take(positions.filter(matched))
+    return pa.Table.from_arrays([*claims.columns, *listings.columns],
+                                names=[*claims.column_names, *(f"Listing_{column}" if column in claim_columns
+                                                               else column for column in listing_columns)])
+
+
+def _snapshot_food_type_totals(out_dir):
+    listings = read_snapshot('FoodListings', ['Food_Type', 'Quantity'], out_dir)
+    return _snapshot_result(listings.group_by('Food_Type').aggregate([('Quantity', 'sum')]),
+                            {'Food_Type': 'Food_Type', 'Quantity_sum': 'Total_Quantity'}, [('Total_Quantity', 'descending')])
+
+
+def _snapshot_top_provider_type(out_dir):
+    import pyarrow as pa
+
+    # Remaining quantity plus the units claimed, as in the SQL query
+    listings = read_snapshot('AllFoodListings', ['Provider_Type', 'Quantity'], out_dir)
+    claimed = _claims_with_listings(out_dir, ['Quantity'], ['Provider_Type']).select(['Provider_Type', 'Quantity'])
+    quantities = pa.concat_tables([listings, claimed.cast(listings.schema)]).unify_dictionaries()
+    return _snapshot_result(quantities.group_by('Provider_Type').aggregate([('Quantity', 'sum')]),
+                            {'Provider_Type': 'Provider_Type', 'Quantity_sum': 'total_quantity'}, [('total_quantity', 'descending')], limit=1)
+
+
+def _snapshot_total_quantity(out_dir):
+    import pyarrow.compute as pc
+
+    remaining = pc.sum(read_snapshot('FoodListings', ['Quantity'], out_dir)['Quantity']).as_py()
+    claimed = pc.sum(_claims_with_listings(out_dir, ['Quantity'], [], 'Claims', 'FoodListings')['Quantity']).as_py()
+    total = None if remaining is None and claimed is None else (remaining or 0) + (claimed or 0)
+    return pd.DataFrame({'Total_Quantity': [total]})
+
+
+def _snapshot_completed_percentage(out_dir):
+    import pyarrow.compute as pc
+
+    status = read_snapshot('AllClaims', ['Status'], out_dir)['Status']
+    completed = pc.sum(pc.equal(status.cast('string'), 'Completed')).as_py() or 0
+    return pd.DataFrame({'Completed (%)': [completed * 100 / len(status) if len(status) else None]})
+
+
+def _snapshot_demand_by_food_type(out_dir):
+    joined = _claims_with_listings(out_dir, [], ['Food_Type'])
+    return _snapshot_result(joined.group_by('Food_Type').aggregate([('Food_ID', 'count')]),
+                            {'Food_Type': 'Food_Type', 'Food_ID_count': 'ClaimCount'}, [('ClaimCount', 'descending')], limit=1)
+
+
+def _snapshot_claimed_quantity_over_time(out_dir):
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    # A claim's own Quantity, or its listing's for claims recorded without one
+    joined = _claims_with_listings(out_dir, ['Timestamp', 'Quantity'], ['Quantity'])
+    joined = joined.set_column(joined.schema.get_field_index('Quantity'), 'Quantity',
+                               pc.coalesce(joined['Quantity'], joined['Listing_Quantity']))
+    joined = joined.append_column('ClaimDate', joined['Timestamp'].cast(pa.date32()))
+    return _snapshot_result(joined.group_by('ClaimDate').aggregate([('Quantity', 'sum')]),
+                            {'ClaimDate': 'ClaimDate', 'Quantity_sum': 'TotalQuantityClaimed'}, [('ClaimDate', 'ascending')])
+
+
+def _snapshot_claims_over_time(out_dir):
+    import pyarrow as pa
+
+    claims = read_snapshot('AllClaims', ['Timestamp'], out_dir)
+    claims = claims.append_column('Claim_Date', claims['Timestamp'].cast(pa.date32()))
+    return _snapshot_result(claims.group_by('Claim_Date').aggregate([([], 'count_all')]),
+                            {'Claim_Date': 'Claim_Date', 'count_all': 'Claims'}, [('Claim_Date', 'ascending')])
+
+
+def _snapshot_expired_by_location(out_dir, limit=None, count_column='ExpiredFoodCount'):
+    import pyarrow.compute as pc
+
+    listings = read_snapshot('AllFoodListings', ['Location', 'Expiry_Date'], out_dir)
+    expired = listings.filter(pc.less(listings['Expiry_Date'], date.fromisoformat(_sqlite_today())))
+    return _snapshot_result(expired.group_by('Location').aggregate([([], 'count_all')]),
+                            {'Location': 'Location', 'count_all': count_column}, [(count_column, 'descending')], limit=limit)
+
+
+def _snapshot_claim_status_distribution(out_dir):
+    claims = read_snapshot('AllClaims', ['Status'], out_dir)
+    counts = _snapshot_result(claims.group_by('Status').aggregate([([], 'count_all')]),
+                              {'Status': 'Status', 'count_all': 'ClaimCount'}, [('Status', 'ascending')])
+    counts['Percentage'] = counts['ClaimCount'] * 100.0 / len(claims)
+    return counts
+
+
+# Catalogue questions and charts that can be answered from a snapshot:
+# name -> (function(out_dir) returning a DataFrame, tables the answer depends on)
+SNAPSHOT_ANALYTICS = {
+    "Which type of food provider contributes the most food?":
+        (_snapshot_top_provider_type, ('FoodListings', 'FoodListingsArchive', 'Claims', 'ClaimsArchive')),
+    "What is the total quantity of food available from all providers?":
+        (_snapshot_total_quantity, ('FoodListings', 'Claims')),
+    "What percentage of food claims are completed?":
+        (_snapshot_completed_percentage, ('Claims', 'ClaimsArchive')),
+    "Food type with the highest demand":
+        (_snapshot_demand_by_food_type, ('FoodListings', 'FoodListingsArchive', 'Claims', 'ClaimsArchive')),
+    "Quantity of food claimed over time":
+        (_snapshot_claimed_quantity_over_time, ('FoodListings', 'FoodListingsArchive', 'Claims', 'ClaimsArchive')),
+    "Locations with the most expired food":
+        (_snapshot_expired_by_location, ('FoodListings', 'FoodListingsArchive')),
+    "Distribution of claims status":
+        (_snapshot_claim_status_distribution, ('Claims', 'ClaimsArchive')),
+    "Food Wastage by Food Type":
+        (_snapshot_food_type_totals, ('FoodListings',)),
+    "Expired Food by Location":
+        (lambda out_dir: _snapshot_expired_by_location(out_dir, 20, 'Expired_Listings'),
+         ('FoodListings', 'FoodListingsArchive')),
+    "Claims over Time":
+        (_snapshot_claims_over_time, ('Claims', 'ClaimsArchive')),
+}
+
+
+def run_snapshot_analytics(name, out_dir=None):
+    """
+    Answers a SNAPSHOT_ANALYTICS question from the Parquet snapshot.
+    Returns (DataFrame, snapshot created_at, is_stale), or None if there is
+    no snapshot.
+    """
+    manifest = get_snapshot_manifest(out_dir)
+    if manifest is None:
+        return None
+    function, tables = SNAPSHOT_ANALYTICS[name]
+    return function(out_dir), manifest['created_at'], not snapshot_is_current(tables, out_dir)
+
+
+# Chart definitions: name -> query, columns, labels, source tables and kind
+CHART_SPECS = {
+    "Food Wastage by Food Type": {
+        'query': """
+            SELECT
+                Food_Type,
+                SUM(Quantity) as Total_Quantity
+            FROM FoodListings
+            GROUP BY Food_Type
+            ORDER BY Total_Quantity DESC
+        """,
+        'x': "Food_Type", 'y': "Total_Quantity",
+        'xlabel': "Food Type", 'ylabel': "Total Quantity",
+        'title': "Total Quantity of Food by Type",
+        'tables': ('FoodListings',), 'kind': 'bar',
+    },
+    "Expired Food by Location": {
+        'query': """
+            SELECT
+                Location,
+                COUNT(*) AS Expired_Listings
+            FROM AllFoodListings
+            WHERE Expiry_Date < DATE('now')
+            GROUP BY Location
+            ORDER BY Expired_Listings DESC
+            LIMIT 20
+        """,
+        'x': "Location", 'y': "Expired_Listings",
+        'xlabel': "Location", 'ylabel': "Expired Listings",
+        'title': "Expired Listings by Location (Top 20)",
+        'tables': ('FoodListings', 'FoodListingsArchive'), 'kind': 'bar',
+    },
+    "Claims over Time": {
+        'query': """
+            SELECT
+                DATE(Timestamp) AS Claim_Date,
+                COUNT(*) AS Claims
+            FROM AllClaims
+            GROUP BY DATE(Timestamp)
+            ORDER BY Claim_Date
+        """,
+        'x': "Claim_Date", 'y': "Claims",
+        'xlabel': "Date", 'ylabel': "Claims",
+        'title': "Claims per Day",
+        'tables': ('Claims', 'ClaimsArchive'), 'kind': 'line',
+    },
+}
+CHART_BACKENDS = ["native", "matplotlib"]  # native = Vega-Lite vector chart drawn in the browser
+CHART_CACHE_SIZE = 32  # Cached (chart, data version) entries
+
+_chart_cache = OrderedDict()  # (chart name, data version) -> {'data': DataFrame, 'png': bytes}
+_chart_cache_lock = threading.Lock()
+
+
+def _chart_cache_entry(name):
+    """Returns the cache entry for a chart's current data version, creating it if needed."""
+    spec = CHART_SPECS[name]
+    version = (get_database_id(), tuple(sorted(get_table_versions(spec['tables']).items())), _sqlite_today())
+    key = (name, version)
+    with _chart_cache_lock:
+        entry = _chart_cache.get(key)
+        if entry is not None:
+            _chart_cache.move_to_end(key)
+            return entry
+    if name in SNAPSHOT_ANALYTICS and snapshot_is_current(spec['tables']):
+        data = SNAPSHOT_ANALYTICS[name][0](None)
+    else:
+        data = pd.DataFrame(execute_query(spec['query']), columns=[spec['x'], spec['y']])
+    entry = {'data': data, 'png': None}
+    with _chart_cache_lock:
+        for stale_key in [stale_key for stale_key in _chart_cache if stale_key[0] == name]:
+            del _chart_cache[stale_key]  # Older versions of this chart can never be hit again
+        _chart_cache[key] = entry
+        while len(_chart_cache) > CHART_CACHE_SIZE:
+            _chart_cache.popitem(last=False)
+    return entry
+
+
+def get_chart_data(name):
+    """Returns the aggregated DataFrame behind a chart, cached per data version."""
+    return _chart_cache_entry(name)['data']
+
+
+def render_chart_png(name):
+    """Renders a chart with matplotlib/seaborn to PNG bytes, cached per data version."""
+    entry = _chart_cache_entry(name)
+    if entry['png'] is None:
+        # Chart libraries take ~1s to import, so only pages that draw charts pay for them
+        from matplotlib.figure import Figure
+        import seaborn as sns
+
+        spec = CHART_SPECS[name]
+        # A bare Figure is never registered with pyplot's global figure manager,
+        # so it is freed as soon as it goes out of scope instead of piling up
+        fig = Figure(figsize=(10, 6))
+        ax = fig.subplots()
+        plot = sns.barplot if spec['kind'] == 'bar' else sns.lineplot
+        plot(x=spec['x'], y=spec['y'], data=entry['data'], ax=ax)
+        ax.set_xlabel(spec['xlabel'])
+        ax.set_ylabel(spec['ylabel'])
+        ax.set_title(spec['title'])
+        ax.tick_params(axis='x', labelrotation=45)
+        fig.tight_layout()
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format='png', dpi=100)
+        fig.clear()
+        entry['png'] = buffer.getvalue()
+    return entry['png']
+
+
+def display_chart(name, backend="native"):
+    """Displays one chart from CHART_SPECS with the given backend."""
+    spec = CHART_SPECS[name]
+    st.header(name)
+    if backend == "matplotlib":
+        st.image(render_chart_png(name))
+        return
+    df = get_chart_data(name)
+    chart = st.bar_chart if spec['kind'] == 'bar' else st.line_chart
+    chart(df, x=spec['x'], y=spec['y'], x_label=spec['xlabel'], y_label=spec['ylabel'])
+
+
+def display_charts():
+    """Displays the chart picker."""
+    name = st.selectbox("Chart", list(CHART_SPECS))
+    backend = st.radio("Renderer", CHART_BACKENDS, horizontal=True)
+    display_chart(name, backend)
 
-    # Create the bar chart
-    plt.figure(figsize=(10, 6))
-    sns.barplot(x="Food_Type", y="Total_Quantity", data=df)
-    plt.xlabel("Food Type")
-    plt.ylabel("Total Quantity")
-    plt.title("Total Quantity of Food by Type")
-    st.pyplot(plt)  # Display the chart in Streamlit
+
+def display_food_wastage_by_type_chart():
+    """Displays a bar chart of food wastage by food type."""
+    display_chart("Food Wastage by Food Type", "matplotlib")
 
 
 
@@ -521,8 +3999,13 @@ def create_dummy_csv_files():
     claims_df = pd.DataFrame(claims_data)
     claims_df.to_csv(os.path.join(DATA_DIR, 'claims_data.csv'), index=False)
 
-def main():
-    """Main function to run the Streamlit app."""
+@st.cache_resource
+def init_database():
+    """
+    Prepares the database once per server process rather than on every rerun:
+    creates and loads it if missing, otherwise syncs changed CSV rows, then
+    starts the background summary refresher, expiry sweeper and metrics server.
+    """
     # Create and load data if the database doesn't exist
     if not os.path.exists(DB_NAME):
         create_database()
@@ -532,4 +4015,35 @@ def main():
         # Create dummy CSV files.
         create_dummy_csv_files()
         load_data_to_db()
-conn.close()
+    else:
+        # Pick up new or changed rows from DATA_DIR without a rebuild
+        sync_data_dir()
+    start_summary_refresher()
+    start_expiry_sweeper()
+    start_metrics_server()
+    return DB_NAME
+
+
+def main():
+    """Main function to run the Streamlit app."""
+    init_database()
+
+    pages = {
+        "Food Listings": display_food_listings,
+        "Add Food Listing": add_food_listing,
+        "Claim Food": display_claim_food,
+        "Suggested Matches": display_matches,
+        "Search": display_search,
+        "Analytics Queries": display_sql_queries,
+        "Charts": display_charts,
+        "View Providers": lambda: display_data("Providers"),
+        "View Receivers": lambda: display_data("Receivers"),
+        "View Claims": lambda: display_data("Claims"),
+        "Query Statistics": display_query_stats,
+    }
+    page = st.sidebar.radio("Navigate", list(pages))
+    pages[page]()
+
+
+if __name__ == "__main__":
+    main()
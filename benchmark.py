@@ -0,0 +1,623 @@
+"""
+Synthetic data generator and benchmark harness for app.py.
+
+Generates a realistic, seeded dataset at a configurable scale, loads it into
+a scratch database and times the hot paths of the app. Results are written
+as JSON so runs from different versions can be compared:
+
+    python benchmark.py --listings 100000 --output bench.json
+    python benchmark.py --listings 100000 --compare bench.json
+    python benchmark.py --check-import-budget
+    python benchmark.py --check-query-plans
+    python benchmark.py --check-frames
+    python benchmark.py --claim-load-test --threads 16
+    python benchmark.py --api-load-test --threads 16 --requests 20000
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+import app
+import api
+
+GENERATOR_CHUNKSIZE = 1000000  # Rows generated and written per CSV chunk
+CITY_COUNT = 200
+FOOD_TYPES = ['Vegetarian', 'Non-Vegetarian', 'Vegan', 'Bakery', 'Produce', 'Dairy', 'Prepared']
+FOOD_TYPE_WEIGHTS = [0.32, 0.24, 0.14, 0.12, 0.09, 0.06, 0.03]
+MEAL_TYPES = ['Breakfast', 'Lunch', 'Dinner', 'Snacks']
+MEAL_TYPE_WEIGHTS = [0.2, 0.35, 0.35, 0.1]
+PROVIDER_TYPES = ['Restaurant', 'Supermarket', 'Grocery Store', 'Catering Service', 'Cafe']
+RECEIVER_TYPES = ['NGO', 'Shelter', 'Charity', 'Individual']
+FOOD_NAMES = ['Rice', 'Bread', 'Soup', 'Salad', 'Fruits', 'Pasta', 'Chicken', 'Fish',
+              'Vegetables', 'Dairy', 'Cheese', 'Yogurt', 'Biryani', 'Curry', 'Sandwich']
+CLAIM_STATUSES = ['Completed', 'Pending', 'Cancelled']
+CLAIM_STATUS_WEIGHTS = [0.55, 0.3, 0.15]
+REGRESSION_THRESHOLD = 1.25  # Flag timings more than 25% slower than the baseline
+IMPORT_BUDGET_SECONDS = 1.5  # Cold `import app` in a fresh interpreter
+DEFERRED_MODULES = ('matplotlib', 'seaborn')  # Must not be imported by `import app`
+API_REQUEST_MIX = {  # Request kind -> share of --api-load-test traffic
+    'listings': 0.35, 'search': 0.1, 'listing': 0.1, 'query': 0.2, 'claim': 0.1, 'update': 0.05, 'batch': 0.1,
+}
+API_BATCH_SIZE = 20  # Operations per POST /batch in --api-load-test
+
+
+def _zipf_weights(n, exponent=1.1):
+    """Returns normalized Zipf weights, so a few cities dominate as in real traffic."""
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    return weights / weights.sum()
+
+
+def _write_chunked(path, total, make_chunk):
+    """Writes `total` rows to a CSV by calling make_chunk(start, stop) per chunk."""
+    for start in range(0, total, GENERATOR_CHUNKSIZE):
+        stop = min(start + GENERATOR_CHUNKSIZE, total)
+        make_chunk(start, stop).to_csv(path, mode='w' if start == 0 else 'a', header=start == 0, index=False)
+
+
+def generate_dataset(out_dir, listings=10000, seed=42, today=None):
+    """
+    Writes the four CSV files for a dataset with `listings` food listings.
+
+    Providers, receivers and claims scale with the listing count. Cities
+    follow a Zipf distribution and food/meal types fixed skewed weights;
+    expiry dates spread 30 days either side of `today`. The same seed always
+    produces the same files. Returns the row count of each file.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    today = today or datetime(2024, 6, 1)
+    cities = np.array([f"City {i:03d}" for i in range(CITY_COUNT)])
+    city_weights = _zipf_weights(CITY_COUNT)
+    counts = {
+        'Providers': max(listings // 100, 1),
+        'Receivers': max(listings // 50, 1),
+        'FoodListings': listings,
+        'Claims': int(listings * 0.4),
+    }
+
+    def providers(start, stop):
+        n = stop - start
+        ids = np.arange(start + 1, stop + 1)
+        return pd.DataFrame({
+            'Provider_ID': ids,
+            'Name': [f"Provider {i}" for i in ids],
+            'Type': rng.choice(PROVIDER_TYPES, n),
+            'Address': [f"{i} Market Street" for i in ids],
+            'City': rng.choice(cities, n, p=city_weights),
+            'Contact': [f"555-{i % 10000:04d}" for i in ids],
+        })
+
+    def receivers(start, stop):
+        n = stop - start
+        ids = np.arange(start + 1, stop + 1)
+        return pd.DataFrame({
+            'Receiver_ID': ids,
+            'Name': [f"Receiver {i}" for i in ids],
+            'Type': rng.choice(RECEIVER_TYPES, n, p=[0.4, 0.25, 0.2, 0.15]),
+            'City': rng.choice(cities, n, p=city_weights),
+            'Contact': [f"555-{i % 10000:04d}" for i in ids],
+        })
+
+    def food_listings(start, stop):
+        n = stop - start
+        expiry = np.datetime64(today.date()) + rng.integers(-30, 31, n).astype('timedelta64[D]')
+        return pd.DataFrame({
+            'Food_ID': np.arange(start + 1, stop + 1),
+            'Food_Name': rng.choice(FOOD_NAMES, n),
+            'Quantity': rng.integers(1, 101, n),
+            'Expiry_Date': np.datetime_as_string(expiry, unit='D'),
+            'Provider_ID': rng.integers(1, counts['Providers'] + 1, n),
+            'Provider_Type': rng.choice(PROVIDER_TYPES, n),
+            'Location': rng.choice(cities, n, p=city_weights),
+            'Food_Type': rng.choice(FOOD_TYPES, n, p=FOOD_TYPE_WEIGHTS),
+            'Meal_Type': rng.choice(MEAL_TYPES, n, p=MEAL_TYPE_WEIGHTS),
+        })
+
+    def claims(start, stop):
+        n = stop - start
+        seconds = rng.integers(0, 90 * 24 * 3600, n).astype('timedelta64[s]')
+        timestamps = np.datetime64(today - timedelta(days=90), 's') + seconds
+        return pd.DataFrame({
+            'Claim_ID': np.arange(start + 1, stop + 1),
+            'Food_ID': rng.integers(1, listings + 1, n),
+            'Receiver_ID': rng.integers(1, counts['Receivers'] + 1, n),
+            'Status': rng.choice(CLAIM_STATUSES, n, p=CLAIM_STATUS_WEIGHTS),
+            'Timestamp': np.datetime_as_string(timestamps, unit='s'),
+        })
+
+    generators = {'Providers': providers, 'Receivers': receivers,
+                  'FoodListings': food_listings, 'Claims': claims}
+    for table, make_chunk in generators.items():
+        path = os.path.join(out_dir, app.CSV_FILES[table][0])
+        _write_chunked(path, counts[table], make_chunk)
+    return counts
+
+
+def measure_import_time(runs=3):
+    """
+    Imports app in fresh interpreters. Returns (best seconds, deferred
+    modules that were imported anyway); the latter should be empty.
+    """
+    code = ("import sys, time; started = time.perf_counter(); import app; "
+            "print(time.perf_counter() - started); "
+            f"print(','.join(m for m in {DEFERRED_MODULES!r} if m in sys.modules))")
+    app_dir = os.path.dirname(os.path.abspath(app.__file__))
+    timings = []
+    eager = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', code], cwd=app_dir, capture_output=True,
+                                text=True, check=True).stdout.splitlines()
+        timings.append(float(output[0]))
+        eager = [module for module in output[1:2] if module]
+    return min(timings), eager
+
+
+def check_import_budget(budget=IMPORT_BUDGET_SECONDS):
+    """Returns a list of problems with app's cold import time; empty if within budget."""
+    seconds, eager = measure_import_time()
+    problems = []
+    if seconds > budget:
+        problems.append(f"import app took {seconds:.3f}s (budget {budget:.3f}s)")
+    if eager:
+        problems.append(f"import app eagerly imported: {eager[0]}")
+    print(f"import app: {seconds * 1000:.0f} ms")
+    return problems
+
+
+def _time(func, repeat):
+    """Runs func `repeat` times. Returns (timing summary in seconds, last result)."""
+    timings = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - started)
+    return {'min': min(timings), 'median': statistics.median(timings), 'max': max(timings)}, result
+
+
+def _uncached(func):
+    """Wraps func so every run starts with empty app caches."""
+    def run():
+        app.invalidate_unique_values()
+        app.clear_result_cache()
+        return func()
+    return run
+
+
+def run_benchmarks(listings=10000, seed=42, repeat=5, work_dir=None):
+    """Generates a dataset, loads it and times the app's hot paths. Returns the report dict."""
+    work_dir = work_dir or tempfile.mkdtemp(prefix='food_waste_bench_')
+    app.DATA_DIR = os.path.join(work_dir, 'data')
+    app.DB_NAME = os.path.join(work_dir, 'food_waste.db')
+
+    started = time.perf_counter()
+    counts = generate_dataset(app.DATA_DIR, listings, seed)
+    generate_seconds = time.perf_counter() - started
+
+    import_seconds, _ = measure_import_time()
+    results = [{'name': 'import_app', 'seconds': {'min': import_seconds, 'median': import_seconds,
+                                                  'max': import_seconds}, 'rows': None}]
+
+    def record(name, func, runs=repeat):
+        timing, rows = _time(func, runs)
+        results.append({'name': name, 'seconds': timing,
+                         'rows': len(rows) if isinstance(rows, list) else None})
+        print(f"{name}: median {timing['median'] * 1000:.2f} ms")
+
+    def load():
+        app.close_pool()
+        if os.path.exists(app.DB_NAME):
+            os.remove(app.DB_NAME)
+        app.create_database()
+        app.load_data_to_db()
+
+    record('load_data_to_db', load, runs=1)
+
+    top_city = app.execute_query(
+        "SELECT Location FROM FoodListings GROUP BY Location ORDER BY COUNT(*) DESC LIMIT 1")[0][0]
+    query, params = app.build_listing_query(location=top_city, food_type=FOOD_TYPES[0], meal_type='Lunch')
+    record('listing_query.filtered', _uncached(lambda: app.execute_query(query, params)))
+    record('listing_query.first_page', _uncached(lambda: app.fetch_page(
+        query, params, app.LISTING_COLUMNS, 'fl.Expiry_Date', 'fl.Food_ID')[0]))
+    record('listing_query.filtered.cached', lambda: app.execute_query(query, params))
+
+    for column in ('Location', 'Food_Type', 'Meal_Type'):
+        record(f'get_unique_values.{column}', _uncached(lambda: app.get_unique_values('FoodListings', column)))
+        record(f'get_unique_values.{column}.cached', lambda: app.get_unique_values('FoodListings', column))
+
+    for name, sql in app.ANALYTICS_QUERIES.items():
+        query_params = (top_city,) if name == app.CITY_CONTACTS_QUERY else None
+        record(f'analytics.{name}', _uncached(lambda: app.execute_query(sql, query_params)))
+
+    app.SNAPSHOT_DIR = os.path.join(work_dir, 'snapshots')
+    record('export_snapshot', app.export_snapshot, runs=1)
+    for name in app.SNAPSHOT_ANALYTICS:
+        record(f'snapshot.{name}', lambda: app.run_snapshot_analytics(name)[0])
+
+    record('match_listings', app.match_listings)
+
+    # Full-table materialization: a DataFrame over fetchall() tuples versus read_frame
+    frame_bytes_per_row = {}
+    frame_queries = {'listings': app.build_listing_query(), 'claims': ("SELECT * FROM Claims", [])}
+    for name, (sql, query_params) in frame_queries.items():
+        def from_tuples():
+            with app.get_connection() as conn:
+                cursor = conn.execute(sql, query_params)
+                return pd.DataFrame(cursor.fetchall(), columns=[column[0] for column in cursor.description])
+        record(f'frame.{name}.tuples', from_tuples, runs=min(repeat, 3))
+        record(f'frame.{name}.compact', lambda: app.read_frame(sql, query_params), runs=min(repeat, 3))
+        frame_bytes_per_row[name] = {'tuples': app.frame_bytes_per_row(from_tuples()),
+                                     'compact': app.frame_bytes_per_row(app.read_frame(sql, query_params))}
+        print(f"frame.{name}: {frame_bytes_per_row[name]['tuples']:.0f} -> "
+              f"{frame_bytes_per_row[name]['compact']:.0f} bytes per row")
+
+    for text in ('rice', 'ri', 'rice lunch', top_city):
+        record(f'search.listings.{text}', _uncached(lambda: app.search('ListingSearch', text)))
+    record('search.providers.market', _uncached(lambda: app.search('ProviderSearch', 'market')))
+    record('suggest.listings.ri', _uncached(lambda: app.suggest('ri', app.ranked_matches('ListingSearch', 'ri')[0])))
+
+    return {
+        'meta': {
+            'listings': listings,
+            'seed': seed,
+            'repeat': repeat,
+            'row_counts': counts,
+            'generate_seconds': generate_seconds,
+            'frame_bytes_per_row': frame_bytes_per_row,
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'pandas': pd.__version__,
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+        },
+        'results': results,
+    }
+
+
+def _fresh_database(work_dir, listings, seed):
+    """Points app at a new database in work_dir loaded with a dataset dated from today."""
+    app.DATA_DIR = os.path.join(work_dir, 'data')
+    app.DB_NAME = os.path.join(work_dir, 'food_waste.db')
+    app.close_pool()
+    if os.path.exists(app.DB_NAME):
+        os.remove(app.DB_NAME)
+    generate_dataset(app.DATA_DIR, listings, seed, today=datetime.now())
+    app.create_database()
+    app.load_data_to_db()
+
+
+def check_query_plans(listings=10000, seed=42, work_dir=None):
+    """
+    Loads a fresh database and returns a list of problems, one per query in
+    app.INDEXED_QUERIES that scans its table without an index; empty if none do.
+    """
+    _fresh_database(work_dir or tempfile.mkdtemp(prefix='food_waste_plans_'), listings, seed)
+    problems = [f"{query}: {detail}" for query, detail in app.find_full_scans()]
+    print(f"query plans: {len(app.INDEXED_QUERIES)} checked, {len(problems)} full scans")
+    return problems
+
+
+def check_frames(listings=10000, seed=42, work_dir=None):
+    """
+    Loads a fresh database and returns a list of problems with compact frames
+    whose category columns have batches of only NULLs, for string and numeric
+    categories; empty if none.
+    """
+    problems = []
+    cases = {
+        'strings': [[(None,), (None,)], [('City 001',), (None,)], [(float('nan'),), (None,)],
+                    [('City 002',), ('City 001',)]],
+        'numbers': [[(None,), (None,)], [(7,), (None,)], [(float('nan'),), (None,)], [(3,), (7,)]],
+    }
+    for kind, batches in cases.items():
+        for start in range(len(batches)):
+            rows = [row for batch in batches[start:] for row in batch]
+            try:
+                values = app.compact_frame(batches[start:], ['City'])['City'].tolist()
+            except Exception as e:
+                problems.append(f"compact_frame of {kind} from batch {start}: {type(e).__name__}: {e}")
+                continue
+            if [value if value == value else None for value in values] != \
+                    [row[0] if row[0] == row[0] else None for row in rows]:  # NaN != NaN
+                problems.append(f"compact_frame of {kind} from batch {start}: got {values}")
+
+    _fresh_database(work_dir or tempfile.mkdtemp(prefix='food_waste_frames_'), listings, seed)
+    batch_rows = app.FRAME_BATCH_ROWS
+    app.FRAME_BATCH_ROWS = 10  # So the NULL cities below fill whole batches
+    try:
+        app.execute_query("UPDATE Receivers SET City = NULL WHERE Receiver_ID <= 20")
+        query = "SELECT Receiver_ID, City FROM Receivers ORDER BY Receiver_ID"
+        expected = app.execute_query(query)
+        df = app.read_frame(query)
+        df = df.astype(object).where(df.notna(), None)
+        if list(df.itertuples(index=False, name=None)) != [tuple(row) for row in expected]:
+            problems.append("read_frame over Receivers.City does not match the table")
+    except Exception as e:
+        problems.append(f"read_frame over Receivers.City: {type(e).__name__}: {e}")
+    finally:
+        app.FRAME_BATCH_ROWS = batch_rows
+    print(f"compact frames: {len(cases)} batch sets and Receivers.City checked, {len(problems)} problems")
+    return problems
+
+
+def claim_load_test(listings=10000, seed=42, threads=16, claims=20000, work_dir=None):
+    """
+    Submits `claims` concurrent claims from `threads` threads against a fresh
+    database and checks quantity accounting. Returns the report dict; its
+    'problems' list is empty when no listing went negative and every accepted
+    claim is matched by the quantity it took.
+    """
+    _fresh_database(work_dir or tempfile.mkdtemp(prefix='food_waste_claims_'), listings, seed)
+
+    initial = dict(app.execute_query("SELECT Food_ID, Quantity FROM FoodListings"))
+    claimable = [row[0] for row in app.execute_query(
+        "SELECT Food_ID FROM FoodListings WHERE Expiry_Date >= DATE('now') AND Quantity > 0")]
+    receivers = [row[0] for row in app.execute_query("SELECT Receiver_ID FROM Receivers")]
+    # Concentrate claims on a few listings so they contend for the same rows
+    hot = claimable[:max(len(claimable) // 100, 10)]
+    rng = np.random.default_rng(seed)
+    requests = list(zip(rng.choice(hot, claims).tolist(), rng.choice(receivers, claims).tolist(),
+                        rng.integers(1, 5, claims).tolist()))
+
+    claims_before = app.execute_query("SELECT COUNT(*) FROM Claims")[0][0]
+    counted = {'accepted': 0, 'rejected': 0}
+    counted_lock = threading.Lock()
+
+    def claim(request):
+        result = app.submit_claim(*request)
+        with counted_lock:
+            counted[result['status']] += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(claim, requests))
+    seconds = time.perf_counter() - started
+
+    final = dict(app.execute_query("SELECT Food_ID, Quantity FROM FoodListings"))
+    claimed = app.execute_query("SELECT COALESCE(SUM(Quantity), 0), COUNT(*) FROM Claims WHERE Quantity IS NOT NULL")[0]
+    problems = []
+    negative = [food_id for food_id, quantity in final.items() if quantity < 0]
+    if negative:
+        problems.append(f"{len(negative)} listings have negative quantity")
+    taken = sum(initial[food_id] - final[food_id] for food_id in initial)
+    if taken != claimed[0]:
+        problems.append(f"listings lost {taken} units but claims record {claimed[0]}")
+    if app.execute_query("SELECT COUNT(*) FROM Claims")[0][0] - claims_before != counted['accepted']:
+        problems.append("claim rows do not match accepted claims")
+
+    print(f"claims: {claims / seconds:,.0f}/sec over {threads} threads "
+          f"({counted['accepted']} accepted, {counted['rejected']} rejected)")
+    return {
+        'threads': threads,
+        'claims': claims,
+        'seconds': seconds,
+        'claims_per_sec': claims / seconds,
+        'accepted': counted['accepted'],
+        'rejected': counted['rejected'],
+        'batches': app.claim_stats['batches'],
+        'problems': problems,
+    }
+
+
+def _api_requests(rng, count, food_ids, receivers, cities, query_ids):
+    """Draws (kind, method, path, body) requests for the API load test from API_REQUEST_MIX."""
+    kinds = rng.choice(list(API_REQUEST_MIX), count, p=list(API_REQUEST_MIX.values()))
+    requests = []
+    for kind in kinds:
+        food_id, receiver_id = int(rng.choice(food_ids)), int(rng.choice(receivers))
+        if kind == 'listings':
+            city = str(rng.choice(cities)).replace(' ', '%20')
+            requests.append((kind, 'GET', f'/listings?location={city}&limit=50', None))
+        elif kind == 'search':
+            requests.append((kind, 'GET', f'/listings?q={rng.choice(FOOD_NAMES).lower()}&limit=20', None))
+        elif kind == 'listing':
+            requests.append((kind, 'GET', f'/listings/{food_id}', None))
+        elif kind == 'query':
+            requests.append((kind, 'GET', f'/queries/{rng.choice(query_ids)}', None))
+        elif kind == 'claim':
+            requests.append((kind, 'POST', '/claims', {'food_id': food_id, 'receiver_id': receiver_id,
+                                                        'quantity': int(rng.integers(1, 3))}))
+        elif kind == 'update':
+            requests.append((kind, 'PATCH', f'/listings/{food_id}', {'Quantity': int(rng.integers(10, 100))}))
+        else:
+            requests.append((kind, 'POST', '/batch', {'requests': [
+                {'op': 'query', 'args': {'query_id': int(rng.choice(query_ids))}} if i % 2 else
+                {'op': 'listing', 'args': {'food_id': int(rng.choice(food_ids))}} for i in range(API_BATCH_SIZE)]}))
+    return requests
+
+
+def api_load_test(listings=10000, seed=42, threads=16, requests=20000, work_dir=None, processes=1):
+    """
+    Starts `api.py serve` with `processes` server processes on a fresh
+    database and sends `requests` mixed
+    requests (API_REQUEST_MIX) from `threads` keep-alive clients, then
+    streams the FoodListings table. Returns the report dict; its 'problems'
+    list is empty when every request succeeded and the stream returned each
+    row exactly once.
+    """
+    _fresh_database(work_dir or tempfile.mkdtemp(prefix='food_waste_api_'), listings, seed)
+
+    food_ids = [row[0] for row in app.execute_query("SELECT Food_ID FROM FoodListings")]
+    receivers = [row[0] for row in app.execute_query("SELECT Receiver_ID FROM Receivers")]
+    cities = app.get_unique_values("FoodListings", "Location")
+    query_ids = [query_id for query_id, name in enumerate(app.ANALYTICS_QUERIES) if name != app.CITY_CONTACTS_QUERY]
+    rng = np.random.default_rng(seed)
+    planned = _api_requests(rng, requests, food_ids, receivers, cities, query_ids)
+    app.close_pool()
+
+    server = subprocess.Popen([sys.executable, api.__file__, '--db', app.DB_NAME, '--data-dir', app.DATA_DIR,
+                               'serve', '--port', '0', '--processes', str(processes)],
+                              stdout=subprocess.PIPE, text=True)
+    try:
+        for line in server.stdout:
+            if line.startswith('Serving on'):
+                port = int(line.rsplit(':', 1)[1])
+                break
+        else:
+            raise RuntimeError("API server exited before it started serving")
+        # Keep draining the server's output so it never blocks on a full pipe
+        threading.Thread(target=server.stdout.read, daemon=True).start()
+
+        latencies = {kind: [] for kind in API_REQUEST_MIX}
+        failures = []
+        failures_lock = threading.Lock()
+
+        def client(share):
+            conn = http.client.HTTPConnection('127.0.0.1', port)
+            for kind, method, path, body in share:
+                started = time.perf_counter()
+                conn.request(method, path, body=None if body is None else json.dumps(body),
+                             headers={'Content-Type': 'application/json'})
+                response = conn.getresponse()
+                payload = response.read()
+                latencies[kind].append(time.perf_counter() - started)
+                if response.status != 200 and not (kind == 'listing' and response.status == 404):
+                    with failures_lock:
+                        failures.append(f"{method} {path}: {response.status} {payload[:200]!r}")
+            conn.close()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(client, [planned[i::threads] for i in range(threads)]))
+        seconds = time.perf_counter() - started
+
+        conn = http.client.HTTPConnection('127.0.0.1', port)
+        stream_started = time.perf_counter()
+        conn.request('GET', '/tables/FoodListings')
+        streamed = [json.loads(line)['Food_ID'] for line in conn.getresponse().read().splitlines()]
+        stream_seconds = time.perf_counter() - stream_started
+        conn.close()
+    finally:
+        server.terminate()
+        server.wait()
+
+    problems = failures[:20]
+    if len(failures) > 20:
+        problems.append(f"... and {len(failures) - 20} more failed requests")
+    expected = app.execute_query("SELECT COUNT(*) FROM FoodListings")[0][0]
+    if len(streamed) != expected or len(set(streamed)) != len(streamed):
+        problems.append(f"stream returned {len(streamed)} rows ({len(set(streamed))} distinct), expected {expected}")
+
+    def summarize(values):
+        values = sorted(values)
+        return {'count': len(values), 'p50_ms': values[len(values) // 2] * 1000,
+                'p99_ms': values[int(len(values) * 0.99)] * 1000} if values else {'count': 0}
+
+    # A batch request carries API_BATCH_SIZE operations
+    operations = requests + (API_BATCH_SIZE - 1) * len(latencies['batch'])
+    print(f"api: {requests / seconds:,.0f} requests/sec ({operations / seconds:,.0f} operations/sec) "
+          f"over {threads} clients, stream {len(streamed) / stream_seconds:,.0f} rows/sec")
+    return {
+        'threads': threads,
+        'processes': processes,
+        'requests': requests,
+        'seconds': seconds,
+        'requests_per_sec': requests / seconds,
+        'operations_per_sec': operations / seconds,
+        'latency': {kind: summarize(values) for kind, values in latencies.items()},
+        'stream_rows': len(streamed),
+        'stream_rows_per_sec': len(streamed) / stream_seconds,
+        'problems': problems,
+    }
+
+
+def compare_reports(report, baseline, threshold=REGRESSION_THRESHOLD):
+    """Returns (name, baseline median, current median) for every benchmark slower than threshold x baseline."""
+    baseline_medians = {result['name']: result['seconds']['median'] for result in baseline['results']}
+    regressions = []
+    for result in report['results']:
+        before = baseline_medians.get(result['name'])
+        if before and result['seconds']['median'] > before * threshold:
+            regressions.append((result['name'], before, result['seconds']['median']))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--listings', type=int, default=10000, help='number of food listings (10^4 to 10^7)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=5, help='timed runs per query benchmark')
+    parser.add_argument('--work-dir', help='where to write the dataset and database (default: a temp dir)')
+    parser.add_argument('--output', help='write the JSON report here (default: stdout)')
+    parser.add_argument('--compare', help='baseline JSON report to check for regressions')
+    parser.add_argument('--check-import-budget', action='store_true',
+                        help=f'only check that `import app` stays under {IMPORT_BUDGET_SECONDS}s '
+                             f'without importing {", ".join(DEFERRED_MODULES)}')
+    parser.add_argument('--check-query-plans', action='store_true',
+                        help='only check that every query in app.INDEXED_QUERIES is index-backed')
+    parser.add_argument('--check-frames', action='store_true',
+                        help='only check that compact frames survive category batches of only NULLs')
+    parser.add_argument('--claim-load-test', action='store_true',
+                        help='only run the concurrent claim load test and check quantity accounting')
+    parser.add_argument('--api-load-test', action='store_true',
+                        help='only run the HTTP API load test against `api.py serve`')
+    parser.add_argument('--threads', type=int, default=16,
+                        help='client threads for --claim-load-test and --api-load-test')
+    parser.add_argument('--claims', type=int, default=20000, help='claims submitted by --claim-load-test')
+    parser.add_argument('--requests', type=int, default=20000, help='requests sent by --api-load-test')
+    parser.add_argument('--processes', type=int, default=1, help='server processes for --api-load-test')
+    args = parser.parse_args(argv)
+
+    if args.check_import_budget:
+        problems = check_import_budget()
+        for problem in problems:
+            print(f"IMPORT BUDGET {problem}", file=sys.stderr)
+        return 1 if problems else 0
+
+    if args.check_query_plans:
+        problems = check_query_plans(args.listings, args.seed, args.work_dir)
+        for problem in problems:
+            print(f"FULL SCAN {problem}", file=sys.stderr)
+        return 1 if problems else 0
+
+    if args.check_frames:
+        problems = check_frames(args.listings, args.seed, args.work_dir)
+        for problem in problems:
+            print(f"FRAMES {problem}", file=sys.stderr)
+        return 1 if problems else 0
+
+    if args.claim_load_test:
+        report = claim_load_test(args.listings, args.seed, args.threads, args.claims, args.work_dir)
+        print(json.dumps(report, indent=2))
+        for problem in report['problems']:
+            print(f"CLAIM ACCOUNTING {problem}", file=sys.stderr)
+        return 1 if report['problems'] else 0
+
+    if args.api_load_test:
+        report = api_load_test(args.listings, args.seed, args.threads, args.requests, args.work_dir, args.processes)
+        print(json.dumps(report, indent=2))
+        for problem in report['problems']:
+            print(f"API LOAD TEST {problem}", file=sys.stderr)
+        return 1 if report['problems'] else 0
+
+    report = run_benchmarks(args.listings, args.seed, args.repeat, args.work_dir)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare_reports(report, json.load(f))
+        for name, before, after in regressions:
+            print(f"REGRESSION {name}: {before * 1000:.2f} ms -> {after * 1000:.2f} ms", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())